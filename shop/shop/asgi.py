@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'shop.settings')
+# Под ASGI синхронный код запросов идёт в потоках sync_to_async, и соединение
+# из такого потока не закрывается по CONN_MAX_AGE — постоянные соединения
+# копились бы до max_connections. Каждый запрос открывает своё.
+os.environ['DB_CONN_MAX_AGE'] = '0'
 
 application = get_asgi_application()
@@ -50,13 +50,17 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'store.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'store.middleware.CompressionMiddleware',
+    'store.middleware.QueryInstrumentationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'store.middleware.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'shop.urls'
@@ -85,17 +89,78 @@ WSGI_APPLICATION = 'shop.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+#
+# DB_CONNECTION_MODE:
+#   persistent — соединение живёт DB_CONN_MAX_AGE секунд между запросами и
+#                проверяется перед повторным использованием (CONN_HEALTH_CHECKS);
+#   pgbouncer  — приложение ходит в PgBouncer в режиме pool_mode=transaction.
+#                Серверные курсоры отключены, потому что между транзакциями
+#                соединение с Postgres может смениться;
+#   none       — новое соединение на каждый запрос (поведение Django по умолчанию).
+# Под ASGI (shop/asgi.py) DB_CONN_MAX_AGE всегда 0: постоянные соединения там
+# не переиспользуются между запросами, а копятся.
+#
+# Что безопасно при транзакционном пулинге PgBouncer:
+#   * обычные запросы ORM, transaction.atomic, select_for_update внутри atomic,
+#     transaction.on_commit — всё живёт в пределах одной транзакции;
+#   * psycopg2 не использует серверные prepared statements.
+# Что небезопасно и как это обойдено:
+#   * QuerySet.iterator() на серверных курсорах (store.exports, выгрузки и
+#     бэкфилл агрегатов) — при DISABLE_SERVER_SIDE_CURSORS результат читается
+#     целиком. Для потоковых выгрузок задайте DB_DIRECT_HOST/DB_DIRECT_PORT:
+#     появится алиас 'direct' мимо PgBouncer, и выгрузки пойдут через него;
+#   * SET на уровне сессии (в т.ч. SET TIME ZONE) не переживает транзакцию —
+#     у роли в Postgres должен быть timezone = 'UTC', как TIME_ZONE ниже.
+
+DB_CONNECTION_MODE = os.environ.get('DB_CONNECTION_MODE', 'persistent')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': 'shop',
-        'USER': 'postgres',
-        'PASSWORD': '123456',
-        'HOST': 'localhost',
-        'PORT': '5432'
+        'NAME': os.environ.get('DB_NAME', 'shop'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', '123456'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        'CONN_MAX_AGE': 0 if DB_CONNECTION_MODE == 'none' else int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': DB_CONNECTION_MODE != 'none',
+        'DISABLE_SERVER_SIDE_CURSORS': DB_CONNECTION_MODE == 'pgbouncer',
     }
 }
 
+if DB_CONNECTION_MODE == 'pgbouncer' and os.environ.get('DB_DIRECT_HOST'):
+    DATABASES['direct'] = dict(
+        DATABASES['default'],
+        HOST=os.environ['DB_DIRECT_HOST'],
+        PORT=os.environ.get('DB_DIRECT_PORT', '5432'),
+        DISABLE_SERVER_SIDE_CURSORS=False,
+        TEST={'MIRROR': 'default'},
+    )
+
+# Реплики для чтения: DB_REPLICA_HOSTS="host1:5432,host2:5432". Для проверки
+# на одной машине достаточно указать тот же сервер — получится второй алиас
+# на ту же базу (в тестах реплики зеркалят default).
+READ_REPLICAS = []
+for index, replica in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    replica_host, _, replica_port = replica.strip().partition(':')
+    DATABASES[f'replica{index}'] = dict(
+        DATABASES['default'],
+        HOST=replica_host,
+        PORT=replica_port or DATABASES['default']['PORT'],
+        TEST={'MIRROR': 'default'},
+    )
+    READ_REPLICAS.append(f'replica{index}')
+
+DATABASE_ROUTERS = ['store.routers.PrimaryReplicaRouter']
+
+# Сколько секунд после изменяющего запроса клиент читает только из основной базы
+# (метка — подписанная cookie REPLICA_STICKY_COOKIE и запись в SHARED_CACHE_ALIAS).
+REPLICA_STICKY_SECONDS = 10
+REPLICA_STICKY_COOKIE = 'primary_pin'
+
+# Алиас для долгих потоковых чтений (выгрузки), которым нужны серверные курсоры.
+STREAMING_DATABASE = 'direct' if 'direct' in DATABASES else 'default'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -138,7 +203,21 @@ STATICFILES_DIRS = [
 ]
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, '/media/')
+MEDIA_ROOT = BASE_DIR / 'media'
+# Загрузки хранятся под sha256 содержимого (см. store.storage) и отдаются
+# с Cache-Control: immutable; превью, которые regenerate_images --overwrite
+# может перезаписать, — с max-age на час. Без nginx перед приложением медиа отдаёт
+# store.media.serve с поддержкой Range-запросов.
+SERVE_MEDIA = DEBUG
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'store.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
@@ -147,10 +226,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'store.authentication.CachedAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
+    # orjson, если установлен, иначе stdlib json; ответы те же, что у JSONRenderer
+    'DEFAULT_RENDERER_CLASSES': (
+        'store.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'store.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 DJOSER = {
@@ -190,3 +278,119 @@ SIMPLE_JWT = {
 STRIPE_PUBLIC_KEY = 'pk_test_51KniXYAxRYRPHE83bbfdE4ksfdYA2pF8frneghPJUbP2CDE8tiFwzAnS92DVnkvC2hlzGIA0gEShDwXzK3HcRnxe009WCAo7Dc'
 
 STRIPE_SECRET_KEY = "sk_test_51KniXYAxRYRPHE83AnQt699xPMqf2yp8jmPl1qY1WhdG5AW7mFyKqLrGjsakvGO5KWb6VQBhCrXW0w3pq2ChmlGp0027FjhCDL"
+
+# Без секрета /api/payment/webhook/ отвечает 503 и не принимает события
+STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
+
+# Счётчики популярности копятся в памяти процесса и сбрасываются в БД пачкой
+# раз в POPULARITY_FLUSH_INTERVAL секунд (или при POPULARITY_MAX_PENDING
+# накопленных ключей) — при падении процесса теряется не больше этого окна.
+POPULARITY_FLUSH_INTERVAL = 5
+POPULARITY_MAX_PENDING = 5000
+POPULARITY_BADGE_THRESHOLD = 1000
+
+# Превью изображений: ширина каждого пресета в пикселях и число фоновых потоков,
+# которые генерируют их после загрузки.
+IMAGE_PRESETS = {
+    'thumb': 75,
+    'card': 300,
+    'large': 800,
+}
+IMAGE_WORKERS = 2
+
+# Массовая загрузка фотографий в галерею (POST /api/products/<pk>/gallery/).
+GALLERY_UPLOAD_MAX_FILES = 50
+GALLERY_UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+GALLERY_IMAGE_FORMATS = ('JPEG', 'PNG', 'WEBP')
+GALLERY_IMAGE_MIN_SIZE = (200, 200)
+GALLERY_IMAGE_MAX_PIXELS = 40_000_000
+
+# Сколько секунд пользователь, найденный по Token/JWT, живёт в кэше SHARED_CACHE_ALIAS.
+# Кэш сбрасывается сигналами при выходе, смене пароля и деактивации.
+AUTH_CACHE_TIMEOUT = 300
+
+# Доля запросов, для которых QueryInstrumentationMiddleware считает SQL и время
+# (0 — выключено, накладные расходы — один random() на запрос).
+QUERY_INSTRUMENTATION_SAMPLE_RATE = float(os.environ.get('QUERY_INSTRUMENTATION_SAMPLE_RATE', '1' if DEBUG else '0'))
+
+# Метрики Prometheus (GET /metrics). При нескольких воркерах задайте общий для
+# них METRICS_DIR и очищайте его при деплое. Отдаются только персоналу (сессия)
+# или по заголовку "Authorization: Bearer <METRICS_TOKEN>" — его и настройте
+# для Prometheus; без токена остальные получают 403.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = 10
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Категории и карточки/детали продуктов сериализуются из values() через
+# store.fast_serializers; 0 возвращает DRF-сериализаторы (ответ тот же).
+FAST_SERIALIZERS = os.environ.get('FAST_SERIALIZERS', '1') == '1'
+
+# Сжатие ответов (brotli, если установлен, иначе gzip). Сжатые тела анонимных
+# GET-ответов с путями из COMPRESSION_CACHE_PREFIXES хранятся в кэше по хешу
+# содержимого и сжимаются один раз на версию ответа. На лету brotli/gzip
+# сжимаются только JSON/NDJSON, прочие типы — gzip со случайной длиной (BREACH).
+COMPRESSION_MIN_LENGTH = 200
+COMPRESSION_CACHE_ALIAS = 'default'
+COMPRESSION_CACHE_TIMEOUT = 24 * 60 * 60
+COMPRESSION_CACHE_PREFIXES = ('/api/category/', '/api/products/', '/api/async/category/', '/api/async/products/',
+                              '/swagger.')
+
+# OpenAPI-схема собирается один раз на процесс: из файлов в OPENAPI_SCHEMA_DIR
+# (manage.py generate_schema при сборке образа) или при первом запросе.
+OPENAPI_SCHEMA_DIR = os.environ.get('OPENAPI_SCHEMA_DIR', '')
+
+SWAGGER_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+REDOC_SETTINGS = {
+    'SPEC_URL': ('schema-json', {'format': '.json'}),
+}
+
+# Бэкенды кэшей: locmem — память процесса, у каждого воркера свой кэш (сброс
+# из сигнала виден только воркеру, который его выполнил); file — каталог,
+# общий для воркеров одной машины; redis — Redis или совместимый сервер
+# (Valkey, KeyDB), нужен пакет redis. Второй элемент — LOCATION по умолчанию.
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', '{name}'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', os.path.join(BASE_DIR, 'cache', '{name}')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+
+
+def cache_settings(backend, location, name):
+    backend_path, default_location = CACHE_BACKENDS[backend]
+    return {
+        'BACKEND': backend_path,
+        'LOCATION': location or default_location.format(name=name),
+        'KEY_PREFIX': name,
+        'OPTIONS': {} if backend == 'redis' else {'MAX_ENTRIES': 10000},
+    }
+
+
+# Данные ответов каталога (дерево категорий, карточки категории, детали продукта)
+# для анонимных GET кэшируются с тегами category:<id>/product:<id> и сбрасываются
+# сигналами при изменении Category, Product, Gallery, Review и Rating (store.response_cache).
+# Счётчики просмотров и популярность в закэшированном ответе отстают не больше
+# чем на RESPONSE_CACHE_TIMEOUT секунд. С locmem при нескольких воркерах сброс
+# виден только в одном из них, остальные отстают на тот же RESPONSE_CACHE_TIMEOUT.
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') == '1'
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_TIMEOUT = 60
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'locmem')
+
+# Общий для всех воркеров кэш для данных, которые сбрасываются сигналами:
+# избранное пользователей, пользователи по Token/JWT. С locmem кэш
+# пользователей выключается, а избранное живёт секунды (store.shared_cache).
+SHARED_CACHE_ALIAS = 'shared'
+SHARED_CACHE_BACKEND = os.environ.get('SHARED_CACHE_BACKEND', 'file')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    RESPONSE_CACHE_ALIAS: cache_settings(RESPONSE_CACHE_BACKEND, os.environ.get('RESPONSE_CACHE_LOCATION'),
+                                         RESPONSE_CACHE_ALIAS),
+    SHARED_CACHE_ALIAS: cache_settings(SHARED_CACHE_BACKEND, os.environ.get('SHARED_CACHE_LOCATION'),
+                                       SHARED_CACHE_ALIAS),
+}
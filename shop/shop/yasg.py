@@ -1,21 +1,154 @@
-from django.urls import path
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
+import functools
+import hashlib
+import os
+import threading
+import time
 
-schema_view = get_schema_view(
-    openapi.Info(
+from django.http import HttpResponse
+from django.urls import path, re_path
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_safe
+
+from shop import settings
+from store import metrics
+
+# Генератор, инспекторы и вью drf_yasg импортируются только при сборке схемы
+# или открытии UI, а не при старте каждого воркера.
+
+# формат в URL -> (имя файла, имя кодека в drf_yasg.codecs, Content-Type)
+SCHEMA_FORMATS = {
+    '.json': ('swagger.json', 'OpenAPICodecJson', 'application/json'),
+    '.yaml': ('swagger.yaml', 'OpenAPICodecYaml', 'application/yaml; charset=utf-8'),
+}
+
+metrics.registry.describe('openapi_schema_generation_seconds', 'histogram', 'Время сборки OpenAPI-схемы',
+                          (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+metrics.registry.describe('openapi_schema_requests_total', 'counter',
+                          'Запросы OpenAPI-схемы: hit — из памяти, miss — загрузка или сборка, not_modified — 304')
+
+
+def info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
         title="Totembo",
         default_version='v1',
         description="Test description",
         license=openapi.License(name="BSD License"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
+    )
+
+
+def generate():
+    """Собирает схему и возвращает {формат: bytes}. Хост не записывается, чтобы
+    один файл подходил любому окружению: Swagger UI подставит текущий."""
+    from django.contrib.auth.models import AnonymousUser
+    from django.test import RequestFactory
+    from rest_framework.request import Request
+    from drf_yasg import codecs
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    start = time.perf_counter()
+    request = Request(RequestFactory().get('/swagger.json'))
+    request.user = AnonymousUser()
+    schema = OpenAPISchemaGenerator(info()).get_schema(request=request, public=True)
+    schema.pop('host', None)
+    schema.pop('schemes', None)
+    documents = {name: getattr(codecs, codec)(validators=[]).encode(schema)
+                 for name, (_, codec, _) in SCHEMA_FORMATS.items()}
+    metrics.observe('openapi_schema_generation_seconds', time.perf_counter() - start)
+    return documents
+
+
+def write(directory, documents):
+    os.makedirs(directory, exist_ok=True)
+    for name, (file_name, _, _) in SCHEMA_FORMATS.items():
+        temporary = os.path.join(directory, f'.{file_name}.tmp')
+        with open(temporary, 'wb') as file:
+            file.write(documents[name])
+        os.replace(temporary, os.path.join(directory, file_name))
+
+
+def load(directory):
+    documents = {}
+    for name, (file_name, _, _) in SCHEMA_FORMATS.items():
+        try:
+            with open(os.path.join(directory, file_name), 'rb') as file:
+                documents[name] = file.read()
+        except FileNotFoundError:
+            return None
+    return documents
+
+
+class SchemaDocument:
+    """OpenAPI-схема, собранная один раз на процесс.
+
+    Берётся из OPENAPI_SCHEMA_DIR (manage.py generate_schema на этапе сборки),
+    а если файлов нет — собирается при первом запросе и дальше отдаётся из памяти.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._documents = None
+
+    def get(self, format):
+        documents = self._documents
+        result = 'hit'
+        if documents is None:
+            with self._lock:
+                if self._documents is None:
+                    documents = settings.OPENAPI_SCHEMA_DIR and load(settings.OPENAPI_SCHEMA_DIR)
+                    self._documents = {name: (body, '"%s"' % hashlib.sha256(body).hexdigest())
+                                       for name, body in (documents or generate()).items()}
+                    result = 'miss'
+                documents = self._documents
+        return documents[format], result
+
+    def reset(self):
+        self._documents = None
+
+
+schema_document = SchemaDocument()
+
+
+@require_safe
+def schema(request, format):
+    (body, etag), result = schema_document.get(format)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None and response.status_code == 304:
+        result = 'not_modified'
+    metrics.inc('openapi_schema_requests_total', (('format', format.lstrip('.')), ('result', result)))
+    if response is None:
+        response = HttpResponse(body, content_type=SCHEMA_FORMATS[format][2])
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@functools.lru_cache(maxsize=None)
+def ui_view(renderer):
+    from rest_framework import permissions
+    from drf_yasg import renderers
+    from drf_yasg.views import get_schema_view
+
+    schema_view = get_schema_view(
+        info(),
+        public=True,
+        permission_classes=(permissions.AllowAny,),
+    )
+    return schema_view.as_view(renderer_classes=(getattr(renderers, renderer),))
+
+
+def swagger_ui(request, *args, **kwargs):
+    return ui_view('SwaggerUIRenderer')(request, *args, **kwargs)
+
+
+def redoc(request, *args, **kwargs):
+    return ui_view('ReDocRenderer')(request, *args, **kwargs)
+
 
+# Страницы UI без схемы внутри: документ они берут из schema-json (SWAGGER_SETTINGS['SPEC_URL'])
 urlpatterns = [
-    path('swagger(?P<format>\.json|\.yaml)', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    re_path(r'^swagger(?P<format>\.json|\.yaml)$', schema, name='schema-json'),
+    path('swagger/', swagger_ui, name='schema-swagger-ui'),
+    path('redoc/', redoc, name='schema-redoc'),
 ]
@@ -1,6 +1,59 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db.models import Count, OuterRef, Subquery
 from django.utils.safestring import mark_safe
-from .models import Product, Category, Gallery, Order, Cart, Shipping, FavoriteProduct, Rating, OrderProduct
+from .models import (Product, Category, Gallery, Order, Cart, Shipping, FavoriteProduct, Rating, OrderProduct,
+                     DailyProductSales, DailyCategorySales)
+from . import rollups, images, pricing
+
+class RelatedInputFilter(admin.FieldListFilter):
+    """Фильтр по id связанного объекта полем ввода — без выпадающего списка,
+    который грузил бы всех пользователей или продукты."""
+    template = 'admin/store/related_input_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        self.lookup_val = params.get(self.lookup_kwarg)
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        return []
+
+
+class RangeInputFilter(admin.FieldListFilter):
+    """Фильтр «от — до» двумя полями ввода вместо списка всех значений поля,
+    который строился бы SELECT DISTINCT по всей таблице."""
+    template = 'admin/store/range_input_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg_gte = f'{field_path}__gte'
+        self.lookup_kwarg_lte = f'{field_path}__lte'
+        self.lookup_val_gte = params.get(self.lookup_kwarg_gte)
+        self.lookup_val_lte = params.get(self.lookup_kwarg_lte)
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg_gte, self.lookup_kwarg_lte]
+
+    def queryset(self, request, queryset):
+        # незаполненная граница приходит из формы пустой строкой
+        self.used_parameters = {lookup: value for lookup, value in self.used_parameters.items() if value != ''}
+        return super().queryset(request, queryset)
+
+    def choices(self, changelist):
+        return []
+
+
+class CatalogActionForm(ActionForm):
+    price_percent = forms.DecimalField(required=False, max_digits=6, decimal_places=2, min_value=-100,
+                                       max_value=1000, label='Цена, %')
+    price_delta = forms.IntegerField(required=False, label='Цена, ±')
+    stock_delta = forms.IntegerField(required=False, label='Остаток, ±')
+
 
 # Register your models here.
 class AdminGalleryView(admin.TabularInline):
@@ -11,28 +64,52 @@ class AdminGalleryView(admin.TabularInline):
 @admin.register(Category)
 class AdminCategoryView(admin.ModelAdmin):
     list_display = ('id', 'title', 'parent', 'get_product_count')
+    list_select_related = ('parent',)
     prepopulated_fields = {'slug': ('title',)}
-    
+    search_fields = ('title', 'slug')
+    autocomplete_fields = ('parent',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(product_count=Count('products'))
+
+    @admin.display(description='Продуктов', ordering='product_count')
     def get_product_count(self, obj):
-        if obj.products:
-            return str(len(obj.products.all()))
-        else:
-            return '0'
+        return obj.product_count
 
 @admin.register(Product)
 class AdminProductView(admin.ModelAdmin):
     list_display = ('id', 'title', 'category', 'quantity', 'price', 'size', 'color', 'created_at', 'get_first_photo')
     list_editable = ('price', 'color', 'size', 'quantity')
+    list_select_related = ('category',)
     prepopulated_fields = {'slug': ('title',)}
-    list_filter = ('category', 'price')
+    list_filter = ('category', ('price', RangeInputFilter))
+    search_fields = ('title', 'slug')
+    autocomplete_fields = ('category',)
     inlines = [AdminGalleryView]
-    
+    action_form = CatalogActionForm
+    actions = ('apply_bulk_changes',)
+
+    @admin.action(description='Изменить цену и остаток (поля рядом с кнопкой)')
+    def apply_bulk_changes(self, request, queryset):
+        form = self.action_form(request.POST)
+        form.fields['action'].choices = self.get_action_choices(request)
+        if not form.is_valid():
+            self.message_user(request, f'Неверные значения: {form.errors.as_text()}', messages.ERROR)
+            return
+        changes = {field: form.cleaned_data.get(field) for field in ('price_percent', 'price_delta', 'stock_delta')}
+        if not any(changes.values()):
+            self.message_user(request, 'Укажите изменение цены или остатка', messages.WARNING)
+            return
+        result = pricing.apply_changes(queryset, **changes)
+        self.message_user(request, f"Изменено продуктов: {result['products']}, позиций в корзинах: {result['carts']}")
+
+    def get_queryset(self, request):
+        first_image = Gallery.objects.filter(product=OuterRef('pk')).order_by('id').values('image')[:1]
+        return super().get_queryset(request).annotate(first_image=Subquery(first_image))
+
     def get_first_photo(self, obj):
-        if obj.images:
-            try:
-                return mark_safe(f'<img src="{obj.images.all()[0].image.url}" width="75"')
-            except:
-                return '-'
+        if obj.first_image:
+            return mark_safe(f'<img src="{images.srcset_for_name(obj.first_image)["thumb"]["jpg"]}" width="75"')
         else:
             return '-'
         
@@ -40,25 +117,61 @@ class AdminProductView(admin.ModelAdmin):
 @admin.register(FavoriteProduct)
 class AdminUserFavoriteProduct(admin.ModelAdmin):
     list_display = ('id', 'product')
+    list_select_related = ('product',)
+    raw_id_fields = ('user', 'product')
         
 @admin.register(Cart)
 class AdminUserCart(admin.ModelAdmin):
     list_display = ('id', 'user', 'product', 'price', 'quantity')
-    list_filter = ('user',)
+    list_select_related = ('user', 'product')
+    list_filter = (('user', RelatedInputFilter),)
+    raw_id_fields = ('user', 'product')
     
 
 @admin.register(Rating)
 class AdminRatingView(admin.ModelAdmin):
     list_display = ('id', 'user', 'product', 'star')
-    list_filter = ('user', 'product', 'star')
+    list_select_related = ('user', 'product')
+    list_filter = (('user', RelatedInputFilter), ('product', RelatedInputFilter), 'star')
+    raw_id_fields = ('user', 'product')
     
 
 @admin.register(OrderProduct)
 class AdminOrderProduct(admin.ModelAdmin):
-    list_display = ('id', 'order', 'product')
-    list_filter = ('order',)
-    
+    list_display = ('id', 'order', 'product', 'quantity', 'price')
+    list_select_related = ('order', 'product')
+    list_filter = (('order', RelatedInputFilter),)
+    raw_id_fields = ('order', 'product')
     
+
+@admin.register(Order)
+class AdminOrderView(admin.ModelAdmin):
+    list_display = ('id', 'user', 'status', 'order_total_price', 'order_product_total_quantity', 'created_at')
+    list_select_related = ('user',)
+    list_filter = ('status',)
+    raw_id_fields = ('user', 'shipping')
+    actions = ('mark_paid',)
+
+    @admin.action(description='Отметить как оплаченные')
+    def mark_paid(self, request, queryset):
+        paid = sum(rollups.mark_order_paid(order) for order in queryset)
+        self.message_user(request, f'Оплаченными отмечено заказов: {paid}')
+
+
+@admin.register(DailyProductSales)
+class AdminDailyProductSales(admin.ModelAdmin):
+    list_display = ('date', 'product', 'quantity', 'revenue')
+    list_select_related = ('product',)
+    date_hierarchy = 'date'
+    raw_id_fields = ('product',)
+
+
+@admin.register(DailyCategorySales)
+class AdminDailyCategorySales(admin.ModelAdmin):
+    list_display = ('date', 'category', 'quantity', 'revenue')
+    list_select_related = ('category',)
+    date_hierarchy = 'date'
+    list_filter = ('category',)
+
     
-admin.site.register(Order)
 admin.site.register(Shipping)
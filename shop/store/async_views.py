@@ -0,0 +1,94 @@
+import functools
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .models import Category, Product
+from . import mixins, counters, fast_serializers
+
+
+PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+
+def safe_methods_only(view):
+    # django.views.decorators.http не поддерживает async-представления в Django 4.2
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponseNotAllowed(['GET', 'HEAD'])
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def _positive_int(value, default):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+async def _product_cards(products):
+    rows = [row async for row in products.values(*fast_serializers.PRODUCT_CARD.columns)]
+    query = fast_serializers.first_images_query([row['id'] for row in rows])
+    first_images = {product_id: name async for product_id, name in query}
+    # srcset проверяет наличие превью в хранилище — блокирующий ввод-вывод не в цикле событий
+    return await sync_to_async(fast_serializers.product_cards_from_rows)(rows, first_images)
+
+
+async def _paginated(request, products):
+    page_size = min(_positive_int(request.GET.get('page_size'), PAGE_SIZE), MAX_PAGE_SIZE)
+    page = _positive_int(request.GET.get('page'), 1)
+    count = await products.acount()
+    offset = (page - 1) * page_size
+    if offset and offset >= count:
+        raise Http404('Неверная страница')
+    url = request.build_absolute_uri()
+    next_link = replace_query_param(url, 'page', page + 1) if offset + page_size < count else None
+    if page == 1:
+        previous_link = None
+    elif page == 2:
+        previous_link = remove_query_param(url, 'page')
+    else:
+        previous_link = replace_query_param(url, 'page', page - 1)
+    return JsonResponse({
+        'count': count,
+        'next': next_link,
+        'previous': previous_link,
+        'results': await _product_cards(products[offset:offset + page_size]),
+    })
+
+
+@safe_methods_only
+async def category_tree(request):
+    rows = [row async for row in Category.objects.order_by('id').values(*fast_serializers.CATEGORY.columns)]
+    return JsonResponse(await sync_to_async(fast_serializers.category_tree_from_rows)(rows, request), safe=False)
+
+
+@safe_methods_only
+async def category_products(request, pk):
+    if not await Category.objects.filter(pk=pk).aexists():
+        raise Http404('Категория не найдена')
+    products = mixins.order_products(Product.objects.filter(category_id=pk), request.GET)
+    return await _paginated(request, products)
+
+
+@safe_methods_only
+async def product_detail(request, pk):
+    row = await Product.objects.filter(pk=pk).values(*fast_serializers.PRODUCT_DETAIL.columns).afirst()
+    if row is None:
+        raise Http404('Продукт не найден')
+    reviews = [review async for review in fast_serializers.reviews_query([pk])]
+    counters.incr(row['id'], counters.VIEWS)
+    return JsonResponse(fast_serializers.product_details_from_rows([row], reviews)[0])
+
+
+@safe_methods_only
+async def search(request):
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'q': 'Пустой поисковый запрос'}, status=400)
+    products = mixins.order_products(Product.objects.filter(title__icontains=query), request.GET)
+    return await _paginated(request, products)
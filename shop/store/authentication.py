@@ -0,0 +1,113 @@
+import hashlib
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication, AUTH_HEADER_TYPE_BYTES
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from shop import settings
+from . import routers, shared_cache
+
+
+TOKEN_KEYWORD = b'token'
+
+
+def _token_cache_key(key):
+    return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def _user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def _cache():
+    """Кэш пользователей или None. Сброс при выходе, смене пароля и деактивации
+    должен дойти до всех воркеров, поэтому без общего кэша (SHARED_CACHE_ALIAS
+    с locmem) пользователь каждый раз читается из БД."""
+    return shared_cache.get_cache() if shared_cache.is_shared() else None
+
+
+def invalidate_token(key):
+    cache = _cache()
+    if cache is not None:
+        cache.delete(_token_cache_key(key))
+
+
+def invalidate_user(user_id):
+    cache = _cache()
+    if cache is not None:
+        cache.delete(_user_cache_key(user_id))
+
+
+class CachedAuthentication(JWTAuthentication):
+    """Выбирает схему по префиксу заголовка Authorization (Token или JWT) и берёт
+    пользователя из общего кэша воркеров вместо запроса в БД на каждый вызов API.
+
+    Представления с claims_only_user = True на безопасных методах получают
+    TokenUser из claims JWT и вовсе не обращаются к таблице пользователей.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if not header:
+            return None
+        parts = header.split()
+        if not parts:
+            return None
+        if parts[0].lower() == TOKEN_KEYWORD:
+            return self.authenticate_token(parts)
+        if parts[0] in AUTH_HEADER_TYPE_BYTES:
+            validated_token = self.get_validated_token(self.get_raw_token(header))
+            if self.claims_only_allowed(request):
+                return TokenUser(validated_token), validated_token
+            return self.get_user(validated_token), validated_token
+        return None
+
+    def authenticate_header(self, request):
+        return 'Token'
+
+    def claims_only_allowed(self, request):
+        view = (getattr(request, 'parser_context', None) or {}).get('view')
+        return request.method in SAFE_METHODS and getattr(view, 'claims_only_user', False)
+
+    def authenticate_token(self, parts):
+        if len(parts) != 2:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain spaces.'))
+        try:
+            key = parts[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed(_('Invalid token header. Token string should not contain invalid characters.'))
+        cache = _cache()
+        cache_key = _token_cache_key(key)
+        token = cache.get(cache_key) if cache is not None else None
+        user = cache.get(_user_cache_key(token.user_id)) if token is not None else None
+        if user is None:
+            with routers.use_primary():
+                token = Token.objects.select_related('user').filter(key=key).first()
+            if token is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            user = token.user
+            if user.is_active and cache is not None:
+                # токен кэшируется без пользователя: изменение пользователя сбрасывает
+                # одну запись по user_id, без поиска всех его токенов
+                cache.set_many({cache_key: Token(key=token.key, user_id=token.user_id, created=token.created),
+                                _user_cache_key(user.pk): user}, settings.AUTH_CACHE_TIMEOUT)
+        token.user = user
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return user, token
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(jwt_settings.USER_ID_CLAIM)
+        cache = _cache()
+        cache_key = _user_cache_key(user_id)
+        user = cache.get(cache_key) if cache is not None else None
+        if user is None:
+            with routers.use_primary():
+                user = super().get_user(validated_token)
+            if cache is not None:
+                cache.set(cache_key, user, settings.AUTH_CACHE_TIMEOUT)
+        return user
@@ -0,0 +1,85 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'p50_ms': _ms(percentile(latencies, 0.50)),
+        'p95_ms': _ms(percentile(latencies, 0.95)),
+        'p99_ms': _ms(percentile(latencies, 0.99)),
+        'max_ms': _ms(max(latencies) if latencies else None),
+    }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+async def _slow_request(url, headers, read_delay, chunk_size):
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    request = f'GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: close\r\n'
+    request += ''.join(f'{name}: {value}\r\n' for name, value in headers.items()) + '\r\n'
+    writer.write(request.encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    while await reader.read(chunk_size):
+        if read_delay:
+            await asyncio.sleep(read_delay)
+    writer.close()
+    return int(status_line.split()[1]) if status_line else 0
+
+
+async def slow_clients(url, clients, requests_per_client, headers=None, read_delay=0.0, chunk_size=1024):
+    latencies = []
+    errors = 0
+
+    async def client():
+        nonlocal errors
+        for _ in range(requests_per_client):
+            started = time.perf_counter()
+            try:
+                status = await _slow_request(url, headers or {}, read_delay, chunk_size)
+            except OSError:
+                status = 0
+            if 200 <= status < 400:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return summarize(latencies, time.perf_counter() - started, errors)
+
+
+def compare(results, baseline, max_regression=0.2, min_ms=2.0, max_extra_queries=0):
+    """Сравнивает замеры bench_api с сохранённым прогоном.
+
+    Регрессия — рост p95 больше чем на max_regression (доля) при p95 базового
+    прогона не меньше min_ms, либо больше SQL-запросов на запрос, чем было.
+    """
+    regressions = []
+    for route, current in results['routes'].items():
+        previous = baseline.get('routes', {}).get(route)
+        if not previous or 'p95_ms' not in previous or 'p95_ms' not in current:
+            continue
+        if previous['p95_ms'] >= min_ms and current['p95_ms'] > previous['p95_ms'] * (1 + max_regression):
+            regressions.append(f"{route}: p95 {previous['p95_ms']} -> {current['p95_ms']} мс")
+        if current['queries'] > previous['queries'] + max_extra_queries:
+            regressions.append(f"{route}: запросов {previous['queries']} -> {current['queries']}")
+    return regressions
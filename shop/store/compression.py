@@ -0,0 +1,119 @@
+import gzip
+import hashlib
+
+from django.conf import settings as django_settings
+from django.core.cache import caches
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+from shop import settings
+from . import metrics
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - без brotli отдаём только gzip
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'application/javascript', 'application/xml',
+                      'image/svg+xml', 'text/')
+# На лету brotli/gzip сжимается только API: в HTML рядом с отражённым вводом лежит
+# CSRF-токен, и длина сжатого ответа выдавала бы его (BREACH)
+LIVE_TYPES = ('application/json', 'application/x-ndjson')
+# Остальное — gzip со случайным именем файла в заголовке, как GZipMiddleware
+BREACH_MAX_RANDOM_BYTES = 100
+
+# Уровни: разовое сжатие в кэш может быть медленным и плотным, на лету — быстрым
+CACHED_LEVELS = {'br': 11, 'gzip': 9}
+LIVE_LEVELS = {'br': 4, 'gzip': 6}
+
+metrics.registry.describe('http_compression_cache_total', 'counter',
+                          'Обращения к кэшу сжатых ответов по кодировке и результату')
+
+
+def accepted_encoding(accept_encoding, encodings=('br', 'gzip')):
+    """Первая из encodings, принятая по Accept-Encoding с учётом q=0; None, если сжимать нельзя."""
+    accepted = {}
+    for item in accept_encoding.lower().split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    for encoding in encodings:
+        if encoding == 'br' and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(content, encoding, level):
+    if encoding == 'br':
+        return brotli.compress(content, quality=level)
+    # mtime=0: одинаковое содержимое даёт одинаковые байты (и ETag у прокси)
+    return gzip.compress(content, compresslevel=level, mtime=0)
+
+
+def is_cacheable(request, response):
+    """Кэшируются только анонимные GET к каталогу: у авторизованных в ответе
+    избранное и корзина, их тела не повторяются между пользователями."""
+    return (request.method in ('GET', 'HEAD') and response.status_code == 200
+            and not request.META.get('HTTP_AUTHORIZATION')
+            and django_settings.SESSION_COOKIE_NAME not in request.COOKIES
+            and request.path.startswith(settings.COMPRESSION_CACHE_PREFIXES)
+            and 'private' not in response.get('Cache-Control', '')
+            and 'no-store' not in response.get('Cache-Control', ''))
+
+
+def compressed_body(content, encoding, cacheable):
+    """Сжатое тело; для cacheable берётся из кэша по хешу содержимого, так что
+    сжатие выполняется один раз на версию ответа, а не на каждый запрос."""
+    if not cacheable:
+        return compress(content, encoding, LIVE_LEVELS[encoding])
+    cache = caches[settings.COMPRESSION_CACHE_ALIAS]
+    key = f'compressed:{encoding}:{hashlib.blake2b(content, digest_size=20).hexdigest()}'
+    body = cache.get(key)
+    metrics.inc('http_compression_cache_total', (('encoding', encoding), ('result', 'miss' if body is None else 'hit')))
+    if body is None:
+        body = compress(content, encoding, CACHED_LEVELS[encoding])
+        cache.set(key, body, settings.COMPRESSION_CACHE_TIMEOUT)
+    return body
+
+
+def compress_response(request, response):
+    if response.streaming or response.has_header('Content-Encoding'):
+        return response
+    content_type = response.get('Content-Type', '')
+    if not content_type.startswith(COMPRESSIBLE_TYPES):
+        return response
+    if len(response.content) < settings.COMPRESSION_MIN_LENGTH:
+        return response
+    patch_vary_headers(response, ('Accept-Encoding',))
+    accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    cacheable = is_cacheable(request, response)
+    if cacheable or content_type.startswith(LIVE_TYPES):
+        # анонимные ответы каталога секретов не содержат
+        encoding = accepted_encoding(accept_encoding)
+        if encoding is None:
+            return response
+        body = compressed_body(response.content, encoding, cacheable)
+    else:
+        # у brotli нет поля, куда добавить случайные байты
+        encoding = accepted_encoding(accept_encoding, ('gzip',))
+        if encoding is None:
+            return response
+        body = compress_string(response.content, max_random_bytes=BREACH_MAX_RANDOM_BYTES)
+    if len(body) >= len(response.content):
+        return response
+    response.content = body
+    response['Content-Length'] = str(len(body))
+    response['Content-Encoding'] = encoding
+    # Сжатое тело не побайтно равно исходному: сильный ETag становится слабым
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    return response
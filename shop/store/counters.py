@@ -0,0 +1,133 @@
+import asyncio
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Case, F, IntegerField, Value, When
+
+from shop import settings
+from .models import Product
+
+
+logger = logging.getLogger(__name__)
+
+VIEWS = 'views_count'
+FAVORITES = 'favorites_count'
+CART_ADDS = 'cart_adds_count'
+
+POPULARITY_WEIGHTS = {VIEWS: 1, FAVORITES: 5, CART_ADDS: 10}
+FLUSH_BATCH_SIZE = 500
+
+
+class CounterBuffer:
+    def __init__(self, flush_interval=5, max_pending=5000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._wake = threading.Event()
+        self._thread = None
+        self.increments = 0
+        self.statements = 0
+
+    def incr(self, product_id, field, delta=1):
+        with self._lock:
+            self._pending[(product_id, field)] += delta
+            self.increments += delta
+            size = len(self._pending)
+        if self._thread is None:
+            self._start()
+        if size >= self.max_pending:
+            if _in_event_loop():
+                # ORM в цикле событий даёт SynchronousOnlyOperation — сбрасывает фоновый поток
+                self._wake.set()
+            else:
+                self.flush()
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+        return pending
+
+    def _restore(self, pending):
+        with self._lock:
+            for key, delta in pending.items():
+                if len(self._pending) >= self.max_pending * 2:
+                    break
+                self._pending[key] += delta
+
+    def flush(self):
+        with self._flush_lock:
+            pending = self._drain()
+            if not pending:
+                return 0
+            deltas = defaultdict(dict)
+            for (product_id, field), delta in pending.items():
+                deltas[product_id][field] = delta
+            product_ids = list(deltas)
+            statements = 0
+            try:
+                for start in range(0, len(product_ids), FLUSH_BATCH_SIZE):
+                    batch = product_ids[start:start + FLUSH_BATCH_SIZE]
+                    Product.objects.filter(pk__in=batch).update(**self._increments(batch, deltas))
+                    statements += 1
+            except DatabaseError:
+                logger.exception('Не удалось сохранить счётчики популярности')
+                unsaved = set(product_ids[start:])
+                self._restore({key: delta for key, delta in pending.items() if key[0] in unsaved})
+            self.statements += statements
+            return statements
+
+    def _increments(self, product_ids, deltas):
+        fields = {}
+        for field in POPULARITY_WEIGHTS:
+            whens = [When(pk=product_id, then=Value(deltas[product_id][field]))
+                     for product_id in product_ids if deltas[product_id].get(field)]
+            if whens:
+                fields[field] = F(field) + Case(*whens, default=Value(0), output_field=IntegerField())
+        popularity = [When(pk=product_id, then=Value(sum(POPULARITY_WEIGHTS[field] * delta
+                                                          for field, delta in deltas[product_id].items())))
+                      for product_id in product_ids]
+        fields['popularity'] = F('popularity') + Case(*popularity, default=Value(0), output_field=IntegerField())
+        return fields
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='popularity-counters', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # поток один на процесс: если он умрёт, счётчики будут сбрасываться только по max_pending
+                logger.exception('Ошибка в потоке сброса счётчиков популярности')
+            finally:
+                close_old_connections()
+
+
+def _in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+buffer = CounterBuffer(
+    flush_interval=settings.POPULARITY_FLUSH_INTERVAL,
+    max_pending=settings.POPULARITY_MAX_PENDING,
+)
+
+
+def incr(product_id, field, delta=1):
+    buffer.incr(product_id, field, delta)
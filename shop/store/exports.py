@@ -0,0 +1,108 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from shop import settings
+from .models import Category, OrderProduct, Product
+
+
+ORDER_EXPORT_COLUMNS = (
+    ('order_id', 'order_id'),
+    ('created_at', 'order__created_at'),
+    ('status', 'order__status'),
+    ('user_id', 'order__user_id'),
+    ('order_total_price', 'order__order_total_price'),
+    ('order_product_total_quantity', 'order__order_product_total_quantity'),
+    ('shipping_id', 'order__shipping_id'),
+    ('first_name', 'order__shipping__first_name'),
+    ('last_name', 'order__shipping__last_name'),
+    ('email', 'order__shipping__email'),
+    ('phone', 'order__shipping__phone'),
+    ('address', 'order__shipping__address'),
+    ('product_id', 'product_id'),
+    ('product_title', 'product__title'),
+    ('quantity', 'quantity'),
+    ('price', 'price'),
+)
+
+ORDER_EXPORT_NAMES = tuple(name for name, _ in ORDER_EXPORT_COLUMNS)
+
+CATALOG_EXPORT_NAMES = ('type', 'slug', 'title', 'parent', 'category', 'description', 'price', 'quantity',
+                        'size', 'color')
+PRODUCT_EXPORT_LOOKUPS = ('slug', 'title', 'category__slug', 'description', 'price', 'quantity', 'size', 'color')
+
+EXPORT_CHUNK_SIZE = 2000
+ROWS_PER_WRITE = 500
+# С этих символов Excel и LibreOffice начинают формулу: такие ячейки выгружаются с апострофом
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def order_rows(date_from=None, date_to=None, chunk_size=EXPORT_CHUNK_SIZE):
+    lines = OrderProduct.objects.using(settings.STREAMING_DATABASE)
+    if date_from:
+        lines = lines.filter(order__created_at__gte=date_from)
+    if date_to:
+        lines = lines.filter(order__created_at__lte=date_to)
+    lines = (lines.order_by('order__created_at', 'order_id', 'id')
+             .values_list(*(lookup for _, lookup in ORDER_EXPORT_COLUMNS)))
+    return lines.iterator(chunk_size=chunk_size)
+
+
+def catalog_rows(chunk_size=EXPORT_CHUNK_SIZE):
+    # Категории идут от корня к листьям, чтобы файл можно было сразу загрузить обратно
+    categories = list(Category.objects.using(settings.STREAMING_DATABASE).values_list('id', 'slug', 'title', 'parent_id'))
+    slugs = {category_id: slug for category_id, slug, _, _ in categories}
+    parents = {category_id: parent_id for category_id, _, _, parent_id in categories}
+
+    def depth(category_id):
+        level = 0
+        while parents.get(category_id) and level < len(parents):
+            category_id = parents[category_id]
+            level += 1
+        return level
+
+    for category_id, slug, title, parent_id in sorted(categories, key=lambda category: (depth(category[0]), category[0])):
+        yield ('category', slug, title, slugs.get(parent_id, ''), '', '', '', '', '', '')
+    products = (Product.objects.using(settings.STREAMING_DATABASE).order_by('id')
+                .values_list(*PRODUCT_EXPORT_LOOKUPS).iterator(chunk_size=chunk_size))
+    for slug, title, category, description, price, quantity, size, color in products:
+        yield ('product', slug, title, '', category, description, price, quantity, size, color)
+
+
+def _batched(lines):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= ROWS_PER_WRITE:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def csv_cell(value):
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_stream(rows, names=ORDER_EXPORT_NAMES):
+    writer = csv.writer(Echo())
+    yield writer.writerow(names)
+    yield from _batched(writer.writerow(map(csv_cell, row)) for row in rows)
+
+
+def ndjson_stream(rows, names=ORDER_EXPORT_NAMES):
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    yield from _batched(encoder.encode(dict(zip(names, row))) + '\n' for row in rows)
+
+
+EXPORT_FORMATS = {
+    'csv': (csv_stream, 'text/csv; charset=utf-8'),
+    'ndjson': (ndjson_stream, 'application/x-ndjson; charset=utf-8'),
+}
@@ -0,0 +1,290 @@
+import functools
+
+from django.core.files.storage import default_storage
+from django.db.models import Min
+from django.http import Http404
+from django.utils import timezone
+
+from shop import settings
+from .models import Category, Product, Gallery, Review, Cart, Rating
+from . import images, favorites
+
+
+NO_IMAGE_URL = 'https://www.raumplus.ru/upload/iblock/545/Skoro-zdes-budet-foto.jpg'
+
+
+def format_datetime(value):
+    # Формат DateTimeField из DRF: ISO 8601, UTC как Z
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def image_url(request, name):
+    return request.build_absolute_uri(default_storage.url(name)) if name else None
+
+
+def first_image_url(name):
+    return default_storage.url(name) if name else NO_IMAGE_URL
+
+
+def first_images_query(product_ids):
+    """product_id -> имя первого изображения галереи одним запросом."""
+    first_ids = (Gallery.objects.filter(product_id__in=product_ids)
+                 .values('product_id').annotate(first_id=Min('id')).order_by().values('first_id'))
+    return Gallery.objects.filter(id__in=first_ids).values_list('product_id', 'image')
+
+
+class RowSerializer:
+    """Сериализатор строк из values() для горячих GET-эндпоинтов.
+
+    fields — (ключ ответа, источник[, колонки]) в том же порядке, что у заменяемого
+    DRF-сериализатора: ответ должен совпадать байт в байт. Источник — имя колонки
+    или функция (serializer, row, context); извлекатели собираются один раз
+    при создании экземпляра, а не на каждый объект, как в DRF.
+
+    names ограничивает ответ частью полей (?fields=), тогда и columns для values()
+    содержат только нужные им колонки плюс required_columns.
+    """
+    fields = ()
+    required_columns = ()
+
+    def __init__(self, names=None):
+        self.extractors = []
+        columns = dict.fromkeys(self.required_columns)
+        for name, source, *needs in self.fields:
+            if names is not None and name not in names:
+                continue
+            if isinstance(source, str):
+                self.extractors.append((name, _column(source)))
+                columns[source] = None
+            else:
+                self.extractors.append((name, source.__get__(self)))
+                columns.update(dict.fromkeys(needs[0] if needs else ()))
+        self.columns = tuple(columns)
+        self.names = tuple(name for name, _ in self.extractors)
+
+    @classmethod
+    @functools.lru_cache(maxsize=64)
+    def select(cls, fields=None):
+        """Экземпляр для набора полей из mixins.sparse_fields; лишние имена игнорируются."""
+        if fields is None:
+            return cls()
+        return cls(tuple(name for name, *_ in cls.fields if name in fields))
+
+    def to_representation(self, row, context):
+        return {name: extract(row, context) for name, extract in self.extractors}
+
+    def many(self, rows, context):
+        extractors = self.extractors
+        return [{name: extract(row, context) for name, extract in extractors} for row in rows]
+
+
+def _column(name):
+    def extract(row, context):
+        return row[name]
+    return extract
+
+
+class ProductCardRows(RowSerializer):
+    """Замена ProductsForCategories; context: first_images."""
+    required_columns = ('id',)
+
+    def get_first_image(self, row, context):
+        return first_image_url(context['first_images'].get(row['id']))
+
+    def get_first_image_srcset(self, row, context):
+        return images.srcset_for_name(context['first_images'].get(row['id']))
+
+    def is_popular(self, row, context):
+        return row['popularity'] >= settings.POPULARITY_BADGE_THRESHOLD
+
+    fields = (
+        ('id', 'id'),
+        ('title', 'title'),
+        ('price', 'price'),
+        ('slug', 'slug'),
+        ('category', 'category_id'),
+        ('get_first_image', get_first_image, ('id',)),
+        ('get_first_image_srcset', get_first_image_srcset, ('id',)),
+        ('is_popular', is_popular, ('popularity',)),
+    )
+
+
+class CategoryRows(RowSerializer):
+    """Замена CategorySerializer; context: request, children (parent_id -> строки)."""
+    required_columns = ('id', 'parent_id')
+
+    def subcategories(self, row, context):
+        return self.many(context['children'].get(row['id'], ()), context)
+
+    def get_image_srcset(self, row, context):
+        return images.srcset_for_name(row['image'])
+
+    def image(self, row, context):
+        return image_url(context['request'], row['image'])
+
+    fields = (
+        ('id', 'id'),
+        ('subcategories', subcategories, ('id',)),
+        ('get_image_srcset', get_image_srcset, ('image',)),
+        ('title', 'title'),
+        ('image', image, ('image',)),
+        ('slug', 'slug'),
+        ('parent', 'parent_id'),
+    )
+
+
+class ReviewRows(RowSerializer):
+    """Замена ReviewSerializer; context: children (parent_id -> строки)."""
+
+    def created_at(self, row, context):
+        return format_datetime(row['created_at'])
+
+    def children(self, row, context):
+        return self.many(context['children'].get(row['id'], ()), context)
+
+    fields = (
+        ('id', 'id'),
+        ('user', 'user__username'),
+        ('text', 'text'),
+        ('created_at', created_at, ('created_at',)),
+        ('children', children, ('id',)),
+    )
+
+
+class ProductDetailRows(RowSerializer):
+    """Замена ProductDetailSerializer без полей текущего пользователя; context: children (отзывы)."""
+    required_columns = ('id',)
+
+    def reviews(self, row, context):
+        return REVIEW.many(context['children'].get(None, ()), context)
+
+    def created_at(self, row, context):
+        return format_datetime(row['created_at'])
+
+    fields = (
+        ('id', 'id'),
+        ('category', 'category__title'),
+        ('reviews', reviews),
+        ('title', 'title'),
+        ('description', 'description'),
+        ('quantity', 'quantity'),
+        ('price', 'price'),
+        ('size', 'size'),
+        ('color', 'color'),
+        ('slug', 'slug'),
+        ('created_at', created_at, ('created_at',)),
+        ('views_count', 'views_count'),
+        ('favorites_count', 'favorites_count'),
+        ('cart_adds_count', 'cart_adds_count'),
+        ('popularity', 'popularity'),
+    )
+
+
+PRODUCT_CARD = ProductCardRows.select()
+CATEGORY = CategoryRows.select()
+REVIEW = ReviewRows.select()
+PRODUCT_DETAIL = ProductDetailRows.select()
+
+# Поля, которые сериализаторы добавляют авторизованному пользователю
+PRODUCT_CARD_USER_FIELDS = ('favorite',)
+PRODUCT_DETAIL_USER_FIELDS = ('favorite', 'in_cart', 'rating', 'image')
+# Всё, что можно указать в ?fields= / ?exclude=
+PRODUCT_CARD_FIELDS = PRODUCT_CARD.names + PRODUCT_CARD_USER_FIELDS
+CATEGORY_FIELDS = CATEGORY.names
+PRODUCT_DETAIL_FIELDS = PRODUCT_DETAIL.names + PRODUCT_DETAIL_USER_FIELDS
+
+
+def _wanted(fields, name):
+    return fields is None or name in fields
+
+
+def _children(rows):
+    children = {}
+    for row in rows:
+        children.setdefault(row['parent_id'], []).append(row)
+    return children
+
+
+def product_cards_from_rows(rows, first_images, serializer=PRODUCT_CARD):
+    return serializer.many(rows, {'first_images': first_images})
+
+
+def category_tree_from_rows(rows, request, serializer=CATEGORY):
+    children = _children(rows)
+    return serializer.many(children.get(None, ()), {'request': request, 'children': children})
+
+
+def reviews_query(product_ids):
+    return (Review.objects.filter(product_id__in=product_ids).order_by('id')
+            .values(*REVIEW.columns, 'product_id', 'parent_id'))
+
+
+def product_details_from_rows(rows, reviews, serializer=PRODUCT_DETAIL):
+    by_product = {}
+    for review in reviews:
+        by_product.setdefault(review['product_id'], []).append(review)
+    return [serializer.to_representation(row, {'children': _children(by_product.get(row['id'], ()))})
+            for row in rows]
+
+
+def product_cards(rows, request, fields=None):
+    """rows — values(*ProductCardRows.select(fields).columns)."""
+    serializer = ProductCardRows.select(fields)
+    rows = list(rows)
+    product_ids = [row['id'] for row in rows]
+    first_images = {}
+    if {'get_first_image', 'get_first_image_srcset'} & set(serializer.names):
+        first_images = dict(first_images_query(product_ids))
+    cards = product_cards_from_rows(rows, first_images, serializer)
+    if request.user.is_authenticated and _wanted(fields, 'favorite'):
+        favorite_products = favorites.for_request(request)
+        for card, product_id in zip(cards, product_ids):
+            card['favorite'] = product_id in favorite_products
+    return cards
+
+
+def category_tree(request, fields=None):
+    serializer = CategoryRows.select(fields)
+    return category_tree_from_rows(Category.objects.order_by('id').values(*serializer.columns), request, serializer)
+
+
+def product_details(rows, request, fields=None):
+    """rows — values(*ProductDetailRows.select(fields).columns)."""
+    serializer = ProductDetailRows.select(fields)
+    rows = list(rows)
+    product_ids = [row['id'] for row in rows]
+    reviews = reviews_query(product_ids) if 'reviews' in serializer.names else ()
+    details = product_details_from_rows(rows, reviews, serializer)
+    user = request.user
+    if details and user.is_authenticated:
+        if _wanted(fields, 'favorite'):
+            favorite_products = favorites.for_request(request)
+            for detail, product_id in zip(details, product_ids):
+                detail['favorite'] = favorite_products.get(product_id, False)
+        # как .first() в ProductDetailSerializer: при дублях побеждает меньший id
+        if _wanted(fields, 'in_cart'):
+            carts = dict(Cart.objects.filter(user_id=user.id, product_id__in=product_ids)
+                         .order_by('-id').values_list('product_id', 'id'))
+            for detail, product_id in zip(details, product_ids):
+                detail['in_cart'] = carts.get(product_id, False)
+        if _wanted(fields, 'rating'):
+            stars = dict(Rating.objects.filter(user_id=user.id, product_id__in=product_ids)
+                         .order_by('-id').values_list('product_id', 'star'))
+            for detail, product_id in zip(details, product_ids):
+                detail['rating'] = stars.get(product_id, False)
+        if _wanted(fields, 'image'):
+            first_images = dict(first_images_query(product_ids))
+            for detail, product_id in zip(details, product_ids):
+                detail['image'] = first_image_url(first_images.get(product_id))
+    return details
+
+
+def product_detail(pk, request, fields=None):
+    columns = ProductDetailRows.select(fields).columns
+    details = product_details(Product.objects.filter(pk=pk).values(*columns), request, fields)
+    if not details:
+        raise Http404('Продукт не найден')
+    return details[0]
@@ -0,0 +1,42 @@
+from django.db import transaction
+
+from .models import FavoriteProduct
+from . import shared_cache
+
+
+FAVORITES_CACHE_TIMEOUT = 60 * 60
+# Без общего кэша обновление после записи видно только одному воркеру,
+# поэтому остальные не должны держать старый список дольше нескольких секунд
+FAVORITES_LOCAL_CACHE_TIMEOUT = 5
+FAVORITES_CHECK_MAX_PRODUCTS = 1000
+
+
+def _cache_key(user_id):
+    return f'favorites:{user_id}'
+
+
+def load(user_id):
+    favorites = dict(FavoriteProduct.objects.filter(user_id=user_id).values_list('product_id', 'id'))
+    timeout = FAVORITES_CACHE_TIMEOUT if shared_cache.is_shared() else FAVORITES_LOCAL_CACHE_TIMEOUT
+    shared_cache.get_cache().set(_cache_key(user_id), favorites, timeout)
+    return favorites
+
+
+def get_favorites(user_id):
+    favorites = shared_cache.get_cache().get(_cache_key(user_id))
+    if favorites is None:
+        favorites = load(user_id)
+    return favorites
+
+
+def for_request(request):
+    user = request.user
+    if not user.is_authenticated:
+        return {}
+    if getattr(request, '_favorite_products', None) is None:
+        request._favorite_products = get_favorites(user.id)
+    return request._favorite_products
+
+
+def refresh(user_id):
+    transaction.on_commit(lambda: load(user_id))
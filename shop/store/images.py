@@ -0,0 +1,128 @@
+import hashlib
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from shop import settings
+
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVES_DIR = 'derivatives'
+
+IMAGE_PRESETS = settings.IMAGE_PRESETS
+
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS, thread_name_prefix='image-derivatives')
+
+
+def preset_fingerprint(preset, extension):
+    # Ширина и параметры кодирования в имени: после смены IMAGE_PRESETS или
+    # FORMATS превью получают новые URL, а не перезаписываются под старыми
+    image_format, options = FORMATS[extension]
+    parameters = repr((IMAGE_PRESETS[preset], image_format, sorted(options.items())))
+    return hashlib.sha256(parameters.encode()).hexdigest()[:8]
+
+
+def derivative_name(name, preset, extension):
+    base, _ = posixpath.splitext(name)
+    return f'{DERIVATIVES_DIR}/{base}/{preset}-{preset_fingerprint(preset, extension)}.{extension}'
+
+
+def srcset(field_file):
+    if not field_file:
+        return None
+    return srcset_for_name(field_file.name)
+
+
+# Пары (имя, пресет), для которых превью уже есть. Превью не удаляются, поэтому
+# запоминаются только найденные, а отсутствующие проверяются заново.
+_ready = set()
+READY_CACHE_SIZE = 100_000
+
+
+def derivatives_exist(name, preset, storage=default_storage):
+    key = (name, preset)
+    if key in _ready:
+        return True
+    # JPEG пишется последним из форматов пресета
+    if not storage.exists(derivative_name(name, preset, 'jpg')):
+        return False
+    if len(_ready) >= READY_CACHE_SIZE:
+        _ready.clear()
+    _ready.add(key)
+    return True
+
+
+def srcset_for_name(name):
+    """{пресет: {формат: URL}}. Пока превью не созданы (генерация отложена, старые
+    загрузки ждут regenerate_images), пресет указывает на оригинал, а не на 404."""
+    if not name:
+        return None
+    original = None
+    result = {}
+    for preset in IMAGE_PRESETS:
+        if derivatives_exist(name, preset):
+            result[preset] = {extension: default_storage.url(derivative_name(name, preset, extension))
+                              for extension in FORMATS}
+        else:
+            original = original or default_storage.url(name)
+            result[preset] = dict.fromkeys(FORMATS, original)
+    return result
+
+
+def generate(name, storage=default_storage, overwrite=False):
+    from PIL import Image, ImageOps
+
+    targets = {(preset, extension): derivative_name(name, preset, extension)
+               for preset in IMAGE_PRESETS for extension in FORMATS}
+    if not overwrite:
+        targets = {key: target for key, target in targets.items() if not storage.exists(target)}
+        if not targets:
+            # оригинал не открывается и не декодируется, если все превью уже есть
+            return 0
+    created = 0
+    with storage.open(name, 'rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    for preset, width in IMAGE_PRESETS.items():
+        if not any((preset, extension) in targets for extension in FORMATS):
+            continue
+        resized = image.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+        for extension, (image_format, options) in FORMATS.items():
+            target = targets.get((preset, extension))
+            if target is None:
+                continue
+            if storage.exists(target):
+                storage.delete(target)
+            output = resized.convert('RGB') if image_format == 'JPEG' else resized
+            buffer = io.BytesIO()
+            output.save(buffer, image_format, **options)
+            storage.save(target, ContentFile(buffer.getvalue()))
+            created += 1
+    return created
+
+
+def _generate_safely(name):
+    try:
+        return generate(name)
+    except Exception:
+        logger.exception('Не удалось создать превью для %s', name)
+
+
+def schedule(name):
+    if name:
+        transaction.on_commit(lambda: _executor.submit(_generate_safely, name))
+
@@ -0,0 +1,225 @@
+import codecs
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .exports import FORMULA_PREFIXES
+from .models import Category, Product
+from .signals import catalog_bulk_updated
+
+
+IMPORT_FORMATS = ('csv', 'jsonl', 'ndjson')
+IMPORT_BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+ROW_TYPES = ('category', 'product', 'stock')
+PRODUCT_UPDATE_FIELDS = ('title', 'description', 'price', 'quantity', 'size', 'color', 'category')
+# Без этих колонок (или с пустым значением) строка не трогает поле у существующего
+# продукта, а новый получает значение по умолчанию
+PRODUCT_OPTIONAL_FIELDS = ('description', 'price', 'quantity', 'color')
+
+
+def read_rows(file, file_format):
+    """Построчно читает бинарный файл и отдаёт (номер строки, dict или текст ошибки)."""
+    lines = codecs.iterdecode(file, 'utf-8-sig')
+    if file_format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, {name: _csv_value(value) for name, value in row.items()}
+    else:
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield line_number, f'Некорректный JSON: {error}'
+                continue
+            yield line_number, row if isinstance(row, dict) else 'Ожидается JSON-объект'
+
+
+def _csv_value(value):
+    # выгрузка каталога экранирует формулы апострофом (store.exports.csv_cell)
+    if isinstance(value, str) and value[:1] == "'" and value[1:].startswith(FORMULA_PREFIXES):
+        return value[1:]
+    return value
+
+
+def _text(row, name):
+    value = row.get(name)
+    return '' if value is None else str(value).strip()
+
+
+def _number(row, name):
+    value = _text(row, name)
+    if not value:
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValidationError({name: 'Ожидается целое число'})
+    if number < 0:
+        raise ValidationError({name: 'Должно быть не меньше нуля'})
+    return number
+
+
+def _messages(error):
+    if hasattr(error, 'message_dict'):
+        return '; '.join(f'{field}: {", ".join(messages)}' for field, messages in error.message_dict.items())
+    return '; '.join(error.messages)
+
+
+class CatalogImporter:
+    """Upsert категорий и продуктов по slug пачками bulk_create(update_conflicts=True).
+
+    Строки с type=stock меняют только остаток существующего продукта. У продукта
+    обновляются только поля, заданные в строке. Категория
+    или родитель должны встретиться в файле раньше или уже быть в базе. Каждая
+    пачка пишется в своей транзакции, ошибочные строки попадают в отчёт и не
+    мешают остальным.
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE, progress=None):
+        self.batch_size = batch_size
+        self.progress = progress
+        self.categories = dict(Category.objects.values_list('slug', 'id'))
+        self.pending = {row_type: {} for row_type in ROW_TYPES}
+        self.report = {
+            'rows': 0,
+            'created': {'category': 0, 'product': 0},
+            'updated': {'category': 0, 'product': 0, 'stock': 0},
+            'error_count': 0,
+            'errors': [],
+        }
+
+    def run(self, rows):
+        for line_number, row in rows:
+            self.report['rows'] += 1
+            try:
+                if not isinstance(row, dict):
+                    raise ValidationError(row)
+                self.add(line_number, row)
+            except ValidationError as error:
+                self.error(line_number, row, _messages(error))
+        for row_type in ROW_TYPES:
+            self.flush(row_type)
+        if sum(self.report['created'].values()) or sum(self.report['updated'].values()):
+            catalog_bulk_updated.send(sender=Product, product_ids=None, fields=list(PRODUCT_UPDATE_FIELDS))
+        return self.report
+
+    def error(self, line_number, row, message):
+        self.report['error_count'] += 1
+        if len(self.report['errors']) < MAX_REPORTED_ERRORS:
+            slug = _text(row, 'slug') if isinstance(row, dict) else ''
+            self.report['errors'].append({'line': line_number, 'slug': slug, 'error': message})
+
+    def add(self, line_number, row):
+        row_type = _text(row, 'type') or 'product'
+        if row_type not in ROW_TYPES:
+            raise ValidationError({'type': f'Допустимо: {", ".join(ROW_TYPES)}'})
+        slug = _text(row, 'slug')
+        if not slug:
+            raise ValidationError({'slug': 'Обязательное поле'})
+        if row_type == 'category':
+            parent = _text(row, 'parent')
+            if parent in self.pending['category']:
+                self.flush_categories()
+            category = Category(slug=slug, title=_text(row, 'title'), parent_id=self.category_id(parent, 'parent'))
+            category.clean_fields(exclude=['image', 'parent'])
+            self.queue('category', line_number, (category, ('title', 'parent')), key=slug)
+        elif row_type == 'product':
+            category = _text(row, 'category')
+            if category in self.pending['category']:
+                self.flush_categories()
+            product = Product(slug=slug, title=_text(row, 'title'), size=_text(row, 'size'),
+                              category_id=self.category_id(category, 'category'))
+            fields = [field for field in PRODUCT_UPDATE_FIELDS if field not in PRODUCT_OPTIONAL_FIELDS]
+            for field in PRODUCT_OPTIONAL_FIELDS:
+                value = _number(row, field) if field in ('price', 'quantity') else _text(row, field)
+                if value not in (None, ''):
+                    setattr(product, field, value)
+                    fields.append(field)
+            product.clean_fields(exclude=['category'])
+            self.queue('product', line_number, (product, tuple(fields)), key=slug)
+        else:
+            if slug in self.pending['product']:
+                self.flush_products()
+            quantity = _number(row, 'quantity')
+            if quantity is None:
+                raise ValidationError({'quantity': 'Обязательное поле'})
+            self.queue('stock', line_number, quantity, key=slug)
+
+    def category_id(self, slug, field):
+        if not slug:
+            if field == 'category':
+                raise ValidationError({field: 'Обязательное поле'})
+            return None
+        if slug not in self.categories:
+            raise ValidationError({field: f'Категория {slug} не найдена'})
+        return self.categories[slug]
+
+    def queue(self, row_type, line_number, value, key):
+        pending = self.pending[row_type]
+        # повтор slug в одной пачке: побеждает последняя строка, иначе ON CONFLICT упадёт
+        pending[key] = (line_number, value)
+        if len(pending) >= self.batch_size:
+            self.flush(row_type)
+
+    def flush(self, row_type):
+        {'category': self.flush_categories, 'product': self.flush_products, 'stock': self.flush_stock}[row_type]()
+
+    def _upsert(self, row_type, model):
+        """В очереди (объект, обновляемые поля); строки с одинаковым набором полей
+        пишутся одним bulk_create."""
+        pending, self.pending[row_type] = self.pending[row_type], {}
+        if not pending:
+            return
+        groups = {}
+        for _, (instance, fields) in pending.values():
+            groups.setdefault(fields, []).append(instance)
+        with transaction.atomic():
+            existing = set(model.objects.filter(slug__in=pending).values_list('slug', flat=True))
+            for fields, objects in groups.items():
+                model.objects.bulk_create(objects, update_conflicts=True, unique_fields=['slug'],
+                                          update_fields=list(fields))
+        self.report['created'][row_type] += len(pending) - len(existing)
+        self.report['updated'][row_type] += len(existing)
+        self.notify()
+
+    def flush_categories(self):
+        pending = list(self.pending['category'])
+        self._upsert('category', Category)
+        self.categories.update(Category.objects.filter(slug__in=pending).values_list('slug', 'id'))
+
+    def flush_products(self):
+        self._upsert('product', Product)
+
+    def flush_stock(self):
+        pending, self.pending['stock'] = self.pending['stock'], {}
+        if not pending:
+            return
+        with transaction.atomic():
+            products = list(Product.objects.filter(slug__in=pending).only('id', 'slug'))
+            for product in products:
+                product.quantity = pending[product.slug][1]
+            Product.objects.bulk_update(products, ['quantity'])
+        found = {product.slug for product in products}
+        for slug, (line_number, _) in pending.items():
+            if slug not in found:
+                self.error(line_number, {'slug': slug}, f'slug: Продукт {slug} не найден')
+        self.report['updated']['stock'] += len(products)
+        self.notify()
+
+    def notify(self):
+        if self.progress:
+            self.progress(self.report)
+
+
+def guess_format(name):
+    extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+    return extension if extension in IMPORT_FORMATS else 'csv'
+
+
+def import_catalog(file, file_format, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    return CatalogImporter(batch_size=batch_size, progress=progress).run(read_rows(file, file_format))
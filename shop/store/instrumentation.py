@@ -0,0 +1,139 @@
+import contextlib
+import threading
+import time
+import traceback
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+from shop import settings
+
+
+N_PLUS_ONE_THRESHOLD = 3
+IGNORED_FRAME_PARTS = ('site-packages', 'store/instrumentation.py', 'store/middleware.py')
+
+
+def _origin():
+    # Первый кадр стека из кода проекта — место, откуда пошёл повторяющийся запрос
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename.startswith(str(settings.BASE_DIR)) and not any(
+                part in frame.filename for part in IGNORED_FRAME_PARTS):
+            return f'{frame.filename[len(str(settings.BASE_DIR)) + 1:]}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def wrap_connections(wrapper):
+    """ExitStack с execute_wrapper на всех подключениях текущего потока."""
+    stack = contextlib.ExitStack()
+    for alias in connections:
+        stack.enter_context(connections[alias].execute_wrapper(wrapper))
+    return stack
+
+
+@contextlib.asynccontextmanager
+async def awrap_connections(wrapper):
+    # Подключения у Django свои в каждом потоке: обёртки ставятся в потоке,
+    # где sync_to_async выполняет ORM-запросы этого запроса
+    stack = await sync_to_async(wrap_connections)(wrapper)
+    try:
+        yield
+    finally:
+        await sync_to_async(stack.close)()
+
+
+class QueryRecorder:
+    """Считает запросы и время в БД по всем подключениям на время одного запроса."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+        self.origins = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.shapes[sql] += 1
+            if self.shapes[sql] == 2:
+                self.origins[sql] = _origin()
+
+    @contextlib.contextmanager
+    def record(self):
+        with wrap_connections(self):
+            yield self
+
+    @contextlib.asynccontextmanager
+    async def arecord(self):
+        async with awrap_connections(self):
+            yield self
+
+    def repeated(self):
+        return [{'sql': sql, 'count': count, 'origin': self.origins.get(sql)}
+                for sql, count in self.shapes.most_common() if count >= N_PLUS_ONE_THRESHOLD]
+
+
+class RouteStats:
+    """Агрегаты по маршрутам в памяти процесса, для staff-отчёта."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def add(self, route, sample):
+        with self._lock:
+            stats = self._routes.setdefault(route, {
+                'requests': 0, 'queries': 0, 'max_queries': 0, 'db_ms': 0.0,
+                'non_db_ms': 0.0, 'total_ms': 0.0, 'bytes': 0, 'n_plus_one': {},
+            })
+            stats['requests'] += 1
+            stats['queries'] += sample['queries']
+            stats['max_queries'] = max(stats['max_queries'], sample['queries'])
+            stats['db_ms'] += sample['db_ms']
+            stats['non_db_ms'] += sample['non_db_ms']
+            stats['total_ms'] += sample['total_ms']
+            stats['bytes'] += sample['bytes'] or 0
+            for shape in sample['n_plus_one']:
+                known = stats['n_plus_one'].setdefault(shape['sql'], {
+                    'sql': shape['sql'], 'origin': shape['origin'], 'requests': 0, 'max_count': 0})
+                known['requests'] += 1
+                known['max_count'] = max(known['max_count'], shape['count'])
+
+    def report(self):
+        with self._lock:
+            routes = [(route, dict(stats, n_plus_one=list(stats['n_plus_one'].values())))
+                      for route, stats in self._routes.items()]
+        rows = []
+        for route, stats in routes:
+            requests = stats['requests']
+            rows.append({
+                'route': route,
+                'requests': requests,
+                'avg_queries': round(stats['queries'] / requests, 2),
+                'max_queries': stats['max_queries'],
+                'avg_db_ms': round(stats['db_ms'] / requests, 2),
+                'avg_non_db_ms': round(stats['non_db_ms'] / requests, 2),
+                'avg_total_ms': round(stats['total_ms'] / requests, 2),
+                'avg_bytes': round(stats['bytes'] / requests),
+                'total_db_ms': round(stats['db_ms'], 2),
+                'n_plus_one': sorted(stats['n_plus_one'], key=lambda shape: -shape['max_count']),
+            })
+        return sorted(rows, key=lambda row: -row['total_db_ms'])
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_stats = RouteStats()
+
+
+def route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return '/' + match.route.lstrip('^').rstrip('$')
@@ -0,0 +1,302 @@
+import contextlib
+import hashlib
+import hmac
+import io
+import json
+import platform
+import statistics
+import subprocess
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from django.test import Client
+from rest_framework.test import APIClient
+
+from shop import settings
+from store import benchmarks, metrics, urls
+from store.models import Product, Review, FavoriteProduct, Cart, Customer, Order
+
+
+PAYMENT_SKIP_REASON = 'ходит в Stripe по сети'
+# Без настроенного секрета вебхук отвечает 503; на время замера подставляется этот
+BENCH_WEBHOOK_SECRET = 'whsec_bench'
+
+
+def _catalog_upload(context):
+    content = f"type,slug,title,category,price,quantity,size\nproduct,{context['product_slug']},Замер,{context['category_slug']},100,10,M\n"
+    return {'file': SimpleUploadedFile('catalog.csv', content.encode(), content_type='text/csv')}
+
+
+def _gallery_upload(context):
+    buffer = io.BytesIO()
+    Image.new('RGB', (200, 200), 'white').save(buffer, 'PNG')
+    return {'images': [SimpleUploadedFile('bench.png', buffer.getvalue(), content_type='image/png')]}
+
+
+def _webhook_event(context):
+    # событие без обработчика: проверка подписи и разбор, без изменения заказов
+    return {'id': 'evt_bench', 'object': 'event', 'type': 'bench.ping', 'data': {'object': {}}}
+
+
+def _signed_webhook(payload):
+    """Тело и заголовок Stripe-Signature, которые пройдут stripe.Webhook.construct_event."""
+    body = json.dumps(payload)
+    timestamp = int(time.time())
+    signature = hmac.new(settings.STRIPE_WEBHOOK_SECRET.encode(), f'{timestamp}.{body}'.encode(),
+                         hashlib.sha256).hexdigest()
+    return body, {'content_type': 'application/json', 'HTTP_STRIPE_SIGNATURE': f't={timestamp},v1={signature}'}
+
+
+# маршрут -> (метод, путь, данные, формат, от имени персонала, ожидаемый статус)
+SCENARIOS = {
+    'category/': ('get', '/api/category/', None, None, False, 200),
+    'category/<int:pk>/': ('get', '/api/category/{category}/', None, None, False, 200),
+    'products/<int:pk>/': ('get', '/api/products/{product}/', None, None, False, 200),
+    'products/bulk/': ('post', '/api/products/bulk/', lambda c: {'category': c['category'], 'price_percent': '10',
+                                                                  'stock_delta': 5}, 'json', True, 200),
+    'products/<int:pk>/gallery/': ('post', '/api/products/{product}/gallery/', _gallery_upload, 'multipart', True, 201),
+    'review/': ('post', '/api/review/', lambda c: {'product': c['product'], 'text': 'Замер'}, 'json', False, 201),
+    'review/<int:pk>/update/': ('patch', '/api/review/{review}/update/', {'text': 'Замер'}, 'json', False, 200),
+    'review/<int:pk>/delete/': ('delete', '/api/review/{review}/delete/', None, None, False, 204),
+    'rating/': ('post', '/api/rating/', lambda c: {'product': c['product'], 'star': '5'}, 'json', False, 201),
+    'favorite/add/': ('post', '/api/favorite/add/', lambda c: {'product': c['free_product']}, 'json', False, 201),
+    'favorite/check/': ('post', '/api/favorite/check/', lambda c: {'products': c['product_page']}, 'json', False, 200),
+    'favorite/delete/<int:pk>/': ('delete', '/api/favorite/delete/{favorite}/', None, None, False, 204),
+    'my_favorite/': ('get', '/api/my_favorite/', None, None, False, 200),
+    'cart/add/': ('post', '/api/cart/add/', lambda c: {'product': c['free_product'], 'quantity': 1,
+                                                       'price': c['free_product_price']}, 'json', False, 201),
+    'cart/<int:product>/delete/': ('delete', '/api/cart/{cart_product}/delete/', None, None, False, 204),
+    'cart/<int:product>/update/': ('put', '/api/cart/{cart_product}/update/',
+                                   lambda c: {'product': c['cart_product'], 'quantity': 2,
+                                              'price': c['cart_product_price']}, 'json', False, 200),
+    'cart/': ('get', '/api/cart/', None, None, False, 200),
+    'checkout/': ('get', '/api/checkout/', None, None, False, 200),
+    'payment/webhook/': ('post', '/api/payment/webhook/', _webhook_event, 'stripe', False, 200),
+    'customer/': ('post', '/api/customer/', {'first_name': 'Замер', 'last_name': 'Замер', 'phone': '+998'},
+                  'json', False, 201),
+    'customer/<int:user>/update/': ('patch', '/api/customer/{user}/update/', {'first_name': 'Замер'}, 'json', False, 200),
+    'customer/<int:user>/': ('get', '/api/customer/{user}/', None, None, False, 200),
+    'my_orders/': ('get', '/api/my_orders/', None, None, False, 200),
+    'my_orders/<uuid:pk>/': ('get', '/api/my_orders/{order}/', None, None, False, 200),
+    'reports/sales/': ('get', '/api/reports/sales/?date_from=2000-01-01&date_to=2100-01-01&group_by=day',
+                       None, None, True, 200),
+    'export/orders/': ('get', '/api/export/orders/', None, None, True, 200),
+    'export/catalog/': ('get', '/api/export/catalog/', None, None, True, 200),
+    'import/catalog/': ('post', '/api/import/catalog/', _catalog_upload, 'multipart', True, 200),
+    'debug/queries/': ('get', '/api/debug/queries/', None, None, True, 200),
+    'async/category/': ('get', '/api/async/category/', None, None, False, 200),
+    'async/category/<int:pk>/': ('get', '/api/async/category/{category}/', None, None, False, 200),
+    'async/products/<int:pk>/': ('get', '/api/async/products/{product}/', None, None, False, 200),
+    'async/search/': ('get', '/api/async/search/?q=Товар 1', None, None, False, 200),
+}
+
+# Списки в админке с бюджетом SQL-запросов: число запросов не должно зависеть от объёма данных
+ADMIN_QUERY_BUDGETS = {
+    'admin/store/product/': 8,
+    'admin/store/product/?price__gte=1000&price__lte=50000': 8,
+    'admin/store/category/': 7,
+    'admin/store/cart/': 7,
+    'admin/store/cart/?user__id__exact={user}': 7,
+    'admin/store/rating/': 7,
+    'admin/store/rating/?product__id__exact={product}': 7,
+    'admin/store/orderproduct/': 7,
+    'admin/store/order/': 7,
+    'admin/store/favoriteproduct/': 7,
+}
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет все маршруты store/urls.py внутри процесса на каталоге из seed_catalog и '
+            'выводит JSON с p50/p95/p99, пропускной способностью и числом SQL-запросов. '
+            'Падает, если маршрут ответил не ожидаемым статусом, а с --baseline — и если замеры '
+            'хуже сохранённого прогона')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--route', action='append', default=[], help='Только эти маршруты, например category/')
+        parser.add_argument('--output', help='Файл для JSON (иначе stdout)')
+        parser.add_argument('--baseline', help='JSON предыдущего прогона для сравнения')
+        parser.add_argument('--max-regression', type=float, default=0.2, help='Допустимый рост p95 (доля)')
+        parser.add_argument('--min-ms', type=float, default=2.0,
+                            help='Маршруты с p95 меньше этого в базовом прогоне не сравниваются по времени')
+        parser.add_argument('--max-extra-queries', type=int, default=0)
+
+    def handle(self, *args, **options):
+        # как в тестах: testserver в ALLOWED_HOSTS, иначе все ответы — 400 DisallowedHost
+        setup_test_environment(debug=django_settings.DEBUG)
+        webhook_secret = settings.STRIPE_WEBHOOK_SECRET
+        settings.STRIPE_WEBHOOK_SECRET = webhook_secret or BENCH_WEBHOOK_SECRET
+        try:
+            self.bench(options)
+        finally:
+            settings.STRIPE_WEBHOOK_SECRET = webhook_secret
+            teardown_test_environment()
+
+    def bench(self, options):
+        context = self.build_context()
+        user_client = self.client(context['user_token'])
+        staff_client = self.client(context['staff_token'])
+        routes = {}
+        for pattern in urls.urlpatterns:
+            route = str(pattern.pattern)
+            if options['route'] and route not in options['route']:
+                continue
+            if route == 'payment/':
+                routes['/api/' + route] = {'skipped': PAYMENT_SKIP_REASON}
+                continue
+            if route not in SCENARIOS:
+                routes['/api/' + route] = {'skipped': 'нет сценария в bench_api.SCENARIOS'}
+                continue
+            method, path, data, data_format, staff, expected = SCENARIOS[route]
+            request = (staff_client if staff else user_client, method, path.format(**context), data, data_format)
+            routes['/api/' + route] = self.measure(request, context, options['iterations'], options['warmup'], expected)
+            self.stderr.write(f"{route}: {routes['/api/' + route]}")
+
+        failed = [f"{route}: статусы {stats['statuses']}, ожидался {stats['expected_status']}"
+                  for route, stats in routes.items() if 'statuses' in stats
+                  and stats['statuses'] != [stats['expected_status']]]
+        over_budget = []
+        admin_client = Client()
+        admin_client.force_login(User.objects.get(username='catalog-staff'))
+        for route, budget in ADMIN_QUERY_BUDGETS.items():
+            if options['route'] and route not in options['route']:
+                continue
+            request = (admin_client, 'get', '/' + route.format(**context), None, None)
+            routes['/' + route] = self.measure(request, context, options['iterations'], options['warmup'], 200)
+            routes['/' + route]['query_budget'] = budget
+            if routes['/' + route]['statuses'] != [200]:
+                # ответ с ошибкой укладывается в любой бюджет, не проверяя сам список
+                failed.append(f"/{route}: статусы {routes['/' + route]['statuses']}, ожидался 200")
+            elif routes['/' + route]['queries'] > budget:
+                over_budget.append(f"/{route}: запросов {routes['/' + route]['queries']} при бюджете {budget}")
+            self.stderr.write(f"{route}: {routes['/' + route]}")
+
+        results = {'meta': self.meta(options), 'routes': routes}
+        output = json.dumps(results, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output)
+        else:
+            self.stdout.write(output)
+
+        if failed:
+            raise CommandError('Маршруты ответили не так, как ожидалось:\n' + '\n'.join(failed))
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+            regressions = benchmarks.compare(results, baseline, options['max_regression'], options['min_ms'],
+                                             options['max_extra_queries'])
+            if regressions:
+                raise CommandError('Регрессии производительности:\n' + '\n'.join(regressions))
+            self.stderr.write(self.style.SUCCESS('Регрессий нет'))
+        if over_budget:
+            raise CommandError('Превышен бюджет запросов:\n' + '\n'.join(over_budget))
+
+    def client(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        return client
+
+    def measure(self, request, context, iterations, warmup, expected):
+        """Ошибкой считается любой ответ со статусом, отличным от expected."""
+        client, method, path, data, data_format = request
+        latencies = []
+        queries = []
+        statuses = set()
+        errors = 0
+        for index in range(warmup + iterations):
+            payload = data(context) if callable(data) else data
+            extra = {'format': data_format}
+            if data_format == 'stripe':
+                payload, extra = _signed_webhook(payload)
+            counter = metrics.QueryCounter()
+            with transaction.atomic(), contextlib.ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(counter))
+                started = time.perf_counter()
+                response = getattr(client, method)(path, payload, **extra)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+                # Каждый запрос откатывается, чтобы изменяющие маршруты мерились на одних и тех же данных
+                transaction.set_rollback(True)
+            statuses.add(response.status_code)
+            if index >= warmup:
+                latencies.append(elapsed)
+                queries.append(counter.count)
+                errors += response.status_code != expected
+        summary = benchmarks.summarize(latencies, sum(latencies), errors)
+        summary['queries'] = int(statistics.median(queries))
+        summary['statuses'] = sorted(statuses)
+        summary['expected_status'] = expected
+        return summary
+
+    def build_context(self):
+        users = User.objects.filter(username__startswith='catalog').exclude(username='catalog-staff').order_by('id')
+        user = users.filter(order__isnull=False).first() or users.first()
+        if user is None:
+            raise CommandError('Каталог не найден — сначала запустите seed_catalog')
+        staff, _ = User.objects.update_or_create(username='catalog-staff',
+                                                 defaults={'is_staff': True, 'is_superuser': True})
+        products = Product.objects.filter(slug__startswith='catalog-')
+        product = (Review.objects.filter(parent__isnull=False, product__in=products)
+                   .values_list('product_id', flat=True).first()) or products.values_list('id', flat=True).first()
+        review = Review.objects.filter(user=user).first() or Review.objects.create(user=user, product_id=product,
+                                                                                  text='Замер')
+        favorite = FavoriteProduct.objects.filter(user=user).first() or FavoriteProduct.objects.create(
+            user=user, product_id=product)
+        free_product = (products.exclude(favorites__user=user).exclude(cart_product__user=user)
+                        .values('id', 'price').first())
+        cart = next((cart for cart in Cart.objects.filter(user=user).select_related('product')
+                     if Cart.objects.filter(product_id=cart.product_id).count() == 1), None)
+        if cart is None:
+            cart = Cart.objects.create(user=user, product_id=free_product['id'], quantity=1,
+                                       price=free_product['price'])
+            free_product = (products.exclude(favorites__user=user).exclude(cart_product__user=user)
+                            .values('id', 'price').first())
+        Customer.objects.get_or_create(user=user, defaults={'first_name': 'Замер', 'last_name': 'Замер',
+                                                            'phone': '+998'})
+        order = Order.objects.filter(user=user).values_list('id', flat=True).first()
+        return {
+            'user': user.id,
+            'user_token': Token.objects.get_or_create(user=user)[0].key,
+            'staff_token': Token.objects.get_or_create(user=staff)[0].key,
+            'category': Product.objects.filter(id=product).values_list('category_id', flat=True).first(),
+            'category_slug': Product.objects.filter(id=product).values_list('category__slug', flat=True).first(),
+            'product': product,
+            'product_slug': Product.objects.filter(id=product).values_list('slug', flat=True).first(),
+            'product_page': list(products.order_by('id').values_list('id', flat=True)[:50]),
+            'review': review.id,
+            'favorite': favorite.id,
+            'free_product': free_product['id'],
+            'free_product_price': free_product['price'],
+            'cart_product': cart.product_id,
+            'cart_product_price': Product.objects.get(id=cart.product_id).price,
+            'order': order,
+        }
+
+    def meta(self, options):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                    check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'iterations': options['iterations'],
+            'warmup': options['warmup'],
+            'products': Product.objects.filter(slug__startswith='catalog-').count(),
+            'reviews': Review.objects.count(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+        }
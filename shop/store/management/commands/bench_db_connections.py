@@ -0,0 +1,67 @@
+import json
+import time
+
+from django.conf import settings as django_settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from store import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает задержку запросов к API без постоянных соединений (CONN_MAX_AGE=0) '
+            'и с текущими настройками DATABASES')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/category/')
+        parser.add_argument('--requests', type=int, default=500)
+
+    def handle(self, *args, **options):
+        configured = connection.settings_dict['CONN_MAX_AGE']
+        # тестовый клиент ходит с хостом testserver, которого нет в ALLOWED_HOSTS
+        setup_test_environment(debug=django_settings.DEBUG)
+        try:
+            results = {
+                'new_connection_per_request': self._run(options['path'], options['requests'], 0),
+                'configured': self._run(options['path'], options['requests'], configured),
+            }
+        finally:
+            connection.settings_dict['CONN_MAX_AGE'] = configured
+            teardown_test_environment()
+        results['configured']['CONN_MAX_AGE'] = configured
+        self.stdout.write(json.dumps(results, indent=2, ensure_ascii=False))
+        failed = [name for name, result in results.items() if result['errors']]
+        if failed:
+            raise CommandError(f"{options['path']} отвечает ошибками: {', '.join(failed)}")
+
+    def _run(self, path, requests, max_age):
+        connection.close()
+        connection.settings_dict['CONN_MAX_AGE'] = max_age
+        opened = []
+
+        def count_connection(sender, connection, **kwargs):
+            opened.append(connection.alias)
+
+        connection_created.connect(count_connection)
+        client = Client()
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        try:
+            for _ in range(requests):
+                request_started = time.perf_counter()
+                # Тестовый клиент отключает close_old_connections, поэтому жизненный
+                # цикл соединения как в WSGI-обработчике воспроизводим вручную.
+                close_old_connections()
+                response = client.get(path)
+                close_old_connections()
+                latencies.append(time.perf_counter() - request_started)
+                errors += response.status_code >= 400
+        finally:
+            connection_created.disconnect(count_connection)
+        result = benchmarks.summarize(latencies, time.perf_counter() - started, errors)
+        result['connections_opened'] = len(opened)
+        return result
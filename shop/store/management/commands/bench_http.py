@@ -0,0 +1,31 @@
+import asyncio
+import json
+
+from django.core.management.base import BaseCommand
+
+from store import benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Нагружает запущенные развёртывания (WSGI и ASGI) множеством медленных клиентов '
+            'и сравнивает пропускную способность и p50/p95/p99')
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+', help='Полные URL, например http://127.0.0.1:8000/api/category/')
+        parser.add_argument('--clients', type=int, default=200, help='Одновременных клиентов')
+        parser.add_argument('--requests', type=int, default=5, help='Запросов на клиента')
+        parser.add_argument('--read-delay', type=float, default=0.05,
+                            help='Пауза между чтениями кусков ответа (имитация медленной сети), с')
+        parser.add_argument('--chunk-size', type=int, default=1024)
+        parser.add_argument('--header', action='append', default=[], help='Заголовок "Имя: значение"')
+
+    def handle(self, *args, **options):
+        headers = dict(header.split(':', 1) for header in options['header'])
+        headers = {name.strip(): value.strip() for name, value in headers.items()}
+        results = {}
+        for url in options['urls']:
+            results[url] = asyncio.run(benchmarks.slow_clients(
+                url, options['clients'], options['requests'], headers=headers,
+                read_delay=options['read_delay'], chunk_size=options['chunk_size'],
+            ))
+        self.stdout.write(json.dumps(results, indent=2, ensure_ascii=False))
@@ -0,0 +1,75 @@
+import io
+import itertools
+import statistics
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import RequestFactory
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from store import exports, fast_serializers, renderers
+from store.models import Category, Product, Order
+from store.serializers import UserOrderSerializer
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает JSONRenderer/JSONParser из DRF с store.renderers на реальных ответах: '
+            'время кодирования и разбора, побайтовое совпадение.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--orders', type=int, default=2000, help='Сколько строк заказов брать в выгрузку')
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            self.stderr.write('orjson не установлен: FastJSONRenderer работает через stdlib json')
+        payloads = self.payloads(options['orders'])
+        mismatches = []
+        for name, data in payloads.items():
+            body = JSONRenderer().render(data)
+            fast_body = renderers.FastJSONRenderer().render(data)
+            if body != fast_body:
+                mismatches.append(name)
+            render = self.median(lambda: JSONRenderer().render(data), options['repeat'])
+            fast_render = self.median(lambda: renderers.FastJSONRenderer().render(data), options['repeat'])
+            parse = self.median(lambda: JSONParser().parse(io.BytesIO(body)), options['repeat'])
+            fast_parse = self.median(lambda: renderers.FastJSONParser().parse(io.BytesIO(body)), options['repeat'])
+            self.stdout.write(
+                f'{name:<18} {len(body) / 1024:>9.1f} KiB'
+                f'   render {render:>8.2f} -> {fast_render:>7.2f} ms (x{render / max(fast_render, 0.001):.1f})'
+                f'   parse {parse:>8.2f} -> {fast_parse:>7.2f} ms (x{parse / max(fast_parse, 0.001):.1f})'
+                f'   {"ok" if body == fast_body else "DIFF"}')
+        if mismatches:
+            raise CommandError(f'Ответы различаются: {", ".join(mismatches)}')
+
+    def payloads(self, order_count):
+        request = RequestFactory().get('/api/')
+        request.user = AnonymousUser()
+        category = (Category.objects.annotate(total=Count('products')).order_by('-total', 'id')
+                    .values_list('id', flat=True).first())
+        product = (Product.objects.annotate(total=Count('reviews')).order_by('-total', 'id')
+                   .values_list('id', flat=True).first())
+        if category is None or product is None:
+            raise CommandError('Каталог пуст, сначала выполните seed_catalog')
+        cards = Product.objects.filter(category_id=category).values(*fast_serializers.PRODUCT_CARD.columns)
+        orders = Order.objects.select_related('shipping')[:200]
+        return {
+            'category tree': fast_serializers.category_tree(request),
+            'category products': fast_serializers.product_cards(cards[:100], request),
+            'product detail': fast_serializers.product_detail(product, request),
+            'orders': UserOrderSerializer(orders, many=True, context={'request': request, 'action': 'list'}).data,
+            # сырые UUID и datetime, без сериализатора
+            'order export rows': [dict(zip(exports.ORDER_EXPORT_NAMES, row))
+                                  for row in itertools.islice(exports.order_rows(), order_count)],
+        }
+
+    def median(self, function, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,51 @@
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import Product
+from store import counters
+
+
+class Command(BaseCommand):
+    help = 'Замеряет, сколько инкрементов популярности в секунду поглощает буфер и сколько UPDATE он выполняет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--increments', type=int, default=100000, help='Инкрементов на поток')
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--flush-interval', type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.values_list('id', flat=True)[:options['products']])
+        if not product_ids:
+            raise CommandError('Нет продуктов — сначала заполните каталог (seed_orders или seed_catalog)')
+        buffer = counters.CounterBuffer(
+            flush_interval=options['flush_interval'],
+            max_pending=len(product_ids) * len(counters.POPULARITY_WEIGHTS) + 1,
+        )
+        fields = list(counters.POPULARITY_WEIGHTS)
+        before = sum(Product.objects.filter(id__in=product_ids).values_list('popularity', flat=True))
+
+        def worker(seed):
+            rng = random.Random(seed)
+            for _ in range(options['increments']):
+                buffer.incr(rng.choice(product_ids), rng.choice(fields))
+
+        threads = [threading.Thread(target=worker, args=(index,)) for index in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        buffer.flush()
+        elapsed = time.perf_counter() - started
+        total = options['threads'] * options['increments']
+        after = sum(Product.objects.filter(id__in=product_ids).values_list('popularity', flat=True))
+        self.stdout.write(
+            f'Инкрементов: {total} за {elapsed:.2f} с ({total / elapsed:.0f}/с); '
+            f'UPDATE-запросов: {buffer.statements} ({buffer.statements / elapsed:.1f}/с), '
+            f'инкрементов на запрос: {total / max(buffer.statements, 1):.0f}; '
+            f'прирост популярности: {after - before}'
+        )
@@ -0,0 +1,98 @@
+import json
+import statistics
+import time
+
+from django.conf import settings as django_settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+
+from shop import settings
+from store import metrics
+from store.models import Category, Product
+
+
+# название -> путь; {category} и {product} подставляются из каталога
+SCENARIOS = {
+    'category list': '/api/category/',
+    'category products': '/api/category/{category}/?page_size=100',
+    'product detail': '/api/products/{product}/',
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает DRF-сериализаторы и store.fast_serializers на горячих GET-эндпоинтах: '
+            'время, число SQL-запросов и побайтовое совпадение ответов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+
+    def handle(self, *args, **options):
+        category = (Category.objects.annotate(total=Count('products')).order_by('-total', 'id')
+                    .values_list('id', flat=True).first())
+        product = (Product.objects.annotate(total=Count('reviews')).order_by('-total', 'id')
+                   .values_list('id', flat=True).first())
+        if category is None or product is None:
+            raise CommandError('Каталог пуст, сначала выполните seed_catalog')
+        context = {'category': category, 'product': product}
+        # тестовый клиент ходит с хостом testserver, которого нет в ALLOWED_HOSTS
+        setup_test_environment(debug=django_settings.DEBUG)
+        try:
+            results, mismatches = self.compare(context, options['repeat'])
+        finally:
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump({'repeat': options['repeat'], 'results': results}, file, ensure_ascii=False, indent=2)
+        if mismatches:
+            raise CommandError(f'Ответы различаются: {", ".join(mismatches)}')
+
+    def compare(self, context, repeat):
+        user = User.objects.annotate(total=Count('favoriteproduct')).order_by('-total', 'id').first()
+        results = []
+        mismatches = []
+        for name, path in SCENARIOS.items():
+            path = path.format(**context)
+            for audience in ('anonymous', 'user'):
+                client = APIClient()
+                if audience == 'user':
+                    client.force_authenticate(user)
+                row = {'scenario': name, 'audience': audience, 'path': path}
+                bodies = {}
+                for variant, fast in (('drf', False), ('fast', True)):
+                    bodies[variant], row[variant] = self.measure(client, path, fast, repeat)
+                row['speedup'] = round(row['drf']['median_ms'] / max(row['fast']['median_ms'], 0.001), 2)
+                row['identical'] = bodies['drf'] == bodies['fast']
+                if not row['identical']:
+                    mismatches.append(f'{name} ({audience})')
+                results.append(row)
+                self.stdout.write(
+                    f"{name:<18} {audience:<9} drf {row['drf']['median_ms']:>8.2f} ms {row['drf']['queries']:>4} q"
+                    f"   fast {row['fast']['median_ms']:>8.2f} ms {row['fast']['queries']:>4} q"
+                    f"   x{row['speedup']:<6} {'ok' if row['identical'] else 'DIFF'}")
+        return results, mismatches
+
+    def measure(self, client, path, fast, repeat):
+        enabled, cached = settings.FAST_SERIALIZERS, settings.RESPONSE_CACHE_ENABLED
+        settings.FAST_SERIALIZERS, settings.RESPONSE_CACHE_ENABLED = fast, False
+        timings = []
+        try:
+            with transaction.atomic():
+                client.get(path)  # прогрев кэшей избранного и авторизации
+                for _ in range(repeat):
+                    counter = metrics.QueryCounter()
+                    start = time.perf_counter()
+                    with connection.execute_wrapper(counter):
+                        response = client.get(path)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    if response.status_code != 200:
+                        raise CommandError(f'{path}: статус {response.status_code}')
+                transaction.set_rollback(True)
+        finally:
+            settings.FAST_SERIALIZERS, settings.RESPONSE_CACHE_ENABLED = enabled, cached
+        return response.content, {'median_ms': round(statistics.median(timings), 2), 'queries': counter.count}
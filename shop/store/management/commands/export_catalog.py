@@ -0,0 +1,25 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from store import exports
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает категории и продукты в CSV или NDJSON в формате import_catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='Путь к файлу, "-" — stdout')
+        parser.add_argument('--file-format', choices=tuple(exports.EXPORT_FORMATS), default='csv')
+        parser.add_argument('--chunk-size', type=int, default=exports.EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        stream, _ = exports.EXPORT_FORMATS[options['file_format']]
+        rows = exports.catalog_rows(chunk_size=options['chunk_size'])
+        output = sys.stdout if options['output'] == '-' else open(options['output'], 'w', encoding='utf-8', newline='')
+        try:
+            for part in stream(rows, exports.CATALOG_EXPORT_NAMES):
+                output.write(part)
+        finally:
+            if output is not sys.stdout:
+                output.close()
@@ -0,0 +1,49 @@
+import resource
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from store import exports, mixins
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает заказы, доставку и позиции заказов в CSV или NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='Путь к файлу, "-" — stdout')
+        parser.add_argument('--file-format', choices=tuple(exports.EXPORT_FORMATS), default='csv')
+        parser.add_argument('--date-from')
+        parser.add_argument('--date-to')
+        parser.add_argument('--chunk-size', type=int, default=exports.EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            date_from = mixins.parse_date_param(options['date_from']) if options['date_from'] else None
+            date_to = mixins.parse_date_param(options['date_to'], end_of_day=True) if options['date_to'] else None
+        except ValidationError as error:
+            raise CommandError(error.detail)
+        rows = exports.order_rows(date_from=date_from, date_to=date_to, chunk_size=options['chunk_size'])
+        counted = self._count(rows)
+        stream, _ = exports.EXPORT_FORMATS[options['file_format']]
+        started = time.perf_counter()
+        output = sys.stdout if options['output'] == '-' else open(options['output'], 'w', encoding='utf-8', newline='')
+        try:
+            for part in stream(counted):
+                output.write(part)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        elapsed = time.perf_counter() - started
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+        self.stderr.write(
+            f'Строк: {self.rows}, время: {elapsed:.2f} с, '
+            f'скорость: {self.rows / elapsed if elapsed else 0:.0f} строк/с, пик памяти: {peak_memory} МБ'
+        )
+
+    def _count(self, rows):
+        self.rows = 0
+        for row in rows:
+            self.rows += 1
+            yield row
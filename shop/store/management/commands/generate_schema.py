@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import settings, yasg
+
+
+class Command(BaseCommand):
+    help = 'Собирает OpenAPI-схему в swagger.json и swagger.yaml, чтобы сервер не строил её на лету.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.OPENAPI_SCHEMA_DIR,
+                            help='Каталог для файлов (по умолчанию OPENAPI_SCHEMA_DIR)')
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            raise CommandError('Укажите --output или OPENAPI_SCHEMA_DIR')
+        start = time.perf_counter()
+        documents = yasg.generate()
+        yasg.write(options['output'], documents)
+        sizes = ', '.join(f'{name}: {len(body) // 1024} KiB' for name, body in documents.items())
+        self.stdout.write(f'Схема записана в {options["output"]} за {time.perf_counter() - start:.2f} с ({sizes})')
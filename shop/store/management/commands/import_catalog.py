@@ -0,0 +1,48 @@
+import json
+import resource
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store import imports
+
+
+class Command(BaseCommand):
+    help = ('Потоково загружает категории, продукты и остатки из CSV или JSONL с upsert по slug. '
+            'Колонки: type (category/product/stock), slug, title, parent, category, description, '
+            'price, quantity, size, color')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--file-format', choices=imports.IMPORT_FORMATS,
+                            help='По умолчанию определяется по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=imports.IMPORT_BATCH_SIZE)
+        parser.add_argument('--errors-output', help='Сохранить отчёт с ошибками строк в JSON')
+
+    def handle(self, *args, **options):
+        file_format = options['file_format'] or imports.guess_format(options['path'])
+        started = time.perf_counter()
+        try:
+            file = open(options['path'], 'rb')
+        except OSError as error:
+            raise CommandError(error)
+        with file:
+            report = imports.import_catalog(file, file_format, batch_size=options['batch_size'],
+                                            progress=self.progress)
+        elapsed = time.perf_counter() - started
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+        for error in report['errors'][:20]:
+            self.stderr.write(f"Строка {error['line']} ({error['slug']}): {error['error']}")
+        if options['errors_output']:
+            with open(options['errors_output'], 'w', encoding='utf-8') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f"Строк: {report['rows']}, создано: {report['created']}, обновлено: {report['updated']}, "
+            f"ошибок: {report['error_count']}, время: {elapsed:.2f} с, пик памяти: {peak_memory} МБ"
+        ))
+
+    def progress(self, report):
+        created = sum(report['created'].values())
+        updated = sum(report['updated'].values())
+        self.stderr.write(f"Обработано строк: {report['rows']}, создано: {created}, обновлено: {updated}, "
+                          f"ошибок: {report['error_count']}")
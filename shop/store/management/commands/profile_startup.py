@@ -0,0 +1,74 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import settings
+
+
+# То, что делает воркер до первого запроса: приложение WSGI и разбор urlconf
+BOOT = ('import time; start = time.perf_counter(); '
+        'from shop.wsgi import application; '
+        'from django.urls import get_resolver; get_resolver().url_patterns; '
+        'print((time.perf_counter() - start) * 1000)')
+
+
+class Command(BaseCommand):
+    help = ('Замеряет холодный старт воркера в отдельных процессах: медианное время загрузки '
+            'WSGI-приложения и urlconf и самые дорогие импорты по python -X importtime.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=7, help='Сколько раз запускать процесс для медианы')
+        parser.add_argument('--top', type=int, default=15, help='Сколько модулей и пакетов показать')
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+
+    def handle(self, *args, **options):
+        timings = [float(self.run(BOOT).stdout.strip().splitlines()[-1]) for _ in range(options['repeat'])]
+        imports = self.parse_importtime(self.run(BOOT, '-X', 'importtime').stderr)
+
+        packages = {}
+        for module, (own, _) in imports.items():
+            package = module.split('.')[0]
+            packages[package] = packages.get(package, 0) + own
+        top_modules = sorted(imports.items(), key=lambda item: item[1][1], reverse=True)[:options['top']]
+        top_packages = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:options['top']]
+
+        self.stdout.write(f'Холодный старт: медиана {statistics.median(timings):.1f} мс, '
+                          f'мин. {min(timings):.1f} мс, макс. {max(timings):.1f} мс ({len(timings)} запусков)')
+        self.stdout.write('\nМодули по суммарному времени импорта (с зависимостями), мс:')
+        for module, (own, cumulative) in top_modules:
+            self.stdout.write(f'{cumulative / 1000:>9.1f} {own / 1000:>9.1f}  {module}')
+        self.stdout.write('\nПакеты верхнего уровня по собственному времени импорта, мс:')
+        for package, own in top_packages:
+            self.stdout.write(f'{own / 1000:>9.1f}  {package}')
+
+        if options['output']:
+            report = {
+                'repeat': options['repeat'],
+                'startup_ms': {'median': round(statistics.median(timings), 1), 'runs': [round(t, 1) for t in timings]},
+                'modules': [{'module': module, 'self_ms': own / 1000, 'cumulative_ms': cumulative / 1000}
+                            for module, (own, cumulative) in top_modules],
+                'packages': [{'package': package, 'self_ms': own / 1000} for package, own in top_packages],
+            }
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def run(self, code, *flags):
+        result = subprocess.run([sys.executable, *flags, '-c', code], cwd=settings.BASE_DIR, env=os.environ.copy(),
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise CommandError(f'Процесс завершился с кодом {result.returncode}:\n{result.stderr[-2000:]}')
+        return result
+
+    def parse_importtime(self, output):
+        """{модуль: (собственное, суммарное время в мкс)} из вывода -X importtime."""
+        imports = {}
+        for line in output.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            own, cumulative, module = line[len('import time:'):].split('|')
+            imports[module.strip()] = (int(own), int(cumulative))
+        return imports
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from store.models import Order
+from store import rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные агрегаты продаж по продуктам и категориям из истории заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', help='Начальная дата (YYYY-MM-DD), по умолчанию — первый заказ')
+        parser.add_argument('--date-to', help='Конечная дата (YYYY-MM-DD), по умолчанию — последний заказ')
+        parser.add_argument('--chunk-days', type=int, default=7, help='Сколько дней пересчитывать в одной транзакции')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        bounds = Order.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+        if bounds['first'] is None:
+            self.stdout.write('Заказов нет, пересчитывать нечего')
+            return
+        date_from = self._parse(options['date_from']) or timezone.localdate(bounds['first'])
+        date_to = self._parse(options['date_to']) or timezone.localdate(bounds['last'])
+        if date_from > date_to or options['chunk_days'] < 1:
+            raise CommandError('Неверный диапазон дат или размер чанка')
+        rollups.rebuild(date_from, date_to, chunk_days=options['chunk_days'],
+                        batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Агрегаты пересчитаны за {date_from} — {date_to}'))
+
+    def _parse(self, value):
+        if not value:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f'Неверный формат даты: {value}')
+        return day
@@ -0,0 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from store.models import Gallery, Category, Customer
+from store import images
+
+
+class Command(BaseCommand):
+    help = 'Создаёт превью и WebP-версии для уже загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--overwrite', action='store_true', help='Пересоздать существующие превью')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in (Gallery, Category, Customer):
+            names.update(name for name in model.objects.exclude(image='').exclude(image__isnull=True)
+                         .values_list('image', flat=True).iterator() if name)
+        created = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {executor.submit(images.generate, name, overwrite=options['overwrite']): name
+                       for name in sorted(names)}
+            for future, name in futures.items():
+                try:
+                    created += future.result()
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Изображений: {len(names)}, создано превью: {created}, ошибок: {failed}'
+        ))
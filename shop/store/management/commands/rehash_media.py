@@ -0,0 +1,47 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from store.models import Gallery, Category, Customer
+from store.storage import is_content_addressed
+from store import images, response_cache
+
+
+class Command(BaseCommand):
+    help = 'Переносит существующие загрузки на имена по хэшу содержимого и удаляет дубликаты'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-originals', action='store_true', help='Не удалять файлы со старыми именами')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        renamed = {}
+        missing = 0
+        for model in (Gallery, Category, Customer):
+            names = (model.objects.exclude(image='').exclude(image__isnull=True)
+                     .values_list('image', flat=True).distinct().iterator())
+            for name in names:
+                if not name or is_content_addressed(name) or name in renamed:
+                    continue
+                if not default_storage.exists(name):
+                    missing += 1
+                    self.stderr.write(f'Нет файла: {name}')
+                    continue
+                if options['dry_run']:
+                    renamed[name] = None
+                    continue
+                with default_storage.open(name, 'rb') as original:
+                    renamed[name] = default_storage.save(name, original)
+                images.generate(renamed[name])
+            if not options['dry_run']:
+                for old_name, new_name in renamed.items():
+                    model.objects.filter(image=old_name).update(image=new_name)
+        if renamed and not options['dry_run']:
+            # update() не шлёт сигналы, а ссылки на изображения есть во всём каталоге
+            response_cache.invalidate(response_cache.CATALOG)
+        if not options['dry_run'] and not options['keep_originals']:
+            for old_name in renamed:
+                default_storage.delete(old_name)
+        unique = len(set(renamed.values()))
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов перенесено: {len(renamed)}, уникальных после дедупликации: {unique}, не найдено: {missing}'
+        ))
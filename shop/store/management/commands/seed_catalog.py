@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from store import seeding
+from store.models import Category
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетический каталог для bench_api: дерево категорий, продукты, галереи, '
+            'отзывы с ответами, оценки, пользователей с корзинами, избранным и заказами')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help='Множитель для всех объёмов (0.01 — быстрый прогон)')
+        parser.add_argument('--products', type=int, default=100_000)
+        parser.add_argument('--depth', type=int, default=4)
+        parser.add_argument('--fanout', type=int, default=5)
+        parser.add_argument('--images-per-product', type=int, default=2)
+        parser.add_argument('--reviews', type=int, default=1_000_000)
+        parser.add_argument('--reply-share', type=float, default=0.3)
+        parser.add_argument('--ratings', type=int, default=200_000)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--orders', type=int, default=20_000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if Category.objects.filter(slug=seeding.CATALOG_ROOT_SLUG).exists():
+            raise CommandError('Каталог уже создан — для сравнимых замеров запускайте на пустой базе')
+        scale = options['scale']
+        with transaction.atomic():
+            stats = seeding.seed_catalog(
+                products=max(int(options['products'] * scale), 1),
+                depth=options['depth'],
+                fanout=options['fanout'],
+                images_per_product=options['images_per_product'],
+                reviews=int(options['reviews'] * scale),
+                reply_share=options['reply_share'],
+                ratings=int(options['ratings'] * scale),
+                users=max(int(options['users'] * scale), 1),
+                orders=int(options['orders'] * scale),
+                batch_size=options['batch_size'],
+                seed=options['seed'],
+                stdout=self.stdout,
+            )
+        self.stdout.write(self.style.SUCCESS(f'Готово: {stats}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from store import seeding
+
+
+class Command(BaseCommand):
+    help = 'Создаёт синтетические заказы для нагрузочных замеров (по умолчанию ~1М строк заказов)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=340000)
+        parser.add_argument('--lines-per-order', type=int, default=3)
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=1000)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        created = seeding.seed_orders(
+            options['orders'], lines_per_order=options['lines_per_order'], users=options['users'],
+            products=options['products'], batch_size=options['batch_size'], seed=options['seed'],
+            stdout=self.stdout,
+        )
+        self.stdout.write(self.style.SUCCESS(f'Готово: {created} заказов'))
@@ -0,0 +1,223 @@
+import atexit
+import bisect
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_safe
+
+from shop import settings
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry:
+    """Счётчики и гистограммы в памяти процесса.
+
+    Каждый поток пишет в свой шард без блокировок; шарды складываются только при
+    чтении. Если задан METRICS_DIR, процесс раз в flush_interval секунд (и при
+    выходе) сохраняет свой снимок в <METRICS_DIR>/<pid>-<id>.json, а /metrics
+    суммирует снимки всех воркеров. Каталог нужно очищать при деплое.
+    """
+
+    def __init__(self, directory=None, flush_interval=10):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._descriptions = {}
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # После fork шарды родителя не наследуются, иначе воркеры посчитают их повторно
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+        self._thread = None
+        self._snapshot_name = f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+
+    def describe(self, name, kind, text, buckets=None):
+        self._descriptions[name] = (kind, text, buckets)
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = {'counters': defaultdict(float), 'histograms': {}}
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            if self.directory and self._thread is None:
+                self._start()
+        return shard
+
+    def inc(self, name, labels=(), value=1):
+        self._shard()['counters'][(name, labels)] += value
+
+    def observe(self, name, value, labels=()):
+        histograms = self._shard()['histograms']
+        key = (name, labels)
+        buckets = self._descriptions[name][2]
+        histogram = histograms.get(key)
+        if histogram is None:
+            # счётчики по корзинам (последняя — +Inf) и сумма наблюдений
+            histogram = histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        histogram[bisect.bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+    def snapshot(self):
+        counters = defaultdict(float)
+        histograms = {}
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, value in dict(shard['counters']).items():
+                counters[key] += value
+            for key, histogram in dict(shard['histograms']).items():
+                _merge_histogram(histograms, key, list(histogram))
+        return {
+            'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+            'histograms': [[name, list(labels), values] for (name, labels), values in histograms.items()],
+        }
+
+    def write_snapshot(self):
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temporary, os.path.join(self.directory, self._snapshot_name))
+
+    def collect(self):
+        counters = defaultdict(float)
+        histograms = {}
+        snapshots = [self.snapshot()]
+        if self.directory:
+            own = os.path.join(self.directory, self._snapshot_name)
+            for path in glob.glob(os.path.join(self.directory, '*.json')):
+                if path == own:
+                    continue
+                try:
+                    with open(path) as file:
+                        snapshots.append(json.load(file))
+                except (OSError, ValueError):
+                    logger.warning('Не удалось прочитать снимок метрик %s', path)
+        for snapshot in snapshots:
+            for name, labels, value in snapshot['counters']:
+                counters[(name, tuple(map(tuple, labels)))] += value
+            for name, labels, values in snapshot['histograms']:
+                _merge_histogram(histograms, (name, tuple(map(tuple, labels))), values)
+        return counters, histograms
+
+    def render(self):
+        counters, histograms = self.collect()
+        samples = defaultdict(list)
+        for (name, labels), value in sorted(counters.items()):
+            samples[name].append(f'{name}{_labels(labels)} {_number(value)}')
+        for (name, labels), values in sorted(histograms.items()):
+            buckets = self._descriptions[name][2]
+            cumulative = 0
+            for bound, count in zip(buckets + ('+Inf',), values):
+                cumulative += count
+                samples[name].append(f'{name}_bucket{_labels(labels + (("le", _number(bound)),))} {cumulative}')
+            samples[name].append(f'{name}_sum{_labels(labels)} {_number(values[-1])}')
+            samples[name].append(f'{name}_count{_labels(labels)} {cumulative}')
+        lines = []
+        for name in sorted(samples):
+            kind, text, _ = self._descriptions.get(name, ('untyped', '', None))
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples[name])
+        return '\n'.join(lines) + '\n'
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='metrics-snapshot', daemon=True)
+        self._thread.start()
+        atexit.register(self.write_snapshot)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.write_snapshot()
+            except OSError:
+                logger.exception('Не удалось сохранить снимок метрик')
+
+
+def _merge_histogram(histograms, key, values):
+    known = histograms.get(key)
+    if known is None:
+        histograms[key] = values
+    else:
+        for index, value in enumerate(values):
+            known[index] += value
+
+
+def _number(value):
+    if isinstance(value, str):
+        return value
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+registry = Registry(directory=settings.METRICS_DIR, flush_interval=settings.METRICS_FLUSH_INTERVAL)
+registry.describe('http_requests_total', 'counter', 'Запросы по маршруту, методу и классу статуса')
+registry.describe('http_request_duration_seconds', 'histogram', 'Время обработки запроса', LATENCY_BUCKETS)
+registry.describe('http_request_db_queries', 'histogram', 'SQL-запросов на один HTTP-запрос', QUERY_BUCKETS)
+
+
+def inc(name, labels=(), value=1):
+    registry.inc(name, labels, value)
+
+
+def observe(name, value, labels=()):
+    registry.observe(name, value, labels)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _allowed(request):
+    # имена маршрутов и объём трафика наружу не отдаются
+    if settings.METRICS_TOKEN and constant_time_compare(
+            request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'):
+        return True
+    return request.user.is_active and request.user.is_staff
+
+
+@require_safe
+def export(request):
+    if not _allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,206 @@
+import hashlib
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings as django_settings
+
+from shop import settings
+from . import routers, instrumentation, metrics, compression, shared_cache
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def _client_key(request):
+    credentials = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(django_settings.SESSION_COOKIE_NAME)
+    if not credentials:
+        return None
+    return 'db:primary:' + hashlib.sha256(credentials.encode()).hexdigest()
+
+
+class ReplicaPinningMiddleware:
+    """Направляет чтения клиента в основную базу на REPLICA_STICKY_SECONDS после
+    его изменяющего запроса (корзина, избранное, оценки и т.д.).
+
+    Метка «недавно писал» не зависит от воркера: подписанная cookie с
+    ограниченным сроком и, для клиентов без cookie (Token/JWT), запись в
+    общем кэше SHARED_CACHE_ALIAS по хэшу учётных данных.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.READ_REPLICAS:
+            return self.get_response(request)
+        key = _client_key(request)
+        writes = request.method not in SAFE_METHODS
+        pinned = writes or self.has_cookie(request) or (
+            self.shares_marker(key) and shared_cache.get_cache().get(key, False))
+        token = routers.pin_to_primary() if pinned else routers.allow_replicas()
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.unpin(token)
+        if writes and response.status_code < 400:
+            self.set_cookie(response)
+            if self.shares_marker(key):
+                shared_cache.get_cache().set(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.READ_REPLICAS:
+            return await self.get_response(request)
+        key = _client_key(request)
+        writes = request.method not in SAFE_METHODS
+        pinned = writes or self.has_cookie(request) or (
+            self.shares_marker(key) and await shared_cache.get_cache().aget(key, False))
+        token = routers.pin_to_primary() if pinned else routers.allow_replicas()
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.unpin(token)
+        if writes and response.status_code < 400:
+            self.set_cookie(response)
+            if self.shares_marker(key):
+                await shared_cache.get_cache().aset(key, True, settings.REPLICA_STICKY_SECONDS)
+        return response
+
+    def has_cookie(self, request):
+        return bool(request.get_signed_cookie(settings.REPLICA_STICKY_COOKIE, default=None,
+                                              salt=settings.REPLICA_STICKY_COOKIE,
+                                              max_age=settings.REPLICA_STICKY_SECONDS))
+
+    def set_cookie(self, response):
+        response.set_signed_cookie(settings.REPLICA_STICKY_COOKIE, '1', salt=settings.REPLICA_STICKY_COOKIE,
+                                   max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax')
+
+    def shares_marker(self, key):
+        return key is not None and shared_cache.is_shared()
+
+
+class QueryInstrumentationMiddleware:
+    """Для доли запросов QUERY_INSTRUMENTATION_SAMPLE_RATE считает SQL-запросы,
+    время в БД, остальное время (Python: view, сериализация, рендеринг, middleware
+    ниже по цепочке — без разбивки) и размер ответа.
+
+    Повторяющиеся запросы одной формы помечаются как вероятный N+1 с местом
+    вызова. В DEBUG данные уходят в заголовки X-*, в проде — в агрегат по
+    маршрутам (/api/debug/queries/ для персонала).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.QUERY_INSTRUMENTATION_SAMPLE_RATE:
+            return self.get_response(request)
+        start = time.perf_counter()
+        with instrumentation.QueryRecorder().record() as recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.QUERY_INSTRUMENTATION_SAMPLE_RATE:
+            return await self.get_response(request)
+        start = time.perf_counter()
+        async with instrumentation.QueryRecorder().arecord() as recorder:
+            response = await self.get_response(request)
+        return self.report(request, response, recorder, time.perf_counter() - start)
+
+    def report(self, request, response, recorder, total):
+        sample = {
+            'queries': recorder.count,
+            'db_ms': recorder.duration * 1000,
+            'non_db_ms': (total - recorder.duration) * 1000,
+            'total_ms': total * 1000,
+            'bytes': None if response.streaming else len(response.content),
+            'n_plus_one': recorder.repeated(),
+        }
+        instrumentation.route_stats.add(instrumentation.route_name(request), sample)
+        if settings.DEBUG:
+            response['X-DB-Queries'] = sample['queries']
+            response['X-DB-Time-Ms'] = f"{sample['db_ms']:.2f}"
+            response['X-Non-DB-Time-Ms'] = f"{sample['non_db_ms']:.2f}"
+            if sample['bytes'] is not None:
+                response['X-Response-Bytes'] = sample['bytes']
+            if sample['n_plus_one']:
+                worst = sample['n_plus_one'][0]
+                response['X-N-Plus-One'] = f"{len(sample['n_plus_one'])}; {worst['count']}x at {worst['origin']}"
+        return response
+
+
+class MetricsMiddleware:
+    """Считает для /metrics запросы, классы статусов, задержку и число SQL-запросов
+    с меткой маршрута из resolver_match (шаблон, а не сырой путь)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        counter = metrics.QueryCounter()
+        start = time.perf_counter()
+        with instrumentation.wrap_connections(counter):
+            response = self.get_response(request)
+        return self.report(request, response, counter, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        counter = metrics.QueryCounter()
+        start = time.perf_counter()
+        async with instrumentation.awrap_connections(counter):
+            response = await self.get_response(request)
+        return self.report(request, response, counter, time.perf_counter() - start)
+
+    def report(self, request, response, counter, duration):
+        labels = (('method', request.method), ('route', instrumentation.route_name(request)))
+        metrics.inc('http_requests_total', labels + (('status', f'{response.status_code // 100}xx'),))
+        metrics.observe('http_request_duration_seconds', duration, labels)
+        metrics.observe('http_request_db_queries', counter.count, labels)
+        return response
+
+
+class CompressionMiddleware:
+    """Сжимает ответы brotli или gzip по Accept-Encoding; сжатые тела анонимных
+    ответов каталога берутся из кэша (см. store.compression)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return compression.compress_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # сжатие не трогает ORM: в общем пуле потоков, а не в единственном
+        # потоке синхронного кода, где оно задерживало бы запросы к базе
+        return await sync_to_async(compression.compress_response, thread_sensitive=False)(request, response)
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.3 on 2026-10-19 16:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicate_favorites(apps, schema_editor):
+    FavoriteProduct = apps.get_model('store', 'FavoriteProduct')
+    duplicates = (FavoriteProduct.objects.values('user_id', 'product_id')
+                  .annotate(keep_id=Min('id'), total=models.Count('id'))
+                  .filter(total__gt=1))
+    for duplicate in duplicates:
+        (FavoriteProduct.objects
+         .filter(user_id=duplicate['user_id'], product_id=duplicate['product_id'])
+         .exclude(id=duplicate['keep_id'])
+         .delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('store', '0023_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_favorites, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favoriteproduct',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='favorite_product_user_unique'),
+        ),
+    ]
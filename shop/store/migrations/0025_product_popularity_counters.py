@@ -0,0 +1,37 @@
+# Generated by Django 4.2.3 on 2026-10-19 16:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0024_favoriteproduct_user_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='cart_adds_count',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Добавления в корзину'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='favorites_count',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Добавления в избранное'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='popularity',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Популярность'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='views_count',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Просмотры'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['category', '-popularity', 'id'], name='product_category_popular_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.3 on 2026-10-19 18:05
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def make_product_slugs_unique(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    max_length = Product._meta.get_field('slug').max_length
+    duplicates = (Product.objects.values('slug')
+                  .annotate(keep_id=Min('id'), total=Count('id'))
+                  .filter(total__gt=1))
+    for duplicate in duplicates:
+        products = Product.objects.filter(slug=duplicate['slug']).exclude(id=duplicate['keep_id'])
+        for product in products.only('id', 'slug'):
+            suffix = f'-{product.id}'
+            product.slug = product.slug[:max_length - len(suffix)] + suffix
+            product.save(update_fields=['slug'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0025_product_popularity_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(make_product_slugs_unique, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='slug',
+            field=models.SlugField(unique=True, verbose_name='Уникальный идентификатор продукта'),
+        ),
+    ]
@@ -1,5 +1,9 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+import datetime
 
 
 class ProductPagination(PageNumberPagination):
@@ -19,6 +23,13 @@ class ProductPagination(PageNumberPagination):
         )
 
 
+class OrderCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    ordering = ("-created_at", "id")
+
+
 def update_product_quantity(product_in_cart, product, request_data_quantity):
     product.quantity += product_in_cart.quantity - request_data_quantity
     return product.save()
@@ -28,6 +39,99 @@ def get_star():
     return [("1", "1"), ("2", "2"), ("3", "3"), ("4", "4"), ("5", "5")]
 
 
+ORDER_STATUS_PENDING = "pending"
+ORDER_STATUS_PAID = "paid"
+ORDER_STATUS_SHIPPED = "shipped"
+ORDER_STATUS_CANCELLED = "cancelled"
+ORDER_PAID_STATUSES = (ORDER_STATUS_PAID, ORDER_STATUS_SHIPPED)
+
+
+def get_order_status():
+    return [
+        (ORDER_STATUS_PENDING, "Ожидает оплаты"),
+        (ORDER_STATUS_PAID, "Оплачен"),
+        (ORDER_STATUS_SHIPPED, "Отправлен"),
+        (ORDER_STATUS_CANCELLED, "Отменён"),
+    ]
+
+
+def parse_date_param(value, end_of_day=False):
+    # Сначала дата: на Python 3.11+ parse_datetime("2026-01-31") возвращает полночь,
+    # и date_to без времени отрезал бы весь последний день
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is not None:
+        moment = datetime.datetime.combine(day, datetime.time.max if end_of_day else datetime.time.min)
+    else:
+        try:
+            moment = parse_datetime(value)
+        except ValueError:
+            moment = None
+        if moment is None:
+            raise ValidationError({"date": f"Неверный формат даты: {value}"})
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def filter_orders(orders, query_params):
+    date_from = query_params.get("date_from")
+    date_to = query_params.get("date_to")
+    statuses = query_params.getlist("status")
+    if date_from:
+        orders = orders.filter(created_at__gte=parse_date_param(date_from))
+    if date_to:
+        orders = orders.filter(created_at__lte=parse_date_param(date_to, end_of_day=True))
+    if statuses:
+        allowed = dict(get_order_status())
+        unknown = [item for item in statuses if item not in allowed]
+        if unknown:
+            raise ValidationError({"status": f"Неизвестный статус: {', '.join(unknown)}"})
+        orders = orders.filter(status__in=statuses)
+    return orders
+
+
+PRODUCT_ORDERINGS = {
+    "popular": ("-popularity", "id"),
+}
+
+
+def order_products(products, query_params):
+    return products.order_by(*PRODUCT_ORDERINGS.get(query_params.get("ordering"), ("id",)))
+
+
+def _field_names(value):
+    if value is None:
+        return None
+    return {name.strip() for name in value.split(",") if name.strip()}
+
+
+def sparse_fields(query_params, available):
+    """Поля ответа из ?fields=a,b или ?exclude=a,b в порядке available; None — все."""
+    fields = _field_names(query_params.get("fields"))
+    exclude = _field_names(query_params.get("exclude"))
+    if fields is None and exclude is None:
+        return None
+    unknown = sorted(((fields or set()) | (exclude or set())) - set(available))
+    if unknown:
+        raise ValidationError({"fields": f"Неизвестные поля: {', '.join(unknown)}. Доступны: {', '.join(available)}"})
+    selected = tuple(name for name in available
+                     if (fields is None or name in fields) and name not in (exclude or ()))
+    if not selected:
+        raise ValidationError({"fields": "Не выбрано ни одного поля"})
+    return selected
+
+
+def only_fields(queryset, fields, always=()):
+    """only() по колонкам модели, которые нужны выбранным полям ответа."""
+    if fields is None:
+        return queryset
+    concrete = {field.name for field in queryset.model._meta.concrete_fields}
+    return queryset.only(*(name for name in (*always, *fields) if name in concrete))
+
+
 CART_ADD_PRODUCT_PATH = "add"
 CART_DELETE_PRODUCT_PATH = "delete"
 CART_CHANGE_PRODUCT_QUANTITY_IN_CART_PATH = "update"
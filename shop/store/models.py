@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
-from . import mixins
+from django.utils.functional import cached_property
+from shop import settings
+from . import mixins, images
 import uuid
 # Create your models here.
 
@@ -20,6 +22,9 @@ class Category(models.Model):
         else:
             return 'https://www.raumplus.ru/upload/iblock/545/Skoro-zdes-budet-foto.jpg'
 
+    def get_image_srcset(self):
+        return images.srcset(self.image)
+
     class Meta:
         verbose_name = 'Категория'
         verbose_name_plural = 'Категории'
@@ -33,27 +38,45 @@ class Product(models.Model):
     price = models.PositiveIntegerField(verbose_name='Цена продукта', default=0)
     size = models.CharField(max_length=200, verbose_name='Размер продукта')
     color = models.CharField(max_length=200, default='Серебро', verbose_name='Цвет продукта')
-    slug = models.SlugField(unique=False, verbose_name='Уникальный идентификатор продукта')
+    slug = models.SlugField(unique=True, verbose_name='Уникальный идентификатор продукта')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата добавления продукта')
     category = models.ForeignKey(Category, on_delete=models.CASCADE, verbose_name='Категория', related_name='products')
+    views_count = models.PositiveBigIntegerField(default=0, verbose_name='Просмотры')
+    favorites_count = models.PositiveBigIntegerField(default=0, verbose_name='Добавления в избранное')
+    cart_adds_count = models.PositiveBigIntegerField(default=0, verbose_name='Добавления в корзину')
+    popularity = models.PositiveBigIntegerField(default=0, verbose_name='Популярность')
     
     def __str__(self):
         return self.title
 
     
+    def is_popular(self):
+        return self.popularity >= settings.POPULARITY_BADGE_THRESHOLD
+
+    @cached_property
+    def first_gallery_image(self):
+        return self.images.first()
+
     def get_first_image(self):
         if self.images:
             try:
-                return self.images.first().image.url
+                return self.first_gallery_image.image.url
             except:
                 return 'https://www.raumplus.ru/upload/iblock/545/Skoro-zdes-budet-foto.jpg'
         else:
             return 'https://www.raumplus.ru/upload/iblock/545/Skoro-zdes-budet-foto.jpg'
+
+    def get_first_image_srcset(self):
+        gallery = self.first_gallery_image
+        return images.srcset(gallery.image) if gallery else None
         
     
     class Meta:
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
+        indexes = [
+            models.Index(fields=['category', '-popularity', 'id'], name='product_category_popular_idx'),
+        ]
 
     
         
@@ -109,6 +132,9 @@ class FavoriteProduct(models.Model):
     class Meta:
         verbose_name ='Избранный продукт'
         verbose_name_plural = 'Избранные продукты'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='favorite_product_user_unique'),
+        ]
         
 
 class Cart(models.Model):
@@ -149,6 +175,9 @@ class Order(models.Model):
     order_total_price = models.PositiveIntegerField()
     order_product_total_quantity = models.PositiveIntegerField()
     session_id = models.TextField(unique=True)
+    status = models.CharField(max_length=20, choices=mixins.get_order_status(),
+                              default=mixins.ORDER_STATUS_PENDING, verbose_name='Статус заказа')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания заказа')
     
     def __str__(self):
         return str(self.pk)
@@ -156,11 +185,17 @@ class Order(models.Model):
     class Meta:
         verbose_name ='Заказ'
         verbose_name_plural = 'Заказы'
+        ordering = ('-created_at', 'id')
+        indexes = [
+            models.Index(fields=['user', '-created_at', 'id'], name='order_user_created_idx'),
+        ]
         
         
 class OrderProduct(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_product')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField(default=1, verbose_name='Количество продукта')
+    price = models.PositiveIntegerField(default=0, verbose_name='Стоимость позиции')
     
     def __str__(self) -> str:
         return str(self.order.id)
@@ -168,6 +203,40 @@ class OrderProduct(models.Model):
     class Meta:
         verbose_name = 'Продукт заказа'
         verbose_name_plural = 'Продукты заказа'
+
+
+class DailyProductSales(models.Model):
+    date = models.DateField(verbose_name='Дата')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales', verbose_name='Продукт')
+    quantity = models.PositiveBigIntegerField(default=0, verbose_name='Продано единиц')
+    revenue = models.PositiveBigIntegerField(default=0, verbose_name='Выручка')
+
+    def __str__(self):
+        return f'{self.date} {self.product_id}'
+
+    class Meta:
+        verbose_name = 'Продажи продукта за день'
+        verbose_name_plural = 'Продажи продуктов по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='daily_product_sales_unique'),
+        ]
+
+
+class DailyCategorySales(models.Model):
+    date = models.DateField(verbose_name='Дата')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales', verbose_name='Категория')
+    quantity = models.PositiveBigIntegerField(default=0, verbose_name='Продано единиц')
+    revenue = models.PositiveBigIntegerField(default=0, verbose_name='Выручка')
+
+    def __str__(self):
+        return f'{self.date} {self.category_id}'
+
+    class Meta:
+        verbose_name = 'Продажи категории за день'
+        verbose_name_plural = 'Продажи категорий по дням'
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='daily_category_sales_unique'),
+        ]
         
     
         
@@ -178,6 +247,9 @@ class Customer(models.Model):
     last_name = models.CharField(verbose_name='Фамилия пользователя', max_length=50)
     phone = models.CharField(verbose_name='Номер телефона', max_length=30)
     image = models.ImageField(verbose_name='Изображение', upload_to='user/', null=True, blank=True)
+
+    def get_image_srcset(self):
+        return images.srcset(self.image)
         
         
 
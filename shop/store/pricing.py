@@ -0,0 +1,56 @@
+from django.db import transaction
+from django.db.models import BigIntegerField, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Greatest
+
+from .models import Product, Cart, Category
+from .signals import catalog_bulk_updated
+
+
+UPDATE_BATCH_SIZE = 5000
+BASIS_POINTS = 10000
+
+
+def category_with_descendants(category_id):
+    ids = [category_id]
+    level = [category_id]
+    while level:
+        level = list(Category.objects.filter(parent_id__in=level).values_list('id', flat=True))
+        ids.extend(level)
+    return ids
+
+
+def _price_expression(price_percent, price_delta):
+    price = F('price')
+    if price_percent:
+        # целочисленная арифметика в bigint с округлением до ближайшего: цены хранятся в целых
+        basis_points = int(round(price_percent * 100))
+        price = (Cast(price, BigIntegerField()) * (BASIS_POINTS + basis_points) + BASIS_POINTS // 2) / BASIS_POINTS
+    if price_delta:
+        price = price + price_delta
+    return Greatest(price, Value(0), output_field=IntegerField())
+
+
+def apply_changes(products, price_percent=None, price_delta=None, stock_delta=None):
+    """Меняет цену (в процентах и/или на сумму) и остаток у набора продуктов
+    UPDATE-запросами с F() и в той же транзакции пересчитывает цены позиций
+    корзин с этими продуктами. Кэши сбрасываются одним сигналом после коммита.
+    """
+    updates = {}
+    if price_percent or price_delta:
+        updates['price'] = _price_expression(price_percent, price_delta)
+    if stock_delta:
+        updates['quantity'] = Greatest(F('quantity') + stock_delta, Value(0), output_field=IntegerField())
+    if not updates:
+        return {'products': 0, 'carts': 0}
+    product_ids = list(products.order_by().values_list('id', flat=True))
+    updated = carts = 0
+    with transaction.atomic():
+        for start in range(0, len(product_ids), UPDATE_BATCH_SIZE):
+            batch = product_ids[start:start + UPDATE_BATCH_SIZE]
+            updated += Product.objects.filter(id__in=batch).update(**updates)
+            if 'price' in updates:
+                price = Product.objects.filter(id=OuterRef('product_id')).values('price')[:1]
+                carts += Cart.objects.filter(product_id__in=batch).update(price=Subquery(price) * F('quantity'))
+        transaction.on_commit(lambda: catalog_bulk_updated.send(
+            sender=Product, product_ids=product_ids, fields=list(updates)))
+    return {'products': updated, 'carts': carts}
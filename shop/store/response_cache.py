@@ -0,0 +1,93 @@
+import hashlib
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+
+from shop import settings
+from . import metrics
+
+
+# Теги, от которых зависят закэшированные ответы каталога:
+#   catalog        — всё сразу (массовый импорт с неизвестным набором продуктов);
+#   categories     — дерево категорий;
+#   category:<id>  — категория и карточки её продуктов (включая первое фото галереи);
+#   product:<id>   — детали продукта: поля, название категории, отзывы, галерея, оценки.
+CATALOG = 'catalog'
+CATEGORIES = 'categories'
+
+metrics.registry.describe('response_cache_total', 'counter',
+                          'Обращения к кэшу ответов каталога по эндпоинту и результату')
+metrics.registry.describe('response_cache_invalidations_total', 'counter',
+                          'Сброшенные теги кэша ответов по виду тега')
+
+
+def category(pk):
+    return f'category:{pk}'
+
+
+def product(pk):
+    return f'product:{pk}'
+
+
+def _cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _tag_key(tag):
+    return f'response-tag:{tag}'
+
+
+def is_cacheable(request):
+    """Кэшируются только анонимные GET: у авторизованных в ответе избранное,
+    корзина и оценки, их данные не повторяются между пользователями."""
+    return (settings.RESPONSE_CACHE_ENABLED and request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated)
+
+
+def entry_key(endpoint, url):
+    # url абсолютный: ссылки на изображения в ответе строятся от хоста запроса
+    return f'response:{endpoint}:{hashlib.blake2b(url.encode(), digest_size=20).hexdigest()}'
+
+
+def get(endpoint, key, tags):
+    """(данные или None, версии тегов). Запись действительна, только если версии
+    всех её тегов не менялись с момента записи; всё читается одним get_many.
+
+    Версии возвращаются и при промахе: их нужно передать в save(), прочитав до
+    выборки данных, — тогда сброс тега во время выборки сделает запись устаревшей.
+    """
+    cache = _cache()
+    tag_keys = {_tag_key(tag): tag for tag in tags}
+    found = cache.get_many([key, *tag_keys])
+    versions = {tag: found.get(tag_key) for tag_key, tag in tag_keys.items()}
+    missing = {tag_key: uuid.uuid4().hex for tag_key, tag in tag_keys.items() if versions[tag] is None}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update({tag_keys[tag_key]: version for tag_key, version in missing.items()})
+    entry = found.get(key)
+    hit = entry is not None and not missing and entry[0] == versions
+    metrics.inc('response_cache_total', (('endpoint', endpoint), ('result', 'hit' if hit else 'miss')))
+    return (entry[1] if hit else None), versions
+
+
+def save(key, versions, data):
+    _cache().set(key, (versions, data), settings.RESPONSE_CACHE_TIMEOUT)
+
+
+def _bump(tags):
+    tags = list(dict.fromkeys(tags))
+    _cache().set_many({_tag_key(tag): uuid.uuid4().hex for tag in tags}, None)
+    kinds = {}
+    for tag in tags:
+        kind = tag.partition(':')[0]
+        kinds[kind] = kinds.get(kind, 0) + 1
+    for kind, count in kinds.items():
+        metrics.inc('response_cache_invalidations_total', (('tag', kind),), count)
+
+
+def invalidate(*tags):
+    """Сбрасывает теги после коммита: до него другие запросы ещё видят старые
+    данные и могли бы снова положить их в кэш под новой версией."""
+    if tags:
+        transaction.on_commit(lambda: _bump(tags))
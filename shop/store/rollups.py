@@ -0,0 +1,100 @@
+import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Order, OrderProduct, DailyProductSales, DailyCategorySales
+from . import mixins
+
+
+def _increment(model, lookup, quantity, revenue):
+    updated = model.objects.filter(**lookup).update(
+        quantity=F('quantity') + quantity, revenue=F('revenue') + revenue
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(quantity=quantity, revenue=revenue, **lookup)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(
+            quantity=F('quantity') + quantity, revenue=F('revenue') + revenue
+        )
+
+
+def apply_order(order):
+    day = timezone.localdate(order.created_at)
+    lines = (OrderProduct.objects.filter(order=order)
+             .values('product_id', 'product__category_id')
+             .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('price')))
+    categories = {}
+    for line in lines:
+        _increment(DailyProductSales, {'date': day, 'product_id': line['product_id']},
+                   line['total_quantity'], line['total_revenue'])
+        totals = categories.setdefault(line['product__category_id'], [0, 0])
+        totals[0] += line['total_quantity']
+        totals[1] += line['total_revenue']
+    for category_id, (quantity, revenue) in categories.items():
+        _increment(DailyCategorySales, {'date': day, 'category_id': category_id}, quantity, revenue)
+
+
+def mark_order_paid(order):
+    with transaction.atomic():
+        updated = (Order.objects.filter(pk=order.pk, status=mixins.ORDER_STATUS_PENDING)
+                   .update(status=mixins.ORDER_STATUS_PAID))
+        if updated:
+            order.status = mixins.ORDER_STATUS_PAID
+            apply_order(order)
+    return bool(updated)
+
+
+def rebuild(date_from, date_to, chunk_days=7, batch_size=1000, stdout=None):
+    day = date_from
+    while day <= date_to:
+        chunk_end = min(day + datetime.timedelta(days=chunk_days - 1), date_to)
+        with transaction.atomic():
+            DailyProductSales.objects.filter(date__range=(day, chunk_end)).delete()
+            DailyCategorySales.objects.filter(date__range=(day, chunk_end)).delete()
+            lines = (OrderProduct.objects
+                     .filter(order__status__in=mixins.ORDER_PAID_STATUSES,
+                             order__created_at__date__range=(day, chunk_end))
+                     .annotate(day=TruncDate('order__created_at'))
+                     .values('day', 'product_id')
+                     .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('price'))
+                     .order_by())
+            DailyProductSales.objects.bulk_create(
+                (DailyProductSales(date=line['day'], product_id=line['product_id'],
+                                   quantity=line['total_quantity'], revenue=line['total_revenue'])
+                 for line in lines.iterator(chunk_size=batch_size)),
+                batch_size=batch_size,
+            )
+            categories = (DailyProductSales.objects.filter(date__range=(day, chunk_end))
+                          .values('date', 'product__category_id')
+                          .annotate(total_quantity=Sum('quantity'), total_revenue=Sum('revenue'))
+                          .order_by())
+            DailyCategorySales.objects.bulk_create(
+                [DailyCategorySales(date=row['date'], category_id=row['product__category_id'],
+                                    quantity=row['total_quantity'], revenue=row['total_revenue'])
+                 for row in categories],
+                batch_size=batch_size,
+            )
+        if stdout:
+            stdout.write(f'{day} — {chunk_end}: готово')
+        day = chunk_end + datetime.timedelta(days=1)
+
+
+def sales_report(date_from, date_to, group_by):
+    if group_by == 'product':
+        rows = (DailyProductSales.objects.filter(date__range=(date_from, date_to))
+                .values('product_id', 'product__title'))
+    elif group_by == 'category':
+        rows = (DailyCategorySales.objects.filter(date__range=(date_from, date_to))
+                .values('category_id', 'category__title'))
+    else:
+        rows = DailyCategorySales.objects.filter(date__range=(date_from, date_to)).values('date')
+        return list(rows.annotate(quantity_total=Sum('quantity'), revenue_total=Sum('revenue'))
+                    .order_by('date'))
+    return list(rows.annotate(quantity_total=Sum('quantity'), revenue_total=Sum('revenue'))
+                .order_by('-revenue_total'))
@@ -0,0 +1,64 @@
+import contextlib
+import contextvars
+import random
+
+from django.db import DEFAULT_DB_ALIAS
+
+from shop import settings
+
+
+# None — код вне запроса (команды, фоновые потоки): он всегда работает с основной
+# базой. Реплики разрешает только ReplicaPinningMiddleware на время запроса.
+_pinned_to_primary = contextvars.ContextVar('pinned_to_primary', default=None)
+
+
+def pin_to_primary():
+    return _pinned_to_primary.set(True)
+
+
+def allow_replicas():
+    return _pinned_to_primary.set(False)
+
+
+def unpin(token):
+    _pinned_to_primary.reset(token)
+
+
+def is_pinned():
+    return _pinned_to_primary.get() is not False
+
+
+@contextlib.contextmanager
+def use_primary():
+    token = pin_to_primary()
+    try:
+        yield
+    finally:
+        unpin(token)
+
+
+class PrimaryReplicaRouter:
+    """Читает с реплик из READ_REPLICAS, пишет в основную базу.
+
+    После первой записи и до конца запроса (или на REPLICA_STICKY_SECONDS после
+    изменяющего запроса того же клиента, см. ReplicaPinningMiddleware) чтения
+    тоже идут в основную базу, чтобы пользователь видел свои изменения. Вне
+    запроса реплики не используются вовсе.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.READ_REPLICAS or is_pinned():
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.READ_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        # только внутри запроса: middleware вернёт прежнее значение по его окончании
+        if _pinned_to_primary.get() is False:
+            pin_to_primary()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
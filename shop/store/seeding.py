@@ -0,0 +1,190 @@
+import random
+import uuid
+
+from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
+
+from .models import (Category, Product, Gallery, Review, Rating, FavoriteProduct, Cart,
+                     Shipping, Order, OrderProduct)
+from . import mixins
+
+
+CATALOG_ROOT_SLUG = 'catalog'
+CATALOG_SIZES = ('XS', 'S', 'M', 'L', 'XL')
+CATALOG_COLORS = ('Серебро', 'Золото', 'Чёрный', 'Белый', 'Синий')
+
+
+def seed_users(count, prefix='bench', batch_size=1000):
+    password = make_password(None)
+    existing = set(User.objects.filter(username__startswith=prefix).values_list('username', flat=True))
+    users = [User(username=f'{prefix}{index}', password=password)
+             for index in range(count) if f'{prefix}{index}' not in existing]
+    User.objects.bulk_create(users, batch_size=batch_size)
+    return list(User.objects.filter(username__startswith=prefix).values_list('id', flat=True))
+
+
+def seed_orders(orders, lines_per_order=3, users=100, products=1000, batch_size=2000, seed=0, stdout=None,
+                user_prefix='bench'):
+    rng = random.Random(seed)
+    category, _ = Category.objects.get_or_create(slug='bench', defaults={'title': 'Bench'})
+    product_ids = list(Product.objects.values_list('id', flat=True)[:products])
+    if len(product_ids) < products:
+        Product.objects.bulk_create(
+            [Product(title=f'Bench product {index}', slug=f'bench-product-{index}', size='M',
+                     price=rng.randint(1, 1000), quantity=1000, category=category)
+             for index in range(len(product_ids), products)],
+            batch_size=batch_size,
+        )
+        product_ids = list(Product.objects.values_list('id', flat=True)[:products])
+    user_ids = seed_users(users, prefix=user_prefix)
+    shipping_ids = {}
+    for user_id in user_ids:
+        shipping, _ = Shipping.objects.get_or_create(
+            user_id=user_id,
+            defaults={'first_name': 'Bench', 'last_name': str(user_id), 'email': f'bench{user_id}@example.com',
+                      'address': 'Bench street'},
+        )
+        shipping_ids[user_id] = shipping.id
+    statuses = [status for status, _ in mixins.get_order_status()]
+    created = 0
+    while created < orders:
+        size = min(batch_size, orders - created)
+        batch = []
+        lines = []
+        for _ in range(size):
+            user_id = rng.choice(user_ids)
+            order = Order(id=uuid.uuid4(), user_id=user_id, shipping_id=shipping_ids[user_id],
+                          order_total_price=0, order_product_total_quantity=0,
+                          session_id=uuid.uuid4().hex, status=rng.choice(statuses))
+            for product_id in rng.sample(product_ids, min(lines_per_order, len(product_ids))):
+                quantity = rng.randint(1, 5)
+                price = quantity * rng.randint(1, 1000)
+                order.order_total_price += price
+                order.order_product_total_quantity += quantity
+                lines.append(OrderProduct(order_id=order.id, product_id=product_id, quantity=quantity, price=price))
+            batch.append(order)
+        Order.objects.bulk_create(batch, batch_size=batch_size)
+        OrderProduct.objects.bulk_create(lines, batch_size=batch_size)
+        created += size
+        if stdout:
+            stdout.write(f'Заказов создано: {created}/{orders}')
+    return created
+
+
+def _batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed_categories(depth, fanout, batch_size=5000):
+    root = Category.objects.create(title='Каталог', slug=CATALOG_ROOT_SLUG)
+    level = [(root.id, CATALOG_ROOT_SLUG)]
+    for _ in range(depth):
+        children = [Category(title=f'Категория {slug[len(CATALOG_ROOT_SLUG):]}-{index}', slug=f'{slug}-{index}',
+                             parent_id=parent_id)
+                    for parent_id, slug in level for index in range(fanout)]
+        Category.objects.bulk_create(children, batch_size=batch_size)
+        level = [(category.id, category.slug) for category in children]
+    return [category_id for category_id, _ in level]
+
+
+def seed_catalog(products=100_000, depth=4, fanout=5, images_per_product=2, reviews=1_000_000, reply_share=0.3,
+                 ratings=200_000, users=1000, cart_items=3, favorites=10, orders=20_000, batch_size=5000,
+                 seed=0, stdout=None):
+    """Синтетический каталог для store.management.commands.bench_api.
+
+    Один и тот же seed даёт одинаковые данные, поэтому замеры на разных коммитах
+    сравнимы. Всё создаётся через bulk_create пачками по batch_size.
+    """
+    rng = random.Random(seed)
+
+    def report(message):
+        if stdout:
+            stdout.write(message)
+
+    leaf_ids = seed_categories(depth, fanout, batch_size)
+    report(f'Категорий-листьев: {len(leaf_ids)}')
+
+    for start in range(0, products, batch_size):
+        Product.objects.bulk_create([
+            Product(title=f'Товар {index}', slug=f'catalog-{index}', description=f'Описание товара {index}',
+                    category_id=rng.choice(leaf_ids), price=rng.randint(100, 100_000), quantity=1_000_000,
+                    size=rng.choice(CATALOG_SIZES), color=rng.choice(CATALOG_COLORS),
+                    popularity=int(rng.paretovariate(1.2) * 10))
+            for index in range(start, min(start + batch_size, products))
+        ])
+        report(f'Продуктов создано: {min(start + batch_size, products)}/{products}')
+    prices = dict(Product.objects.filter(slug__startswith='catalog-').values_list('id', 'price'))
+    product_ids = sorted(prices)
+
+    galleries = (Gallery(product_id=product_id, image=f'product/catalog-{product_id}-{index}.jpg')
+                 for product_id in product_ids for index in range(images_per_product))
+    for batch in _batches(galleries, batch_size):
+        Gallery.objects.bulk_create(batch)
+    report(f'Изображений галереи: {len(product_ids) * images_per_product}')
+
+    user_ids = seed_users(users, prefix='catalog', batch_size=batch_size)
+
+    roots_total = int(reviews * (1 - reply_share))
+    replies_total = reviews - roots_total
+    roots_created = replies_created = 0
+    parents = []
+    while roots_created < roots_total or (parents and replies_created < replies_total):
+        size = min(batch_size, roots_total - roots_created)
+        if size:
+            parents = [Review(user_id=rng.choice(user_ids), product_id=rng.choice(product_ids), text='Отзыв')
+                       for _ in range(size)]
+            Review.objects.bulk_create(parents)
+            roots_created += size
+        if roots_created < roots_total:
+            replies_size = min(size * replies_total // roots_total, replies_total - replies_created)
+        else:
+            replies_size = replies_total - replies_created
+        replies = []
+        for _ in range(replies_size):
+            parent = rng.choice(parents)
+            replies.append(Review(user_id=rng.choice(user_ids), product_id=parent.product_id,
+                                  parent_id=parent.id, text='Ответ'))
+        Review.objects.bulk_create(replies, batch_size=batch_size)
+        replies_created += replies_size
+        report(f'Отзывов создано: {roots_created + replies_created}/{reviews}')
+
+    stars = [star for star, _ in mixins.get_star()]
+    pairs = set()
+    while len(pairs) < min(ratings, len(user_ids) * len(product_ids)):
+        pairs.add((rng.choice(user_ids), rng.choice(product_ids)))
+    ratings_iter = (Rating(user_id=user_id, product_id=product_id, star=rng.choice(stars))
+                    for user_id, product_id in sorted(pairs))
+    for batch in _batches(ratings_iter, batch_size):
+        Rating.objects.bulk_create(batch)
+    report(f'Оценок: {len(pairs)}')
+
+    carts = []
+    favorites_rows = []
+    for user_id in user_ids:
+        for product_id in rng.sample(product_ids, min(cart_items, len(product_ids))):
+            quantity = rng.randint(1, 3)
+            carts.append(Cart(user_id=user_id, product_id=product_id, quantity=quantity,
+                              price=prices[product_id] * quantity))
+        favorites_rows.extend(FavoriteProduct(user_id=user_id, product_id=product_id)
+                              for product_id in rng.sample(product_ids, min(favorites, len(product_ids))))
+    Cart.objects.bulk_create(carts, batch_size=batch_size)
+    FavoriteProduct.objects.bulk_create(favorites_rows, batch_size=batch_size)
+    report(f'Позиций в корзинах: {len(carts)}, избранного: {len(favorites_rows)}')
+
+    seed_orders(orders, users=users, products=min(len(product_ids), 1000), batch_size=batch_size,
+                seed=seed, stdout=stdout, user_prefix='catalog')
+    return {
+        'categories': Category.objects.filter(slug__startswith=CATALOG_ROOT_SLUG).count(),
+        'products': len(product_ids),
+        'reviews': roots_created + replies_created,
+        'ratings': len(pairs),
+        'users': len(user_ids),
+        'orders': orders,
+    }
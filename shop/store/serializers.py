@@ -1,8 +1,22 @@
 from rest_framework import serializers
-from .models import Product, Category, Review, FavoriteProduct, Order, Cart, Shipping, Rating, Customer, OrderProduct
-from . import mixins
+from .models import Product, Category, Review, FavoriteProduct, Order, Cart, Shipping, Rating, Customer, OrderProduct, Gallery
+from . import mixins, favorites
 from shop import settings
-import stripe
+
+class SparseFieldsSerializerMixin:
+    """Оставляет только поля из context['fields'] (см. mixins.sparse_fields)."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected = self.context.get('fields')
+        if selected is None:
+            return fields
+        return {name: field for name, field in fields.items() if name in selected}
+
+    def wants(self, name):
+        selected = self.context.get('fields')
+        return selected is None or name in selected
+
 
 class CategoryFilterSerializer(serializers.ListSerializer):
     def to_representation(self, data):
@@ -14,8 +28,9 @@ class CategoryRecursiveSerializer(serializers.Serializer):
         serializer = self.parent.parent.__class__(instance, context=self.context)
         return serializer.data
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     subcategories = CategoryRecursiveSerializer(many=True)
+    get_image_srcset = serializers.ReadOnlyField()
     
     class Meta:
         list_serializer_class = CategoryFilterSerializer
@@ -24,18 +39,16 @@ class CategorySerializer(serializers.ModelSerializer):
 
 
         
-class ProductsForCategories(serializers.ModelSerializer):
+class ProductsForCategories(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = ('id', 'title', 'price', 'slug', 'category', 'get_first_image',)
+        fields = ('id', 'title', 'price', 'slug', 'category', 'get_first_image', 'get_first_image_srcset', 'is_popular',)
         
     def to_representation(self, instance):
         product_detail =  super().to_representation(instance)
-        user = self.context['request'].user
-        product = Product.objects.filter(id=instance.id).first()
-        if user.is_authenticated:
-            favorites = product.favorites.filter(user=user, product_id=product.id).first()
-            product_detail['favorite'] = True if favorites else False
+        request = self.context['request']
+        if request.user.is_authenticated and self.wants('favorite'):
+            product_detail['favorite'] = instance.id in favorites.for_request(request)
         return product_detail
         
 
@@ -43,7 +56,7 @@ class CategoryDetailSerializer(serializers.ModelSerializer):
     products = ProductsForCategories(many=True)
     class Meta:
         model = Category
-        fields = ('id', 'title', 'image', 'slug', 'products')
+        fields = ('id', 'title', 'image', 'get_image_srcset', 'slug', 'products')
         list_serializer_class = mixins.ProductPagination
         
 
@@ -101,6 +114,13 @@ class AddProductToUserFavorites(serializers.ModelSerializer):
         return favorite_product
             
                  
+class FavoriteCheckSerializer(serializers.Serializer):
+    products = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False,
+        max_length=favorites.FAVORITES_CHECK_MAX_PRODUCTS,
+    )
+
+
 class UserFavoriteProductSerializer(serializers.ModelSerializer):
     product = ProductsForCategories()
     
@@ -111,7 +131,7 @@ class UserFavoriteProductSerializer(serializers.ModelSerializer):
         
 
     
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     category = serializers.SlugRelatedField(slug_field='title', read_only=True)
     reviews = ReviewSerializer(many=True)
 
@@ -121,16 +141,20 @@ class ProductDetailSerializer(serializers.ModelSerializer):
         
     def to_representation(self, instance):
         product_detail =  super().to_representation(instance)
-        user = self.context['request'].user
-        product = Product.objects.filter(id=instance.id).first()
+        request = self.context['request']
+        user = request.user
+        product = instance
         if user.is_authenticated:
-            favorites = product.favorites.filter(user=user, product_id=product.id).first()
-            product_in_cart = product.cart_product.filter(user=user, product_id=product.id).first()
-            user_product_rating = product.product_rating.filter(user=user, product_id=product.id).first()
-            product_detail['favorite'] = favorites.id if favorites else False
-            product_detail['in_cart'] = product_in_cart.id if product_in_cart else False
-            product_detail['rating'] = user_product_rating.star if user_product_rating else False
-            product_detail['image'] = product.get_first_image()
+            if self.wants('favorite'):
+                product_detail['favorite'] = favorites.for_request(request).get(product.id, False)
+            if self.wants('in_cart'):
+                product_in_cart = product.cart_product.filter(user_id=user.id, product_id=product.id).first()
+                product_detail['in_cart'] = product_in_cart.id if product_in_cart else False
+            if self.wants('rating'):
+                user_product_rating = product.product_rating.filter(user_id=user.id, product_id=product.id).first()
+                product_detail['rating'] = user_product_rating.star if user_product_rating else False
+            if self.wants('image'):
+                product_detail['image'] = product.get_first_image()
         return product_detail
     
   
@@ -202,6 +226,8 @@ class ShippingSerializer(serializers.ModelSerializer):
     
     
 class CustomerSerializer(serializers.ModelSerializer):
+    get_image_srcset = serializers.ReadOnlyField()
+
     def to_representation(self, instance):
         customer = super().to_representation(instance)
         customer['user'] = self.context['request'].user.id
@@ -218,6 +244,8 @@ class PaymentSerializer(serializers.Serializer):
     save = serializers.SerializerMethodField()
     
     def get_save(self, obj):
+        import stripe
+
         request = self.context.get('request')
         user = request.user
         stripe.api_key = settings.STRIPE_SECRET_KEY
@@ -247,8 +275,11 @@ class PaymentSerializer(serializers.Serializer):
                             order_total_price=total_price,
                             order_product_total_quantity=total_quantity,
                             session_id=session['id']) 
-                for cart_product in user_cart:            
-                    order_product = OrderProduct.objects.create(order=order, product=cart_product.product)
+                OrderProduct.objects.bulk_create([
+                    OrderProduct(order=order, product_id=cart_product.product_id,
+                                 quantity=cart_product.quantity, price=cart_product.price)
+                    for cart_product in user_cart
+                ])
                 if order:
                     user_cart.delete()
                 return True
@@ -260,12 +291,46 @@ class PaymentSerializer(serializers.Serializer):
                
                
 
-class UserOrderSerializer(serializers.ModelSerializer):
+class SalesReportQuerySerializer(serializers.Serializer):
+    date_from = serializers.DateField()
+    date_to = serializers.DateField()
+    group_by = serializers.ChoiceField(choices=('day', 'category', 'product'), default='day')
+
+    def validate(self, attrs):
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError('date_from не может быть позже date_to')
+        return attrs
+
+
+class CatalogBulkChangeSerializer(serializers.Serializer):
+    products = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, allow_empty=False)
+    category = serializers.PrimaryKeyRelatedField(queryset=Category.objects.all(), required=False)
+    include_subcategories = serializers.BooleanField(default=True)
+    price_percent = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=-100, max_value=1000,
+                                             required=False)
+    price_delta = serializers.IntegerField(required=False)
+    stock_delta = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if not attrs.get('products') and not attrs.get('category'):
+            raise serializers.ValidationError('Укажите products или category')
+        if not any(attrs.get(field) for field in ('price_percent', 'price_delta', 'stock_delta')):
+            raise serializers.ValidationError('Укажите price_percent, price_delta или stock_delta')
+        return attrs
+
+
+class GallerySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Gallery
+        fields = ('id', 'image', 'product')
+
+
+class UserOrderSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     shipping = ShippingSerializer()
     
     def to_representation(self, instance):
         context = super().to_representation(instance)
-        if self.context['action'] == 'retrieve':   
+        if self.context['action'] == 'retrieve' and self.wants('products'):
             order_products = OrderProduct.objects.filter(order_id=instance.id)
             products = []
             for order_product in order_products:
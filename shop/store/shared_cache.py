@@ -0,0 +1,14 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from shop import settings
+
+
+def get_cache():
+    return caches[settings.SHARED_CACHE_ALIAS]
+
+
+def is_shared():
+    """LocMemCache живёт в памяти процесса: сброс из сигнала увидит только воркер,
+    который его выполнил, остальные продолжат отдавать старые данные."""
+    return not isinstance(get_cache(), LocMemCache)
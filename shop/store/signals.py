@@ -0,0 +1,118 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
+from djoser.signals import user_activated, user_updated
+from rest_framework.authtoken.models import Token
+
+from .models import FavoriteProduct, Gallery, Category, Customer, Product, Review, Rating
+from . import favorites, counters, images, authentication, response_cache
+
+
+# Массовое изменение каталога в обход save(): product_ids — список id или None,
+# если затронут неизвестный набор продуктов; fields — изменённые поля.
+catalog_bulk_updated = Signal()
+
+BULK_INVALIDATION_BATCH_SIZE = 500
+
+
+@receiver(post_save, sender=FavoriteProduct)
+@receiver(post_delete, sender=FavoriteProduct)
+def refresh_user_favorites(sender, instance, **kwargs):
+    favorites.refresh(instance.user_id)
+
+
+@receiver(post_save, sender=FavoriteProduct)
+def count_favorite_added(sender, instance, created, **kwargs):
+    if created:
+        counters.incr(instance.product_id, counters.FAVORITES)
+
+
+@receiver(post_save, sender=Gallery)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Customer)
+def generate_image_derivatives(sender, instance, **kwargs):
+    if instance.image:
+        images.schedule(instance.image.name)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, update_fields=None, **kwargs):
+    # вход обновляет только last_login — кэш из-за этого не сбрасывается
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    authentication.invalidate_user(instance.pk)
+
+
+@receiver(user_logged_out)
+@receiver(user_activated)
+@receiver(user_updated)
+def invalidate_cached_user_on_auth_event(sender, user, **kwargs):
+    if user is not None and user.pk:
+        authentication.invalidate_user(user.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    authentication.invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_responses(sender, instance, **kwargs):
+    # название категории есть в деталях каждого её продукта
+    product_ids = Product.objects.filter(category_id=instance.pk).values_list('id', flat=True)
+    response_cache.invalidate(response_cache.CATEGORIES, response_cache.category(instance.pk),
+                              *(response_cache.product(product_id) for product_id in product_ids))
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, raw=False, **kwargs):
+    # при переносе в другую категорию сбрасываются карточки обеих
+    if instance.pk and not raw:
+        instance._saved_category_id = (Product.objects.filter(pk=instance.pk)
+                                       .values_list('category_id', flat=True).first())
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_responses(sender, instance, **kwargs):
+    tags = [response_cache.product(instance.pk), response_cache.category(instance.category_id)]
+    saved_category_id = getattr(instance, '_saved_category_id', None)
+    if saved_category_id is not None and saved_category_id != instance.category_id:
+        tags.append(response_cache.category(saved_category_id))
+    response_cache.invalidate(*tags)
+
+
+@receiver(post_save, sender=Gallery)
+@receiver(post_delete, sender=Gallery)
+def invalidate_gallery_responses(sender, instance, **kwargs):
+    # первое фото галереи есть и в карточке продукта в категории
+    category_id = Product.objects.filter(pk=instance.product_id).values_list('category_id', flat=True).first()
+    tags = [response_cache.product(instance.product_id)]
+    if category_id is not None:
+        tags.append(response_cache.category(category_id))
+    response_cache.invalidate(*tags)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=Rating)
+@receiver(post_delete, sender=Rating)
+def invalidate_product_feedback_responses(sender, instance, **kwargs):
+    response_cache.invalidate(response_cache.product(instance.product_id))
+
+
+@receiver(catalog_bulk_updated)
+def invalidate_bulk_updated_responses(sender, product_ids=None, **kwargs):
+    if product_ids is None:
+        response_cache.invalidate(response_cache.CATALOG)
+        return
+    tags = []
+    for start in range(0, len(product_ids), BULK_INVALIDATION_BATCH_SIZE):
+        batch = product_ids[start:start + BULK_INVALIDATION_BATCH_SIZE]
+        tags.extend(response_cache.product(product_id) for product_id in batch)
+        tags.extend(response_cache.category(category_id) for category_id in
+                    Product.objects.filter(id__in=batch).order_by().values_list('category_id', flat=True).distinct())
+    response_cache.invalidate(*tags)
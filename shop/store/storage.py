@@ -0,0 +1,69 @@
+import hashlib
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+from .images import DERIVATIVES_DIR
+
+
+CONTENT_HASH_PATTERN = re.compile(r'(^|/)[0-9a-f]{64}(\.[^/]*)?(/|$)')
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+def is_content_addressed(name):
+    return bool(CONTENT_HASH_PATTERN.search(name))
+
+
+def is_immutable(name):
+    """Под именем по хэшу никогда не окажется другое содержимое. Превью лежат в
+    каталоге с хэшем оригинала, но regenerate_images --overwrite пишет их заново
+    под тем же именем, поэтому к ним это не относится."""
+    return is_content_addressed(name) and not name.startswith(f'{DERIVATIVES_DIR}/')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит загрузки под именем sha256 содержимого: <папка>/<xx>/<sha256>.<ext>.
+
+    Одинаковые файлы записываются один раз, а имя никогда не переиспользуется
+    для другого содержимого, поэтому такие URL можно кэшировать навсегда.
+    Превью из DERIVATIVES_DIR сохраняются под своими детерминированными именами.
+    """
+
+    def hashed_name(self, name, content):
+        directory, filename = posixpath.split(name)
+        digest = content_hash(content)
+        extension = posixpath.splitext(filename)[1].lower()
+        if filename.lower() == f'{digest}{extension}' and posixpath.basename(directory) == digest[:2]:
+            # повторное сохранение уже хранимого файла — каталог <xx> не вкладывается второй раз
+            directory = posixpath.dirname(directory)
+        return posixpath.join(directory, digest[:2], f'{digest}{extension}')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        # Имени из 64 hex-символов не верим: его мог прислать клиент, и под
+        # «вечным» URL оказалось бы содержимое с другим хэшем.
+        if name.startswith(f'{DERIVATIVES_DIR}/'):
+            return super().save(name, content, max_length=max_length)
+        hashed = self.hashed_name(name, content)
+        if self.exists(hashed):
+            return hashed
+        saved = self._save(hashed, content)
+        if saved != hashed:
+            # Тот же файл успел записать параллельный запрос — копия не нужна.
+            self.delete(saved)
+        return hashed
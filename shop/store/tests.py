@@ -1,3 +1,1002 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import decimal
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.core.management import call_command
+from django.core.handlers.asgi import ASGIHandler
+from django.db import DatabaseError
+from django.http import QueryDict
+from django.http import Http404, HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import AccessToken
+
+from shop import settings
+from .management.commands.bench_api import ADMIN_QUERY_BUDGETS
+from .middleware import ReplicaPinningMiddleware
+from .models import Cart, Category, FavoriteProduct, Gallery, Order, OrderProduct, Product, Rating, Review, Shipping
+from . import (authentication, compression, counters, exports, fast_serializers, favorites, images, imports,
+               instrumentation, media, metrics, mixins, pricing, renderers, response_cache, seeding, shared_cache, storage)
+
+
+class OrderDateFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='password')
+        shipping = Shipping.objects.create(user=cls.user, first_name='Иван', last_name='Иванов',
+                                           email='buyer@example.com', address='Ташкент')
+        cls.orders = {}
+        for name, moment in (('before', datetime.datetime(2026, 1, 30, 12, 0)),
+                             ('late', datetime.datetime(2026, 1, 31, 23, 30)),
+                             ('after', datetime.datetime(2026, 2, 1, 0, 0, 1))):
+            order = Order.objects.create(user=cls.user, shipping=shipping, order_total_price=100,
+                                         order_product_total_quantity=1, session_id=name)
+            # auto_now_add не даёт задать время при создании
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(moment))
+            cls.orders[name] = order.pk
+
+    def test_date_to_includes_whole_day(self):
+        self.assertEqual(mixins.parse_date_param('2026-01-31', end_of_day=True),
+                         timezone.make_aware(datetime.datetime.combine(datetime.date(2026, 1, 31), datetime.time.max)))
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/my_orders/', {'date_to': '2026-01-31'})
+        self.assertEqual(response.status_code, 200)
+        ids = {order['id'] for order in response.json()['results']}
+        self.assertEqual(ids, {str(self.orders['before']), str(self.orders['late'])})
+
+    def test_date_from_and_datetime_values(self):
+        self.assertEqual(mixins.parse_date_param('2026-01-31'),
+                         timezone.make_aware(datetime.datetime(2026, 1, 31)))
+        self.assertEqual(mixins.parse_date_param('2026-01-31T10:15:00', end_of_day=True),
+                         timezone.make_aware(datetime.datetime(2026, 1, 31, 10, 15)))
+        orders = mixins.filter_orders(Order.objects.all(), QueryDict('date_from=2026-01-31'))
+        self.assertEqual(set(orders.values_list('pk', flat=True)), {self.orders['late'], self.orders['after']})
+
+
+class PaymentWebhookTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('buyer', password='password')
+        shipping = Shipping.objects.create(user=user, first_name='Иван', last_name='Иванов',
+                                           email='buyer@example.com', address='Ташкент')
+        cls.order = Order.objects.create(user=user, shipping=shipping, order_total_price=100,
+                                         order_product_total_quantity=1, session_id='cs_test_1')
+
+    def post(self, secret=None):
+        body = json.dumps({'id': 'evt_1', 'object': 'event', 'type': 'checkout.session.completed',
+                           'data': {'object': {'id': self.order.session_id}}})
+        headers = {}
+        if secret is not None:
+            timestamp = int(time.time())
+            signature = hmac.new(secret.encode(), f'{timestamp}.{body}'.encode(), hashlib.sha256).hexdigest()
+            headers['HTTP_STRIPE_SIGNATURE'] = f't={timestamp},v1={signature}'
+        response = self.client.post('/api/payment/webhook/', body, content_type='application/json', **headers)
+        self.order.refresh_from_db()
+        return response
+
+    def test_rejects_events_without_secret(self):
+        with mock.patch.object(settings, 'STRIPE_WEBHOOK_SECRET', ''):
+            self.assertEqual(self.post(secret='').status_code, 503)
+        self.assertEqual(self.order.status, mixins.ORDER_STATUS_PENDING)
+
+    @mock.patch.object(settings, 'STRIPE_WEBHOOK_SECRET', 'whsec_test')
+    def test_requires_valid_signature(self):
+        self.assertEqual(self.post().status_code, 400)
+        self.assertEqual(self.post(secret='').status_code, 400)
+        self.assertEqual(self.post(secret='whsec_other').status_code, 400)
+        self.assertEqual(self.order.status, mixins.ORDER_STATUS_PENDING)
+        self.assertEqual(self.post(secret='whsec_test').status_code, 200)
+        self.assertEqual(self.order.status, mixins.ORDER_STATUS_PAID)
+
+
+class OrderExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer')
+        shipping = Shipping.objects.create(user=cls.user, first_name='=HYPERLINK("http://evil")', last_name='-1+2',
+                                           email='buyer@example.com', address='@Ташкент')
+        category = Category.objects.create(title='Одежда', slug='clothes')
+        product = Product.objects.create(title='+Футболка', slug='shirt', size='M', price=100, category=category)
+        cls.orders = {}
+        for name, moment in (('january', datetime.datetime(2026, 1, 31, 23, 30)),
+                             ('february', datetime.datetime(2026, 2, 1, 10, 0))):
+            order = Order.objects.create(user=cls.user, shipping=shipping, order_total_price=100,
+                                         order_product_total_quantity=1, session_id=name)
+            Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(moment))
+            OrderProduct.objects.create(order=order, product=product, quantity=1, price=100)
+            cls.orders[name] = str(order.pk)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('staff', is_staff=True))
+
+    def export(self, **params):
+        response = self.client.get('/api/export/orders/', params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_escapes_formulas(self):
+        rows = list(csv.DictReader(io.StringIO(self.export(file_format='csv'))))
+        self.assertEqual([row['order_id'] for row in rows], [self.orders['january'], self.orders['february']])
+        self.assertEqual([rows[0][name] for name in ('first_name', 'last_name', 'address', 'product_title')],
+                         ['\'=HYPERLINK("http://evil")', "'-1+2", "'@Ташкент", "'+Футболка"])
+        self.assertEqual((rows[0]['price'], rows[0]['email']), ('100', 'buyer@example.com'))
+
+    def test_ndjson_keeps_values(self):
+        rows = [json.loads(line) for line in self.export(file_format='ndjson').splitlines()]
+        self.assertEqual([row['order_id'] for row in rows], [self.orders['january'], self.orders['february']])
+        self.assertEqual((rows[0]['first_name'], rows[0]['price']), ('=HYPERLINK("http://evil")', 100))
+
+    def test_date_filters(self):
+        def exported(**params):
+            return [row['order_id'] for row in csv.DictReader(io.StringIO(self.export(**params)))]
+
+        self.assertEqual(exported(date_to='2026-01-31'), [self.orders['january']])
+        self.assertEqual(exported(date_from='2026-02-01'), [self.orders['february']])
+        self.assertEqual(exported(date_from='2026-01-31T23:00:00', date_to='2026-02-01T09:00:00'),
+                         [self.orders['january']])
+
+    def test_rejects_unknown_format_and_non_staff(self):
+        self.assertEqual(self.client.get('/api/export/orders/', {'file_format': 'xlsx'}).status_code, 400)
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/export/orders/').status_code, 403)
+
+
+@mock.patch.object(counters, 'incr')
+class FavoritesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer')
+        category = Category.objects.create(title='Одежда', slug='clothes')
+        cls.shirt, cls.hat = (Product.objects.create(title=title, slug=slug, size='M', price=100, category=category)
+                              for title, slug in (('Футболка', 'shirt'), ('Кепка', 'hat')))
+
+    def setUp(self):
+        self.cache = LocMemCache(self.id(), {})
+        patcher = mock.patch.object(shared_cache, 'get_cache', return_value=self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def check(self, products):
+        return self.client.post('/api/favorite/check/', {'products': products}, format='json')
+
+    def cached(self):
+        return self.cache.get(f'favorites:{self.user.pk}')
+
+    def test_check(self, incr):
+        FavoriteProduct.objects.create(user=self.user, product=self.shirt)
+        response = self.check([self.shirt.pk, self.hat.pk])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'favorites': {str(self.shirt.pk): True, str(self.hat.pk): False}})
+        with self.assertNumQueries(0):
+            self.check([self.shirt.pk])
+
+    def test_check_limits(self, incr):
+        self.assertEqual(self.check([]).status_code, 400)
+        self.assertEqual(self.check([1] * favorites.FAVORITES_CHECK_MAX_PRODUCTS).status_code, 200)
+        self.assertEqual(self.check([1] * (favorites.FAVORITES_CHECK_MAX_PRODUCTS + 1)).status_code, 400)
+        self.assertEqual(APIClient().post('/api/favorite/check/', {'products': [1]}, format='json').status_code, 401)
+
+    def test_add_and_delete_refresh_cache_after_commit(self, incr):
+        self.check([self.shirt.pk])
+        self.assertEqual(self.cached(), {})
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/favorite/add/', {'product': self.shirt.pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.cached(), {})
+        for callback in callbacks:
+            callback()
+        favorite = FavoriteProduct.objects.get(user=self.user)
+        self.assertEqual(self.cached(), {self.shirt.pk: favorite.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/favorite/delete/{favorite.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.cached(), {})
+        self.assertEqual(self.check([self.shirt.pk]).json(), {'favorites': {str(self.shirt.pk): False}})
+
+
+@mock.patch.object(counters.CounterBuffer, '_start')
+class CounterBufferTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Одежда', slug='clothes')
+        cls.products = Product.objects.bulk_create(
+            Product(title=f'Футболка {index}', slug=f'shirt-{index}', size='M', price=100, category=cls.category)
+            for index in range(3))
+
+    def test_flush_is_one_update(self, start):
+        buffer = counters.CounterBuffer(max_pending=100)
+        first, second, third = (product.pk for product in self.products)
+        buffer.incr(first, counters.VIEWS, 3)
+        buffer.incr(first, counters.FAVORITES)
+        buffer.incr(second, counters.CART_ADDS, 2)
+        buffer.incr(third, counters.VIEWS)
+        with self.assertNumQueries(1):
+            self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(
+            list(Product.objects.order_by('id').values_list('views_count', 'favorites_count', 'cart_adds_count',
+                                                            'popularity')),
+            [(3, 1, 0, 8), (0, 0, 2, 20), (1, 0, 0, 1)])
+        self.assertEqual((buffer.increments, buffer.statements), (7, 1))
+
+    @mock.patch.object(counters, 'FLUSH_BATCH_SIZE', 2)
+    def test_flush_in_batches(self, start):
+        buffer = counters.CounterBuffer(max_pending=100)
+        for product in self.products:
+            buffer.incr(product.pk, counters.VIEWS)
+        with self.assertNumQueries(2):
+            self.assertEqual(buffer.flush(), 2)
+
+    def test_failed_flush_keeps_bounded_pending(self, start):
+        buffer = counters.CounterBuffer(max_pending=2)
+        buffer._pending.update({(product_id, counters.VIEWS): 1 for product_id in range(1, 11)})
+        with mock.patch('django.db.models.query.QuerySet.update', side_effect=DatabaseError), \
+                self.assertLogs('store.counters', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(len(buffer._pending), 4)
+
+    def test_limit_flushes_outside_event_loop(self, start):
+        buffer = counters.CounterBuffer(max_pending=2)
+        buffer.incr(self.products[0].pk, counters.VIEWS)
+        buffer.incr(self.products[1].pk, counters.VIEWS)
+        self.assertEqual(buffer._pending, {})
+        self.assertEqual(Product.objects.filter(views_count=1).count(), 2)
+
+    async def test_limit_in_event_loop_wakes_thread(self, start):
+        buffer = counters.CounterBuffer(max_pending=1)
+        with mock.patch.object(buffer, 'flush') as flush:
+            buffer.incr(1, counters.VIEWS)
+        flush.assert_not_called()
+        self.assertTrue(buffer._wake.is_set())
+
+    @mock.patch.object(settings, 'RESPONSE_CACHE_ENABLED', False)
+    def test_popular_ordering(self, start):
+        for product, popularity in zip(self.products, (5, 20, 5)):
+            Product.objects.filter(pk=product.pk).update(popularity=popularity)
+        response = self.client.get(f'/api/category/{self.category.pk}/?ordering=popular')
+        self.assertEqual([product['id'] for product in response.json()['results']],
+                         [self.products[1].pk, self.products[0].pk, self.products[2].pk])
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media_root = override_settings(MEDIA_ROOT=directory.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        images._ready.clear()
+        self.addCleanup(images._ready.clear)
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(buffer, 'PNG')
+        self.name = default_storage.save('product/photo.png', ContentFile(buffer.getvalue()))
+        self.total = len(images.IMAGE_PRESETS) * len(images.FORMATS)
+
+    def test_srcset_falls_back_to_original(self):
+        original = default_storage.url(self.name)
+        self.assertEqual(images.srcset_for_name(self.name),
+                         {preset: {'webp': original, 'jpg': original} for preset in images.IMAGE_PRESETS})
+        self.assertEqual(images.generate(self.name), self.total)
+        srcset = images.srcset_for_name(self.name)
+        self.assertEqual(srcset['thumb']['webp'],
+                         default_storage.url(images.derivative_name(self.name, 'thumb', 'webp')))
+        self.assertIsNone(images.srcset_for_name(''))
+
+    def test_generate_skips_existing_targets(self):
+        images.generate(self.name)
+        with mock.patch('PIL.Image.open') as image_open:
+            self.assertEqual(images.generate(self.name), 0)
+        image_open.assert_not_called()
+        default_storage.delete(images.derivative_name(self.name, 'card', 'webp'))
+        self.assertEqual(images.generate(self.name), 1)
+        self.assertEqual(images.generate(self.name, overwrite=True), self.total)
+
+    def test_regenerate_images(self):
+        category = Category.objects.create(title='Одежда', slug='clothes')
+        product = Product.objects.create(title='Футболка', slug='shirt', size='M', price=100, category=category)
+        Gallery.objects.create(product=product, image=self.name)
+
+        def regenerate(*args):
+            stdout = io.StringIO()
+            call_command('regenerate_images', *args, stdout=stdout)
+            return stdout.getvalue()
+
+        self.assertIn(f'создано превью: {self.total}, ошибок: 0', regenerate())
+        self.assertIn('создано превью: 0, ошибок: 0', regenerate())
+        self.assertIn(f'создано превью: {self.total}, ошибок: 0', regenerate('--overwrite'))
+        self.assertTrue(all(default_storage.exists(images.derivative_name(self.name, preset, extension))
+                            for preset in images.IMAGE_PRESETS for extension in images.FORMATS))
+
+
+class ContentAddressedMediaTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = storage.ContentAddressedStorage(location=directory.name)
+        patcher = mock.patch.object(settings, 'MEDIA_ROOT', directory.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_uploads_are_deduplicated_by_content(self):
+        digest = hashlib.sha256(b'image').hexdigest()
+        name = self.storage.save('product/photo.PNG', ContentFile(b'image'))
+        self.assertEqual(name, f'product/{digest[:2]}/{digest}.png')
+        self.assertEqual(self.storage.save('product/copy.png', ContentFile(b'image')), name)
+        self.assertEqual(self.storage.save(name, ContentFile(b'image')), name)
+        self.assertEqual(self.storage.listdir(f'product/{digest[:2]}')[1], [f'{digest}.png'])
+
+    def test_client_hash_names_are_not_trusted(self):
+        forged = 'product/' + hashlib.sha256(b'other').hexdigest() + '.png'
+        digest = hashlib.sha256(b'image').hexdigest()
+        self.assertEqual(self.storage.save(forged, ContentFile(b'image')), f'product/{digest[:2]}/{digest}.png')
+        self.assertFalse(self.storage.exists(forged))
+        derivative = f'{images.DERIVATIVES_DIR}/{digest}/w320.webp'
+        self.assertEqual(self.storage.save(derivative, ContentFile(b'preview')), derivative)
+
+    def serve(self, name, **headers):
+        return media.serve(RequestFactory().get('/media/' + name, **headers), name)
+
+    def test_cache_control(self):
+        immutable = self.storage.save('product/photo.png', ContentFile(b'image'))
+        digest = hashlib.sha256(b'image').hexdigest()
+        derivative = self.storage.save(f'{images.DERIVATIVES_DIR}/{digest}/w320.webp', ContentFile(b'p'))
+        self.storage._save('category/legacy.png', ContentFile(b'legacy'))
+        self.assertEqual(self.serve(immutable)['Cache-Control'], media.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.serve(derivative)['Cache-Control'], media.MUTABLE_CACHE_CONTROL)
+        self.assertEqual(self.serve('category/legacy.png')['Cache-Control'], media.MUTABLE_CACHE_CONTROL)
+        with self.assertRaises(Http404):
+            self.serve('../secret.png')
+
+    def test_ranges_and_conditional_requests(self):
+        name = self.storage.save('product/data.bin', ContentFile(b'0123456789'))
+        response = self.serve(name, HTTP_RANGE='bytes=2-4')
+        self.assertEqual((response.status_code, response['Content-Range']), (206, 'bytes 2-4/10'))
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        self.assertEqual(b''.join(self.serve(name, HTTP_RANGE='bytes=-3').streaming_content), b'789')
+        self.assertEqual(b''.join(self.serve(name, HTTP_RANGE='bytes=8-20').streaming_content), b'89')
+        response = self.serve(name, HTTP_RANGE='bytes=10-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */10'))
+        etag = self.serve(name)['ETag']
+        self.assertEqual(self.serve(name, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        response = self.serve(name, HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(self.serve(name, HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE=etag).status_code, 206)
+
+
+@mock.patch.object(images, 'schedule')
+class GalleryUploadTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Одежда', slug='clothes')
+        cls.product = Product.objects.create(title='Футболка', slug='shirt', size='M', price=100, category=category)
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media_root = override_settings(MEDIA_ROOT=directory.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+
+    def image(self, name, size=(200, 200), image_format='PNG', truncate=False):
+        buffer = io.BytesIO()
+        Image.frombytes('RGB', size, bytes(range(256)) * (size[0] * size[1] * 3 // 256 + 1)).save(buffer, image_format)
+        content = buffer.getvalue()
+        return SimpleUploadedFile(name, content[:len(content) // 2] if truncate else content)
+
+    def upload(self, *files):
+        return self.client.post(f'/api/products/{self.product.pk}/gallery/', {'images': list(files)},
+                                format='multipart')
+
+    def test_upload_validates_each_file(self, schedule):
+        response = self.upload(self.image('a.png'), self.image('b.jpg', image_format='JPEG'),
+                               self.image('small.png', size=(100, 100)), self.image('cut.png', truncate=True),
+                               self.image('cut.jpg', image_format='JPEG', truncate=True),
+                               SimpleUploadedFile('notes.png', b'not an image'))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['created']), 2)
+        self.assertEqual(response.json()['errors'], {
+            'small.png': 'Изображение меньше 200x200', 'cut.png': 'Файл не является изображением',
+            'cut.jpg': 'Файл не является изображением', 'notes.png': 'Файл не является изображением'})
+        self.assertEqual(self.product.images.count(), 2)
+        self.assertEqual(schedule.call_count, 2)
+
+    def test_all_files_rejected(self, schedule):
+        response = self.upload(SimpleUploadedFile('notes.png', b'not an image'))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.product.images.exists())
+
+    @mock.patch.object(settings, 'GALLERY_UPLOAD_MAX_BYTES', 1000)
+    def test_large_files_are_skipped(self, schedule):
+        response = self.upload(self.image('big.png', size=(400, 400)))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], {'big.png': 'Файл слишком большой'})
+
+    @mock.patch.object(settings, 'GALLERY_UPLOAD_MAX_FILES', 2)
+    def test_too_many_files_stop_the_upload(self, schedule):
+        original = TemporaryFileUploadHandler.new_file
+        with mock.patch.object(TemporaryFileUploadHandler, 'new_file', autospec=True, side_effect=original) as new_file:
+            response = self.upload(*(self.image(f'{index}.png') for index in range(4)))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(new_file.call_count, 2)
+        self.assertFalse(self.product.images.exists())
+
+    def test_requires_staff(self, schedule):
+        self.client.force_authenticate(User.objects.create_user('buyer'))
+        self.assertEqual(self.upload(self.image('a.png')).status_code, 403)
+
+
+class CachedAuthenticationTests(TestCase):
+    def setUp(self):
+        cache = LocMemCache(self.id(), {})
+        patcher = mock.patch.object(authentication, '_cache', return_value=cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user('buyer', password='password')
+        self.token = Token.objects.create(user=self.user)
+
+    def authenticate(self, header, method='get'):
+        request = getattr(RequestFactory(), method)('/', HTTP_AUTHORIZATION=header)
+        return authentication.CachedAuthentication().authenticate(request)
+
+    def assert_cached(self, header, cached=True):
+        with self.assertNumQueries(0 if cached else 1):
+            user, _ = self.authenticate(header)
+        self.assertEqual(user, self.user)
+
+    def test_token_user_is_cached(self):
+        header = f'Token {self.token.key}'
+        self.assert_cached(header, cached=False)
+        self.assert_cached(header)
+        user, auth = self.authenticate(header)
+        self.assertIsInstance(auth, Token)
+        self.assertEqual((auth.key, auth.user), (self.token.key, self.user))
+
+    def test_jwt_user_is_cached(self):
+        header = f'JWT {AccessToken.for_user(self.user)}'
+        self.assert_cached(header, cached=False)
+        self.assert_cached(header)
+
+    def test_login_keeps_cache(self):
+        header = f'Token {self.token.key}'
+        self.authenticate(header)
+        self.client.login(username='buyer', password='password')
+        self.assert_cached(header)
+
+    def test_password_change_and_logout_invalidate(self):
+        headers = (f'Token {self.token.key}', f'JWT {AccessToken.for_user(self.user)}')
+        changes = {'password': lambda: (self.user.set_password('changed'), self.user.save()),
+                   'logout': lambda: user_logged_out.send(User, request=None, user=self.user)}
+        for name, change in changes.items():
+            for header in headers:
+                with self.subTest(change=name, header=header.split()[0]):
+                    self.authenticate(header)
+                    change()
+                    self.assert_cached(header, cached=False)
+
+    def test_deactivation_invalidates(self):
+        self.authenticate(f'Token {self.token.key}')
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(f'Token {self.token.key}')
+
+    def test_token_deletion_invalidates(self):
+        self.authenticate(f'Token {self.token.key}')
+        self.token.delete()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(f'Token {self.token.key}')
+
+    def test_claims_only_view_skips_user_table_on_safe_methods(self):
+        class ClaimsView(APIView):
+            claims_only_user = True
+
+            def get(self, request):
+                return Response(type(request.user).__name__)
+
+            post = get
+
+        header = f'JWT {AccessToken.for_user(self.user)}'
+        with self.assertNumQueries(0):
+            response = ClaimsView.as_view()(RequestFactory().get('/', HTTP_AUTHORIZATION=header))
+        self.assertEqual(response.data, 'TokenUser')
+        response = ClaimsView.as_view()(RequestFactory().post('/', HTTP_AUTHORIZATION=header))
+        self.assertEqual(response.data, 'User')
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Одежда', slug='clothes')
+        cls.product = Product.objects.create(title='Футболка', slug='shirt', size='M', category=cls.category, price=100)
+
+    def srcset_outside_event_loop(self, name, *args, **kwargs):
+        with self.assertRaises(RuntimeError):
+            asyncio.get_running_loop()
+        return {}
+
+    @mock.patch.object(counters, 'incr')
+    async def test_endpoints(self, incr):
+        client = AsyncClient()
+        with mock.patch.object(images, 'srcset_for_name', side_effect=self.srcset_outside_event_loop) as srcset:
+            tree = await client.get('/api/async/category/')
+            products = await client.get(f'/api/async/category/{self.category.pk}/')
+        self.assertTrue(srcset.called)
+        self.assertEqual([node['slug'] for node in tree.json()], ['clothes'])
+        self.assertEqual([card['slug'] for card in products.json()['results']], ['shirt'])
+        detail = await client.get(f'/api/async/products/{self.product.pk}/')
+        self.assertEqual(detail.json()['title'], 'Футболка')
+        incr.assert_called_once_with(self.product.pk, counters.VIEWS)
+        search = await client.get('/api/async/search/', {'q': 'Футб'})
+        self.assertEqual(search.json()['count'], 1)
+        self.assertEqual((await client.get('/api/async/search/')).status_code, 400)
+        self.assertEqual((await client.post('/api/async/category/')).status_code, 405)
+        self.assertEqual((await client.get('/api/async/products/0/')).status_code, 404)
+
+
+@mock.patch.object(settings, 'READ_REPLICAS', ['replica'])
+class ReplicaRoutingTests(TestCase):
+    def request(self, method, view, cookies=None):
+        """Прогоняет view через ReplicaPinningMiddleware, возвращает ответ и базы, куда шли чтения."""
+        reads = []
+
+        def get_response(request):
+            reads.append(Category.objects.all().db)
+            view()
+            reads.append(Category.objects.all().db)
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)('/api/categories/')
+        request.COOKIES.update(cookies or {})
+        return ReplicaPinningMiddleware(get_response)(request), reads
+
+    def test_reads_outside_request_use_primary(self):
+        self.assertEqual(Category.objects.all().db, 'default')
+
+    def test_write_pins_only_current_request(self):
+        response, reads = self.request('get', lambda: Category.objects.create(title='Книги', slug='books'))
+        self.assertEqual(reads, ['replica', 'default'])
+        # запись внутри запроса не закрепляет за основной базой ни код вне запроса, ни следующий запрос
+        self.assertEqual(Category.objects.all().db, 'default')
+        response, reads = self.request('get', lambda: None)
+        self.assertEqual(reads, ['replica', 'replica'])
+        Category.objects.create(title='Игры', slug='games')
+        response, reads = self.request('get', lambda: None)
+        self.assertEqual(reads, ['replica', 'replica'])
+
+    def test_sticky_cookie_after_write(self):
+        response, reads = self.request('post', lambda: None)
+        self.assertEqual(reads, ['default', 'default'])
+        cookie = response.cookies[settings.REPLICA_STICKY_COOKIE]
+        response, reads = self.request('get', lambda: None, {cookie.key: cookie.value})
+        self.assertEqual(reads, ['default', 'default'])
+        response, reads = self.request('get', lambda: None, {cookie.key: 'подделка'})
+        self.assertEqual(reads, ['replica', 'replica'])
+
+    async def test_async_requests(self):
+        reads = []
+
+        async def get_response(request):
+            reads.append(Category.objects.all().db)
+            return HttpResponse()
+
+        middleware = ReplicaPinningMiddleware(get_response)
+        self.assertTrue(iscoroutinefunction(middleware))
+        cookie = (await middleware(RequestFactory().post('/api/cart/add/'))).cookies[settings.REPLICA_STICKY_COOKIE]
+        request = RequestFactory().get('/api/category/')
+        request.COOKIES[cookie.key] = cookie.value
+        await middleware(request)
+        await middleware(RequestFactory().get('/api/category/'))
+        self.assertEqual(reads, ['default', 'default', 'replica'])
+
+
+@mock.patch.object(settings, 'DEBUG', True)
+@mock.patch.object(settings, 'QUERY_INSTRUMENTATION_SAMPLE_RATE', 1)
+class QueryInstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Category.objects.create(title='Одежда', slug='clothes')
+
+    def setUp(self):
+        instrumentation.route_stats.reset()
+
+    def test_sync_request(self):
+        response = self.client.get('/api/category/')
+        self.assertEqual(response['X-DB-Queries'], '1')
+        self.assertIn('X-Non-DB-Time-Ms', response)
+        self.assertEqual([row['route'] for row in instrumentation.route_stats.report()], ['/api/category/'])
+
+    async def test_async_request(self):
+        response = await AsyncClient().get('/api/async/category/')
+        self.assertEqual(response['X-DB-Queries'], '1')
+
+
+class MetricsTests(TestCase):
+    def registry(self, directory=None):
+        registry = metrics.Registry(directory=directory, flush_interval=3600)
+        registry.describe('jobs_total', 'counter', 'Задачи')
+        registry.describe('job_seconds', 'histogram', 'Время задачи', (0.1, 1))
+        return registry
+
+    def test_render(self):
+        registry = self.registry()
+        registry.inc('jobs_total', (('queue', 'a"b'),), 2)
+        registry.inc('jobs_total', (('queue', 'a"b'),))
+        registry.observe('job_seconds', 0.05)
+        registry.observe('job_seconds', 0.5)
+        registry.observe('job_seconds', 5)
+        self.assertEqual(registry.render(), '\n'.join([
+            '# HELP job_seconds Время задачи',
+            '# TYPE job_seconds histogram',
+            'job_seconds_bucket{le="0.1"} 1',
+            'job_seconds_bucket{le="1"} 2',
+            'job_seconds_bucket{le="+Inf"} 3',
+            'job_seconds_sum 5.55',
+            'job_seconds_count 3',
+            '# HELP jobs_total Задачи',
+            '# TYPE jobs_total counter',
+            'jobs_total{queue="a\\"b"} 3',
+        ]) + '\n')
+
+    def test_merges_worker_snapshots(self):
+        with tempfile.TemporaryDirectory() as directory:
+            worker, other = self.registry(directory), self.registry(directory)
+            worker.inc('jobs_total', (('queue', 'a'),))
+            worker.observe('job_seconds', 0.5)
+            other.inc('jobs_total', (('queue', 'a'),), 4)
+            other.observe('job_seconds', 2)
+            other.write_snapshot()
+            counters, histograms = worker.collect()
+        self.assertEqual(counters[('jobs_total', (('queue', 'a'),))], 5)
+        self.assertEqual(histograms[('job_seconds', ())], [0, 1, 1, 2.5])
+
+    @mock.patch.object(settings, 'METRICS_TOKEN', 'secret')
+    def test_export_requires_staff_or_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+        self.client.force_login(User.objects.create_user('buyer'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+
+    async def test_middleware_counts_async_requests(self):
+        labels = (('method', 'GET'), ('route', '/api/async/category/'), ('status', '2xx'))
+        before = metrics.registry.collect()[0][('http_requests_total', labels)]
+        await AsyncClient().get('/api/async/category/')
+        self.assertEqual(metrics.registry.collect()[0][('http_requests_total', labels)], before + 1)
+
+
+class CatalogImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(title='Одежда', slug='clothes')
+        Product.objects.create(title='Футболка', slug='shirt', size='M', category=category, price=500, quantity=7,
+                               description='Хлопок', color='Белый')
+
+    def run_import(self, content, file_format='csv'):
+        report = imports.import_catalog(io.BytesIO(content.encode()), file_format)
+        self.assertEqual(report['errors'], [])
+        return report
+
+    def test_missing_columns_keep_existing_values(self):
+        self.run_import('type,slug,title,category,size\nproduct,shirt,Футболка поло,clothes,L\n'
+                        'product,socks,Носки,clothes,S\n')
+        shirt = Product.objects.get(slug='shirt')
+        self.assertEqual((shirt.title, shirt.size, shirt.price, shirt.quantity, shirt.description, shirt.color),
+                         ('Футболка поло', 'L', 500, 7, 'Хлопок', 'Белый'))
+        socks = Product.objects.get(slug='socks')
+        self.assertEqual((socks.price, socks.quantity, socks.color), (0, 0, 'Серебро'))
+
+    def test_rows_update_only_their_fields(self):
+        report = self.run_import(
+            '{"slug": "shirt", "title": "Футболка", "category": "clothes", "size": "M", "price": 450}\n'
+            '{"slug": "socks", "title": "Носки", "category": "clothes", "size": "S", "quantity": 3}\n', 'jsonl')
+        self.assertEqual((report['created']['product'], report['updated']['product']), (1, 1))
+        shirt = Product.objects.get(slug='shirt')
+        self.assertEqual((shirt.price, shirt.quantity, shirt.description), (450, 7, 'Хлопок'))
+        self.assertEqual(Product.objects.get(slug='socks').quantity, 3)
+
+    def test_csv_export_round_trip(self):
+        Product.objects.filter(slug='shirt').update(title='-50% Футболка', description='=1+1')
+        content = ''.join(exports.csv_stream(exports.catalog_rows(), exports.CATALOG_EXPORT_NAMES))
+        self.assertIn("'-50% Футболка", content)
+        Product.objects.filter(slug='shirt').update(title='Футболка', description='')
+        self.run_import(content)
+        self.assertEqual(Product.objects.filter(slug='shirt').values_list('title', 'description').get(),
+                         ('-50% Футболка', '=1+1'))
+
+
+class AdminChangelistQueryTests(TestCase):
+    """Число запросов списков в админке не зависит от объёма данных: бюджеты из
+    bench_api проверяются на маленьком каталоге и на каталоге больше страницы."""
+
+    def check_budgets(self, **sizes):
+        seeding.seed_catalog(depth=1, fanout=3, images_per_product=1, reply_share=0, batch_size=500, **sizes)
+        admin = User.objects.create_superuser('admin', password='password')
+        self.client.force_login(admin)
+        context = {'user': Cart.objects.values_list('user_id', flat=True).first(),
+                   'product': Rating.objects.values_list('product_id', flat=True).first()}
+        for route, budget in ADMIN_QUERY_BUDGETS.items():
+            with self.subTest(route=route), self.assertNumQueries(budget):
+                response = self.client.get('/' + route.format(**context))
+                self.assertEqual(response.status_code, 200)
+
+    def test_small_catalog(self):
+        self.check_budgets(products=5, reviews=5, ratings=10, users=3, cart_items=1, favorites=1, orders=3)
+
+    def test_catalog_larger_than_page(self):
+        self.check_budgets(products=150, reviews=300, ratings=300, users=40, cart_items=3, favorites=3, orders=120)
+
+
+class BulkInvalidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(title='Одежда', slug='clothes')
+        Product.objects.bulk_create(Product(title=f'Футболка {index}', slug=f'shirt-{index}', size='M', price=100,
+                                            category=cls.category) for index in range(3))
+
+    def test_one_invalidation_per_bulk_call(self):
+        with mock.patch.object(response_cache, '_bump') as bump, self.captureOnCommitCallbacks(execute=True):
+            result = pricing.apply_changes(Product.objects.all(), price_percent=10, stock_delta=5)
+        self.assertEqual(result['products'], 3)
+        bump.assert_called_once()
+        expected = {response_cache.product(pk) for pk in Product.objects.values_list('pk', flat=True)}
+        self.assertEqual(set(bump.call_args.args[0]), expected | {response_cache.category(self.category.pk)})
+        self.assertEqual(set(Product.objects.values_list('price', 'quantity')), {(110, 5)})
+
+    def test_import_invalidates_catalog_once(self):
+        content = 'type,slug,title,category,size,price\n' + ''.join(
+            f'product,shirt-{index},Футболка {index},clothes,M,120\n' for index in range(5))
+        with mock.patch.object(response_cache, '_bump') as bump, self.captureOnCommitCallbacks(execute=True):
+            imports.import_catalog(io.BytesIO(content.encode()), 'csv', batch_size=2)
+        bump.assert_called_once_with((response_cache.CATALOG,))
+
+
+class FastSerializerParityTests(TestCase):
+    """store.fast_serializers отдаёт те же байты, что и DRF-сериализаторы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seeding.seed_catalog(products=30, depth=2, fanout=2, images_per_product=2, reviews=60, reply_share=0.5,
+                             ratings=60, users=5, cart_items=1, favorites=5, orders=0, batch_size=500)
+
+    @mock.patch.object(settings, 'RESPONSE_CACHE_ENABLED', False)
+    def test_responses_match_drf(self):
+        category = Product.objects.values_list('category_id', flat=True).first()
+        product = Review.objects.values_list('product_id', flat=True).first()
+        user = FavoriteProduct.objects.values_list('user', flat=True).first()
+        for path in ('/api/category/', f'/api/category/{category}/?page_size=100', f'/api/products/{product}/'):
+            for authenticated in (False, True):
+                client = APIClient()
+                if authenticated:
+                    client.force_authenticate(User.objects.get(pk=user))
+                bodies = []
+                for fast in (False, True):
+                    with mock.patch.object(settings, 'FAST_SERIALIZERS', fast):
+                        response = client.get(path)
+                    self.assertEqual(response.status_code, 200)
+                    bodies.append(response.content)
+                with self.subTest(path=path, authenticated=authenticated):
+                    self.assertEqual(bodies[0], bodies[1])
+
+
+class FastJSONRendererTests(TestCase):
+    def test_matches_drf_renderer(self):
+        data = {'id': 1, 'title': 'Футболка\u2028', 'created_at': timezone.make_aware(datetime.datetime(2026, 1, 31)),
+                'tags': [None, True, {'price': 100}],
+                'floats': [1e-7, 1e-5, 1e-4, 0.5, 1 / 3, 1e15, 1e16, 1e21, -0.0, decimal.Decimal('0.00001')]}
+        self.assertEqual(renderers.FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(renderers.FastJSONRenderer().render(5), JSONRenderer().render(5))
+
+    def test_non_finite_floats_are_rejected(self):
+        for value in (float('nan'), float('inf'), decimal.Decimal('-Infinity')):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                renderers.FastJSONRenderer().render([{'rating': value}])
+
+
+@mock.patch.object(counters, 'incr')
+class SparseFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer')
+        cls.category = Category.objects.create(title='Одежда', slug='clothes')
+        cls.product = Product.objects.create(title='Футболка', slug='shirt', size='M', price=100,
+                                             category=cls.category)
+        shipping = Shipping.objects.create(user=cls.user, first_name='Иван', last_name='Иванов',
+                                           email='buyer@example.com', address='Ташкент')
+        cls.order = Order.objects.create(user=cls.user, shipping=shipping, order_total_price=100,
+                                         order_product_total_quantity=1, session_id='sparse')
+        OrderProduct.objects.create(order=cls.order, product=cls.product, quantity=1, price=100)
+
+    def keys(self, path, client=None, **params):
+        response = (client or self.client).get(path, params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        item = data['results'][0] if 'results' in data else data[0] if isinstance(data, list) else data
+        return set(item)
+
+    @mock.patch.object(settings, 'RESPONSE_CACHE_ENABLED', False)
+    def test_catalog_endpoints(self, incr):
+        for fast in (False, True):
+            with self.subTest(fast=fast), mock.patch.object(settings, 'FAST_SERIALIZERS', fast):
+                self.assertEqual(self.keys('/api/category/', fields='id,title'), {'id', 'title'})
+                self.assertEqual(self.keys(f'/api/category/{self.category.pk}/', exclude='get_first_image_srcset'),
+                                 set(fast_serializers.PRODUCT_CARD_FIELDS) - {'get_first_image_srcset', 'favorite'})
+                self.assertEqual(self.keys(f'/api/products/{self.product.pk}/', fields='id,price,reviews'),
+                                 {'id', 'price', 'reviews'})
+
+    def test_order_endpoints(self, incr):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(self.keys('/api/my_orders/', client, fields='id,status'), {'id', 'status'})
+        self.assertEqual(self.keys(f'/api/my_orders/{self.order.pk}/', client, fields='id,products'),
+                         {'id', 'products'})
+        self.assertNotIn('shipping', self.keys('/api/my_orders/', client, exclude='shipping'))
+
+    def test_unknown_fields_are_rejected(self, incr):
+        response = self.client.get('/api/category/', {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', response.json()['fields'])
+        self.assertEqual(self.client.get('/api/category/', {'exclude': ','.join(fast_serializers.CATEGORY_FIELDS)})
+                         .status_code, 400)
+
+    @mock.patch.object(settings, 'RESPONSE_CACHE_ENABLED', True)
+    def test_cache_key_varies_by_fields(self, incr):
+        path = f'/api/products/{self.product.pk}/'
+        with mock.patch.object(response_cache, '_cache', return_value=LocMemCache(self.id(), {})):
+            self.assertEqual(self.keys(path, fields='id'), {'id'})
+            self.assertEqual(self.keys(path, fields='id,title'), {'id', 'title'})
+            self.assertEqual(self.keys(path, fields='id'), {'id'})
+            self.assertEqual(self.keys(path, fields='title'), {'title'})
+
+
+class CompressionTests(TestCase):
+    def cache_total(self, result):
+        return metrics.registry.collect()[0][
+            ('http_compression_cache_total', (('encoding', 'gzip'), ('result', result)))]
+
+    def test_accepted_encoding(self):
+        self.assertEqual(compression.accepted_encoding('gzip, br'), 'br')
+        self.assertEqual(compression.accepted_encoding('br;q=0, gzip;q=0.5'), 'gzip')
+        self.assertEqual(compression.accepted_encoding('BR; q=0.0, *'), 'gzip')
+        self.assertEqual(compression.accepted_encoding('*;q=0'), None)
+        self.assertEqual(compression.accepted_encoding('gzip;q=abc'), None)
+        self.assertEqual(compression.accepted_encoding('identity'), None)
+        self.assertEqual(compression.accepted_encoding('br', ('gzip',)), None)
+
+    def test_compressed_body_is_cached(self):
+        content = b'{"name": "%d"}' % time.time_ns() * 50
+        misses, hits = self.cache_total('miss'), self.cache_total('hit')
+        body = compression.compressed_body(content, 'gzip', True)
+        self.assertEqual(compression.compressed_body(content, 'gzip', True), body)
+        self.assertEqual(gzip.decompress(body), content)
+        self.assertEqual((self.cache_total('miss'), self.cache_total('hit')), (misses + 1, hits + 1))
+        compression.compressed_body(content, 'gzip', False)
+        self.assertEqual((self.cache_total('miss'), self.cache_total('hit')), (misses + 1, hits + 1))
+
+    def test_html_is_only_gzipped_with_random_length(self):
+        request = RequestFactory().get('/admin/', HTTP_ACCEPT_ENCODING='br, gzip')
+        html = '<p>' + 'csrf' * 200 + '</p>'
+        lengths = set()
+        for _ in range(10):
+            response = compression.compress_response(request, HttpResponse(html))
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertEqual(gzip.decompress(response.content).decode(), html)
+            lengths.add(len(response.content))
+        self.assertGreater(len(lengths), 1)
+        request = RequestFactory().get('/admin/', HTTP_ACCEPT_ENCODING='br')
+        self.assertFalse(compression.compress_response(request, HttpResponse(html)).has_header('Content-Encoding'))
+        response = compression.compress_response(request, HttpResponse('[' + '1,' * 200 + '1]',
+                                                                       content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'br')
+
+    @override_settings(DEBUG=True)
+    def test_asgi_chain_is_not_adapted(self):
+        # Django пишет в django.request о каждом промежуточном слое, обёрнутом в sync_to_async
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            ASGIHandler()
+
+
+@mock.patch.object(images, 'schedule')
+class ResponseCacheInvalidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer')
+        cls.clothes = Category.objects.create(title='Одежда', slug='clothes')
+        cls.shoes = Category.objects.create(title='Обувь', slug='shoes')
+        cls.shirt = Product.objects.create(title='Футболка', slug='shirt', size='M', price=100, category=cls.clothes)
+        cls.boots = Product.objects.create(title='Ботинки', slug='boots', size='42', price=300, category=cls.shoes)
+
+    def invalidated(self, action):
+        with mock.patch.object(response_cache, '_bump') as bump, self.captureOnCommitCallbacks(execute=True):
+            action()
+        return set().union(*(call.args[0] for call in bump.call_args_list))
+
+    def test_saves_invalidate_affected_tags(self, schedule):
+        shirt, clothes = response_cache.product(self.shirt.pk), response_cache.category(self.clothes.pk)
+        self.assertEqual(self.invalidated(self.clothes.save),
+                         {response_cache.CATEGORIES, clothes, shirt})
+        self.assertEqual(self.invalidated(self.shirt.save), {shirt, clothes})
+        self.assertEqual(self.invalidated(lambda: Gallery.objects.create(product=self.shirt, image='product/a.png')),
+                         {shirt, clothes})
+        self.assertEqual(self.invalidated(lambda: Review.objects.create(product=self.shirt, user=self.user, text='Ок')),
+                         {shirt})
+        self.assertEqual(self.invalidated(lambda: Rating.objects.create(product=self.shirt, user=self.user, star='5')),
+                         {shirt})
+
+    def test_product_moved_to_another_category(self, schedule):
+        self.shirt.category = self.shoes
+        self.assertEqual(self.invalidated(self.shirt.save), {
+            response_cache.product(self.shirt.pk), response_cache.category(self.clothes.pk),
+            response_cache.category(self.shoes.pk)})
+
+    def test_deletes_invalidate_affected_tags(self, schedule):
+        shirt, clothes = response_cache.product(self.shirt.pk), response_cache.category(self.clothes.pk)
+        gallery = Gallery.objects.create(product=self.shirt, image='product/a.png')
+        review = Review.objects.create(product=self.shirt, user=self.user, text='Ок')
+        rating = Rating.objects.create(product=self.shirt, user=self.user, star='5')
+        self.assertEqual(self.invalidated(gallery.delete), {shirt, clothes})
+        self.assertEqual(self.invalidated(review.delete), {shirt})
+        self.assertEqual(self.invalidated(rating.delete), {shirt})
+        self.assertEqual(self.invalidated(self.shirt.delete), {shirt, clothes})
+        # удалённые объекты теряют pk, поэтому теги считаются заранее
+        expected = {response_cache.CATEGORIES, response_cache.category(self.shoes.pk),
+                    response_cache.product(self.boots.pk)}
+        self.assertEqual(self.invalidated(self.shoes.delete), expected)
+
+    @mock.patch.object(settings, 'RESPONSE_CACHE_ENABLED', True)
+    def test_hits_and_misses(self, schedule):
+        cache = LocMemCache(self.id(), {})
+        path = f'/api/products/{self.shirt.pk}/'
+
+        def results():
+            counters = metrics.registry.collect()[0]
+            return [counters[('response_cache_total', (('endpoint', 'product-detail'), ('result', result)))]
+                    for result in ('hit', 'miss')]
+
+        with mock.patch.object(response_cache, '_cache', return_value=cache), \
+                mock.patch.object(counters, 'incr'), self.captureOnCommitCallbacks(execute=True):
+            hits, misses = results()
+            self.client.get(path)
+            self.assertEqual(results(), [hits, misses + 1])
+            self.client.get(path)
+            self.assertEqual(results(), [hits + 1, misses + 1])
+            with self.captureOnCommitCallbacks(execute=True):
+                Review.objects.create(product=self.shirt, user=self.user, text='Ок')
+            response = self.client.get(path)
+            self.assertEqual(results(), [hits + 1, misses + 2])
+            self.assertEqual(len(response.json()['reviews']), 1)
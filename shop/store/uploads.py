@@ -0,0 +1,60 @@
+from django.core.files.uploadhandler import SkipFile, StopUpload, TemporaryFileUploadHandler
+
+from shop import settings
+
+
+class BoundedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет каждый файл кусками во временный файл на диске и пропускает файлы
+    больше GALLERY_UPLOAD_MAX_BYTES, не прерывая остальную загрузку. После
+    GALLERY_UPLOAD_MAX_FILES файлов разбор останавливается, и остаток тела
+    на диск не пишется."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.skipped = []
+        self.files = 0
+        self.too_many_files = False
+
+    def new_file(self, *args, **kwargs):
+        self.files += 1
+        if self.files > settings.GALLERY_UPLOAD_MAX_FILES:
+            self.too_many_files = True
+            raise StopUpload()
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.GALLERY_UPLOAD_MAX_BYTES:
+            self.file.close()
+            self.skipped.append(self.file_name)
+            raise SkipFile()
+        return super().receive_data_chunk(raw_data, start)
+
+
+def validate_image(upload):
+    from PIL import Image
+
+    try:
+        with Image.open(upload) as image:
+            error = _image_error(image.format, *image.size)
+            if error is None:
+                # у обрезанного файла заголовок цел — данные декодируются целиком,
+                # размер в пикселях к этому моменту уже ограничен
+                image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError):
+        return 'Файл не является изображением'
+    finally:
+        upload.seek(0)
+    return error
+
+
+def _image_error(image_format, width, height):
+    if image_format not in settings.GALLERY_IMAGE_FORMATS:
+        return f'Неподдерживаемый формат: {image_format}'
+    min_width, min_height = settings.GALLERY_IMAGE_MIN_SIZE
+    if width < min_width or height < min_height:
+        return f'Изображение меньше {min_width}x{min_height}'
+    if width * height > settings.GALLERY_IMAGE_MAX_PIXELS:
+        return 'Изображение слишком большое'
+    return None
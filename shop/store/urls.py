@@ -1,10 +1,12 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 
 urlpatterns = [
      path('category/', views.CategoryViewSet.as_view({'get': 'list'})),
      path('category/<int:pk>/', views.CategoryViewSet.as_view({'get': 'retrieve'})),
      path('products/<int:pk>/', views.ProductViewSet.as_view({'get': 'retrieve'})),
+     path('products/bulk/', views.CatalogBulkChangeView.as_view({'post': 'create'})),
+     path('products/<int:pk>/gallery/', views.ProductGalleryUploadView.as_view({'post': 'create'})),
      
      path('review/', views.ReviewCUDViewSet.as_view({'post': 'create'})),
      path('review/<int:pk>/update/', views.ReviewCUDViewSet.as_view({'patch': 'partial_update'})),
@@ -13,6 +15,7 @@ urlpatterns = [
      path('rating/', views.RatingViewSet.as_view({'post': 'create'})),
      
      path('favorite/add/', views.AddToFavoriteViewSet.as_view({'post': 'create'})),
+     path('favorite/check/', views.AddToFavoriteViewSet.as_view({'post': 'check'})),
      path('favorite/delete/<int:pk>/', views.DeleteProductFromFavoriteViewSet.as_view({'delete': 'destroy'})),
      path('my_favorite/', views.UserFavoriteProductsViewSet.as_view({'get': 'list'})),
      
@@ -23,6 +26,7 @@ urlpatterns = [
      
      path('checkout/', views.UserCartViewSet.as_view({'get': 'list'})),
      path('payment/', views.PaymentView.as_view({'post': 'create'})),
+     path('payment/webhook/', views.PaymentWebhookView.as_view({'post': 'create'})),
      
      
      path('customer/', views.CustomerViewSet.as_view({'post': 'create'})),
@@ -30,7 +34,18 @@ urlpatterns = [
      path('customer/<int:user>/', views.CustomerViewSet.as_view({'get': 'retrieve'})),
      
      path('my_orders/', views.UserOrderViewSet.as_view({'get': 'list'})),
-     path('my_orders/<uuid:pk>/', views.UserOrderViewSet.as_view({'get': 'retrieve'}))
+     path('my_orders/<uuid:pk>/', views.UserOrderViewSet.as_view({'get': 'retrieve'})),
+     
+     path('reports/sales/', views.SalesReportView.as_view({'get': 'list'})),
+     path('export/orders/', views.OrderExportView.as_view({'get': 'list'})),
+     path('export/catalog/', views.CatalogExportView.as_view({'get': 'list'})),
+     path('import/catalog/', views.CatalogImportView.as_view({'post': 'create'})),
+     path('debug/queries/', views.QueryInstrumentationView.as_view({'get': 'list', 'delete': 'destroy'})),
+     
+     path('async/category/', async_views.category_tree),
+     path('async/category/<int:pk>/', async_views.category_products),
+     path('async/products/<int:pk>/', async_views.product_detail),
+     path('async/search/', async_views.search),
      
      
 ]
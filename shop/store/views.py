@@ -2,17 +2,21 @@ from rest_framework import viewsets, permissions
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.core.files.storage import default_storage
 from shop import settings
-import stripe
 
 from .serializers import (CategorySerializer, CategoryDetailSerializer, ProductDetailSerializer,
                           ReviewCUDSerializer, UserFavoriteProductSerializer, AddProductToUserFavorites,
                           AddProductToUserCartSerializer, ShippingSerializer, UserOrderSerializer,
                           UserCartSerializer, RatingSerializer, CustomerSerializer, PaymentSerializer, 
-                          ProductsForCategories)
+                          ProductsForCategories, SalesReportQuerySerializer, FavoriteCheckSerializer,
+                          GallerySerializer, CatalogBulkChangeSerializer)
 from .models import (Category, Product, FavoriteProduct,
-                    Cart, Shipping, Order, Review, Customer)
-from . import mixins
+                    Cart, Shipping, Order, Review, Customer, Gallery)
+from . import (mixins, rollups, exports, imports, favorites, counters, uploads, images, instrumentation,
+               pricing, fast_serializers, response_cache)
 
 
 
@@ -30,8 +34,51 @@ class CategoryProductsPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class SparseFieldsViewMixin:
+    """?fields=a,b / ?exclude=a,b: сериализатор получает выбранные поля в context['fields'],
+    а get_sparse_field_names задаёт, какие поля вообще можно выбирать."""
+
+    def get_sparse_field_names(self):
+        return tuple(self.get_serializer_class()().fields)
+
+    def get_sparse_fields(self):
+        if self.request is None:
+            return None
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = mixins.sparse_fields(self.request.query_params, self.get_sparse_field_names())
+        return self._sparse_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_sparse_fields()
+        return context
+
+
+class ResponseCacheMixin:
+    """Данные ответов на анонимные GET берутся из store.response_cache; теги,
+    от которых зависит ответ, передаёт вызывающий метод."""
+
+    def cached_response(self, endpoint, tags, compute):
+        request = self.request
+        if not response_cache.is_cacheable(request):
+            return compute()
+        key = response_cache.entry_key(endpoint, request.build_absolute_uri())
+        data, versions = response_cache.get(endpoint, key, (response_cache.CATALOG, *tags))
+        if data is not None:
+            return Response(data)
+        response = compute()
+        response_cache.save(key, versions, response.data)
+        return response
+
+
+class CategoryViewSet(ResponseCacheMixin, SparseFieldsViewMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
+    claims_only_user = True
+
+    def get_sparse_field_names(self):
+        if self.action == 'retrieve':
+            return fast_serializers.PRODUCT_CARD_FIELDS
+        return fast_serializers.CATEGORY_FIELDS
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -39,23 +86,96 @@ class CategoryViewSet(viewsets.ModelViewSet):
         elif self.action == 'list':
             return CategorySerializer
 
+    def list(self, request, *args, **kwargs):
+        return self.cached_response('category-list', (response_cache.CATEGORIES,),
+                                    lambda: self.category_tree(request, *args, **kwargs))
+
+    def category_tree(self, request, *args, **kwargs):
+        if not settings.FAST_SERIALIZERS or self.paginator.get_limit(request) is not None:
+            return super().list(request, *args, **kwargs)
+        return Response(fast_serializers.category_tree(request, self.get_sparse_fields()))
+
     def retrieve(self, request, *args, **kwargs):
+        return self.cached_response('category-detail', (response_cache.category(kwargs['pk']),),
+                                    lambda: self.category_products(request))
+
+    def category_products(self, request):
         instance = self.get_object()
-        products = instance.products.all()  
+        fields = self.get_sparse_fields()
+        products = mixins.order_products(instance.products.all(), request.query_params)
+        if settings.FAST_SERIALIZERS:
+            products = products.values(*fast_serializers.ProductCardRows.select(fields).columns)
+        else:
+            products = mixins.only_fields(products, fields, always=('popularity',))
         paginator = CategoryProductsPagination()
         page = paginator.paginate_queryset(products, request)
         if page is not None:
-            serializer = ProductsForCategories(page, context={'request': self.request}, many=True)
-            return paginator.get_paginated_response(serializer.data)
+            return paginator.get_paginated_response(self.product_cards(page))
+        return Response(self.product_cards(products))
 
-        serializer = ProductsForCategories(products,  context={'request': self.request}, many=True)
-        return Response(serializer.data)
+    def product_cards(self, products):
+        if settings.FAST_SERIALIZERS:
+            return fast_serializers.product_cards(products, self.request, self.get_sparse_fields())
+        return ProductsForCategories(products, context=self.get_serializer_context(), many=True).data
 
-class ProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductViewSet(ResponseCacheMixin, SparseFieldsViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductDetailSerializer  
+    claims_only_user = True
+
+    def get_sparse_field_names(self):
+        return fast_serializers.PRODUCT_DETAIL_FIELDS
+
+    def get_queryset(self):
+        return mixins.only_fields(super().get_queryset(), self.get_sparse_fields())
+
+    def retrieve(self, request, *args, **kwargs):
+        response = self.cached_response('product-detail', (response_cache.product(kwargs['pk']),),
+                                        lambda: self.product_detail(request, *args, **kwargs))
+        counters.incr(kwargs['pk'], counters.VIEWS)
+        return response
+
+    def product_detail(self, request, *args, **kwargs):
+        if settings.FAST_SERIALIZERS:
+            return Response(fast_serializers.product_detail(kwargs['pk'], request, self.get_sparse_fields()))
+        return super().retrieve(request, *args, **kwargs)
     
     
+class ProductGalleryUploadView(viewsets.ViewSet):
+    permission_classes = [permissions.IsAdminUser]
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [uploads.BoundedTemporaryFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def create(self, request, pk=None):
+        product = get_object_or_404(Product, pk=pk)
+        files = request.FILES.getlist('images')
+        handler = request.upload_handlers[0]
+        errors = {name: 'Файл слишком большой' for name in handler.skipped}
+        if handler.too_many_files:
+            return Response({'images': f'Не больше {settings.GALLERY_UPLOAD_MAX_FILES} файлов за раз'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        galleries = []
+        for upload in files:
+            error = uploads.validate_image(upload)
+            if error:
+                errors[upload.name] = error
+                continue
+            name = default_storage.save(Gallery.image.field.generate_filename(None, upload.name), upload)
+            galleries.append(Gallery(product=product, image=name))
+            upload.close()
+        Gallery.objects.bulk_create(galleries)
+        if galleries:
+            # bulk_create не шлёт post_save, теги сбрасываются здесь
+            response_cache.invalidate(response_cache.product(product.pk), response_cache.category(product.category_id))
+        for gallery in galleries:
+            images.schedule(gallery.image.name)
+        serializer = GallerySerializer(galleries, many=True, context={'request': request})
+        return Response({'created': serializer.data, 'errors': errors},
+                        status=status.HTTP_201_CREATED if galleries else status.HTTP_400_BAD_REQUEST)
+
+
 class ReviewCUDViewSet(viewsets.ModelViewSet):
     serializer_class = ReviewCUDSerializer  
     permission_classes = [permissions.IsAuthenticated]  
@@ -85,6 +205,13 @@ class AddToFavoriteViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+    def check(self, request):
+        serializer = FavoriteCheckSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user_favorites = favorites.for_request(request)
+        answer = {str(product_id): product_id in user_favorites for product_id in serializer.validated_data['products']}
+        return Response({'favorites': answer}, status=status.HTTP_200_OK)
         
 
 class DeleteProductFromFavoriteViewSet(viewsets.ModelViewSet):
@@ -95,10 +222,11 @@ class DeleteProductFromFavoriteViewSet(viewsets.ModelViewSet):
 class UserFavoriteProductsViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]  
     serializer_class = UserFavoriteProductSerializer 
+    claims_only_user = True
 
     def get_queryset(self):
         user = self.request.user  
-        products = FavoriteProduct.objects.filter(user=user) 
+        products = FavoriteProduct.objects.filter(user_id=user.id).select_related('product')
         return products
     
     
@@ -113,6 +241,11 @@ class ProductCUDUserCartViewSet(viewsets.ModelViewSet):
         elif mixins.CART_CHANGE_PRODUCT_QUANTITY_IN_CART_PATH or mixins.CART_DELETE_PRODUCT_PATH in self.request.path:
             return Cart.objects.all()
     
+    def perform_create(self, serializer):
+        product_in_cart = serializer.save()
+        if product_in_cart:
+            counters.incr(product_in_cart.product_id, counters.CART_ADDS)
+
     def perform_destroy(self, instance):
         product_in_cart = Cart.objects.get(id=instance.id)
         product = Product.objects.get(id=product_in_cart.product.id)
@@ -151,26 +284,151 @@ class UserCartViewSet(viewsets.ModelViewSet):
           
 class PaymentView(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
-    stripe.api_key = settings.STRIPE_SECRET_KEY    
     
     def create(self, request):
         serializer = PaymentSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             return Response(serializer.data, status=status.HTTP_200_OK)
         else: return Response(status=status.HTTP_400_BAD_REQUEST)
+
+
+class PaymentWebhookView(viewsets.ViewSet):
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def create(self, request):
+        # с пустым ключом construct_event принимает подпись, которую может сделать кто угодно
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            return Response(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        import stripe
+
+        try:
+            event = stripe.Webhook.construct_event(
+                request.body, request.META.get('HTTP_STRIPE_SIGNATURE', ''), settings.STRIPE_WEBHOOK_SECRET
+            )
+        except (ValueError, stripe.error.SignatureVerificationError):
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        if event['type'] == 'checkout.session.completed':
+            order = Order.objects.filter(session_id=event['data']['object']['id']).first()
+            if order:
+                rollups.mark_order_paid(order)
+        return Response(status=status.HTTP_200_OK)
+
+
+class SalesReportView(viewsets.ViewSet):
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        serializer = SalesReportQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        rows = rollups.sales_report(data['date_from'], data['date_to'], data['group_by'])
+        return Response(rows, status=status.HTTP_200_OK)
+
+
+class OrderExportView(viewsets.ViewSet):
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in exports.EXPORT_FORMATS:
+            return Response({'file_format': f'Поддерживаются: {", ".join(exports.EXPORT_FORMATS)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        date_from = request.query_params.get('date_from')
+        date_to = request.query_params.get('date_to')
+        rows = exports.order_rows(
+            date_from=mixins.parse_date_param(date_from) if date_from else None,
+            date_to=mixins.parse_date_param(date_to, end_of_day=True) if date_to else None,
+        )
+        stream, content_type = exports.EXPORT_FORMATS[file_format]
+        response = StreamingHttpResponse(stream(rows), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="orders.{file_format}"'
+        return response
+
+
+class CatalogExportView(viewsets.ViewSet):
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in exports.EXPORT_FORMATS:
+            return Response({'file_format': f'Поддерживаются: {", ".join(exports.EXPORT_FORMATS)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        stream, content_type = exports.EXPORT_FORMATS[file_format]
+        response = StreamingHttpResponse(stream(exports.catalog_rows(), exports.CATALOG_EXPORT_NAMES),
+                                         content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="catalog.{file_format}"'
+        return response
+
+
+class CatalogBulkChangeView(viewsets.ViewSet):
+    permission_classes = [permissions.IsAdminUser]
+
+    def create(self, request):
+        serializer = CatalogBulkChangeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        products = Product.objects.all()
+        if data.get('products'):
+            products = products.filter(id__in=data['products'])
+        if data.get('category'):
+            category_ids = (pricing.category_with_descendants(data['category'].id)
+                            if data['include_subcategories'] else [data['category'].id])
+            products = products.filter(category_id__in=category_ids)
+        result = pricing.apply_changes(products, price_percent=data.get('price_percent'),
+                                       price_delta=data.get('price_delta'), stock_delta=data.get('stock_delta'))
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class CatalogImportView(viewsets.ViewSet):
+    permission_classes = [permissions.IsAdminUser]
+
+    def create(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': 'Файл не передан'}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or imports.guess_format(upload.name)
+        if file_format not in imports.IMPORT_FORMATS:
+            return Response({'file_format': f'Поддерживаются: {", ".join(imports.IMPORT_FORMATS)}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        report = imports.import_catalog(upload, file_format)
+        return Response(report, status=status.HTTP_200_OK)
     
 
-class UserOrderViewSet(viewsets.ModelViewSet):
+class UserOrderViewSet(SparseFieldsViewMixin, viewsets.ModelViewSet):
     serializer_class = UserOrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = mixins.OrderCursorPagination
+    claims_only_user = True
     
+    def get_sparse_field_names(self):
+        names = super().get_sparse_field_names()
+        return names + ('products',) if self.action == 'retrieve' else names
+
     def get_queryset(self):
         user = self.request.user
-        return Order.objects.filter(user=user)
+        fields = self.get_sparse_fields()
+        orders = Order.objects.filter(user_id=user.id)
+        if fields is None or 'shipping' in fields:
+            orders = orders.select_related('shipping')
+        # created_at нужен курсорной пагинации
+        orders = mixins.only_fields(orders, fields, always=('created_at', 'id'))
+        if self.action == 'list':
+            orders = mixins.filter_orders(orders, self.request.query_params)
+        return orders
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['action'] = self.action 
         return context
 
-        
+
+class QueryInstrumentationView(viewsets.ViewSet):
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        return Response(instrumentation.route_stats.report(), status=status.HTTP_200_OK)
+
+    def destroy(self, request):
+        instrumentation.route_stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)